@@ -2,12 +2,17 @@
 """
 分析实验结果并生成图表 - 修正版
 支持--output-dir参数，确保图表输出到正确目录
+相互独立的图表在进程池中并行渲染；--preview 以低分辨率和更少的点快速出图
 """
 
 import argparse
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # 只输出文件，不需要GUI后端；进程池子进程中也可安全绘图
 import matplotlib.pyplot as plt
+from matplotlib import cbook
 import numpy as np
 from collections import defaultdict
 import pandas as pd
@@ -15,81 +20,169 @@ import pandas as pd
 # 添加src目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from binlog import COLUMNS, is_binary_log, open_binary_log
+from downsample import METHODS, downsample
+import parse_cache
+
 # 配置matplotlib字体（适配Mac系统）
 plt.rcParams['font.sans-serif'] = ['Songti SC', 'Arial Unicode MS', 'SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
-def read_throughput_data(data_file):
-    """读取接收数据，计算吞吐量"""
-    flow_data = defaultdict(list)
+# 每次读入内存的记录数：日志按块处理，文件大于内存时也只占用一个块的空间
+CHUNK_ROWS = 1_000_000
+# 吞吐量曲线的时间分辨率（秒），逐包字节先按此宽度聚合再累加
+THROUGHPUT_BIN = 0.01
+# 各图的降采样方式（exact | lttb | minmax | pixel），可用 --downsample 图名=方式 覆盖；
+# 每条序列不超过MAX_POINTS个点时总是原样绘制
+DOWNSAMPLE = {'throughput': 'lttb', 'delays': 'pixel', 'boxplot': 'minmax'}
+MAX_POINTS = 4000
+# 最终图表的分辨率；--preview 使用低分辨率并进一步降采样，文件名加 _preview 后缀
+FINAL_DPI = 300
+PREVIEW_DPI = 100
+PREVIEW_MAX_POINTS = 1000
+
+def iter_log_chunks(path, columns, chunk_rows=CHUNK_ROWS):
+    """
+    分块读取接收数据日志或延迟日志，逐块产出 {列名: ndarray}
+    CSV按列位置用pandas的C解析器读取（跳过列数不足的行），二进制日志用memmap切片
+    """
+    if is_binary_log(path):
+        records = open_binary_log(path)
+        for start in range(0, len(records), chunk_rows):
+            block = records[start:start + chunk_rows]
+            yield {name: np.asarray(block[name]) for name in columns}
+        return
+    positions = [COLUMNS.index(name) for name in columns]
+    try:
+        reader = pd.read_csv(path, header=None, skiprows=1, usecols=positions,
+                             dtype=np.float64, chunksize=chunk_rows, on_bad_lines='skip')
+        for chunk in reader:
+            chunk = chunk.dropna()
+            yield {name: chunk[pos].to_numpy() for name, pos in zip(columns, positions)}
+    except pd.errors.EmptyDataError:
+        return
+
+def parse_throughput(data_file, bin_width=THROUGHPUT_BIN):
+    """
+    解析接收数据日志
+    每块内按流用bincount把字节数聚合到bin_width宽的时间片，最后合并各块并cumsum，
+    返回 {'flow_ids', '<flow_id>_times', '<flow_id>_bytes'} 形式的列数据（可直接写入缓存）
+    """
+    partial = defaultdict(list)
+    for chunk in iter_log_chunks(data_file, ('timestamp', 'flow_id', 'packet_size')):
+        bins = np.floor(chunk['timestamp'] / bin_width).astype(np.int64)
+        flow_ids = chunk['flow_id'].astype(np.int64)
+        sizes = chunk['packet_size'].astype(np.float64)
+        for flow_id in np.unique(flow_ids):
+            mask = flow_ids == flow_id
+            flow_bins = bins[mask]
+            base = flow_bins.min()
+            totals = np.bincount(flow_bins - base, weights=sizes[mask])
+            used = np.flatnonzero(totals)
+            partial[int(flow_id)].append((used + base, totals[used]))
+        
+    arrays = {'flow_ids': np.array(sorted(partial), dtype=np.int64)}
+    for flow_id, parts in partial.items():
+        # 同一时间片可能跨块出现，合并后按时间片排序
+        bins, inverse = np.unique(np.concatenate([b for b, _ in parts]), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate([t for _, t in parts]))
+        arrays[f'{flow_id}_times'] = (bins + 1) * bin_width
+        arrays[f'{flow_id}_bytes'] = np.cumsum(totals)
+    return arrays
+
+def read_throughput_data(data_file, bin_width=THROUGHPUT_BIN, cache=True):
+    """
+    读取接收数据，计算吞吐量
+    返回 {flow_id: (时间片结束时刻数组, 累计字节数组)}；cache为True时使用解析缓存
+    """
+    flow_data = {}
     
     if not os.path.exists(data_file):
         print(f"数据文件不存在: {data_file}")
         return flow_data
         
     try:
-        with open(data_file, 'r') as f:
-            header = f.readline().strip()  # 跳过标题行
-            for line in f:
-                parts = line.strip().split(',')
-                if len(parts) >= 3:
-                    timestamp = float(parts[0])
-                    flow_id = int(parts[1])
-                    packet_size = int(parts[2])
-                    flow_data[flow_id].append((timestamp, packet_size))
+        arrays = parse_cache.cached(data_file, f'throughput-{bin_width:g}',
+                                    lambda path: parse_throughput(path, bin_width), cache)
     except Exception as e:
         print(f"读取数据文件失败: {e}")
+        return flow_data
+        
+    for flow_id in arrays['flow_ids'].tolist():
+        flow_data[flow_id] = (arrays[f'{flow_id}_times'], arrays[f'{flow_id}_bytes'])
         
     return flow_data
 
-def read_delay_data(delay_files):
-    """读取延迟数据"""
-    flow_delays = defaultdict(list)
+def parse_delays(delay_file):
+    """解析延迟日志，返回按时间排序的有效（>0）延迟 {'timestamps', 'delays'}"""
+    timestamps = []
+    delays = []
+    for chunk in iter_log_chunks(delay_file, ('timestamp', 'delay_ms')):
+        valid = chunk['delay_ms'] > 0
+        timestamps.append(chunk['timestamp'][valid].astype(np.float64))
+        delays.append(chunk['delay_ms'][valid].astype(np.float32))
+    timestamps = np.concatenate(timestamps) if timestamps else np.empty(0)
+    delays = np.concatenate(delays) if delays else np.empty(0, dtype=np.float32)
+    order = np.argsort(timestamps, kind='stable')
+    return {'timestamps': timestamps[order], 'delays': delays[order]}
+
+def read_delay_data(delay_files, cache=True):
+    """
+    读取延迟数据
+    返回 {flow_id: (时间戳数组, 延迟数组)}；cache为True时使用解析缓存
+    """
+    flow_delays = {}
     
     for flow_id, delay_file in delay_files.items():
         if os.path.exists(delay_file):
             try:
-                with open(delay_file, 'r') as f:
-                    f.readline()  # 跳过标题行
-                    for line in f:
-                        parts = line.strip().split(',')
-                        if len(parts) >= 5:
-                            timestamp = float(parts[0])
-                            delay = float(parts[4])
-                            if delay > 0:  # 只包含有效的延迟数据
-                                flow_delays[flow_id].append((timestamp, delay))
+                arrays = parse_cache.cached(delay_file, 'delays', parse_delays, cache)
             except Exception as e:
                 print(f"读取延迟文件 {delay_file} 失败: {e}")
+                continue
+            if len(arrays['timestamps']):
+                flow_delays[flow_id] = (arrays['timestamps'], arrays['delays'])
                 
     return flow_delays
 
-def plot_throughput(flow_data, output_file, title):
-    """绘制吞吐量图"""
+def boxplot(ax, data, labels, colors, method='minmax', max_points=MAX_POINTS):
+    """
+    按流绘制箱形图
+    箱体和须线用全部数据计算；method不为exact时，异常点按纵向max_points个像素行去重后再绘制
+    """
+    stats = cbook.boxplot_stats(data, labels=labels)
+    if method != 'exact':
+        for stat in stats:
+            fliers = stat['fliers']
+            if len(fliers) > max_points:
+                low, high = float(fliers.min()), float(fliers.max())
+                step = (high - low) / max_points or 1.0
+                _, keep = np.unique(np.round((fliers - low) / step), return_index=True)
+                stat['fliers'] = fliers[keep]
+    box_plot = ax.bxp(stats, patch_artist=True)
+    for i, patch in enumerate(box_plot['boxes']):
+        patch.set_facecolor(colors[i % len(colors)])
+        patch.set_alpha(0.7)
+
+def plot_throughput(flow_data, output_file, title, sampling=DOWNSAMPLE, max_points=MAX_POINTS,
+                    dpi=FINAL_DPI):
+    """绘制吞吐量图（sampling为各图降采样方式，见DOWNSAMPLE）"""
     plt.figure(figsize=(12, 8))
     
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
     line_styles = ['-', '--', '-.', ':', '-']
     
     for i, flow_id in enumerate(sorted(flow_data.keys())):
-        data = flow_data[flow_id]
-        if not data:
+        timestamps, cumulative_bytes = flow_data[flow_id]
+        if not len(timestamps):
             continue
-            
-        data.sort(key=lambda x: x[0])
-        
-        timestamps = []
-        cumulative_bytes = []
-        total_bytes = 0
-        
-        for timestamp, packet_size in data:
-            total_bytes += packet_size
-            timestamps.append(timestamp)
-            cumulative_bytes.append(total_bytes)
         
+        timestamps, cumulative_bytes = downsample(timestamps, cumulative_bytes,
+                                                  sampling['throughput'], max_points)
         color = colors[i % len(colors)]
         line_style = line_styles[i % len(line_styles)]
         
-        plt.plot(timestamps, [b/1024 for b in cumulative_bytes], 
+        plt.plot(timestamps, cumulative_bytes / 1024, 
                 label=f'Flow {flow_id}', 
                 color=color, 
                 linestyle=line_style,
@@ -107,13 +200,14 @@ def plot_throughput(flow_data, output_file, title):
     
     # 创建输出目录
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight')
     plt.close()
     print(f"✅ 吞吐量图已保存: {output_file}")
 
-def plot_delays(flow_delays, output_file, title):
-    """绘制延迟图"""
-    if not flow_delays or all(len(delays) == 0 for delays in flow_delays.values()):
+def plot_delays(flow_delays, output_file, title, sampling=DOWNSAMPLE, max_points=MAX_POINTS,
+                dpi=FINAL_DPI):
+    """绘制延迟图（sampling为各图降采样方式，见DOWNSAMPLE）"""
+    if not flow_delays or all(len(delays) == 0 for _, delays in flow_delays.values()):
         print(f"❌ 没有有效的延迟数据，跳过延迟图生成: {output_file}")
         return
         
@@ -125,18 +219,12 @@ def plot_delays(flow_delays, output_file, title):
     
     # 子图1: 时间 vs 延迟 散点图
     for i, flow_id in enumerate(sorted(flow_delays.keys())):
-        delays = flow_delays[flow_id]
-        if not delays:
+        timestamps, delay_values = flow_delays[flow_id]
+        if not len(timestamps):
             continue
             
-        delays.sort(key=lambda x: x[0])
-        
-        timestamps = [d[0] for d in delays]
-        delay_values = [d[1] for d in delays]
-        
-        if timestamps:
-            start_time = min(timestamps)
-            timestamps = [t - start_time for t in timestamps]
+        timestamps, delay_values = downsample(timestamps - timestamps[0], delay_values,
+                                              sampling['delays'], max_points)
         
         color = colors[i % len(colors)]
         
@@ -157,18 +245,13 @@ def plot_delays(flow_delays, output_file, title):
     flow_labels = []
     
     for flow_id in sorted(flow_delays.keys()):
-        delays = flow_delays[flow_id]
-        if delays:
-            delay_values = [d[1] for d in delays]
+        _, delay_values = flow_delays[flow_id]
+        if len(delay_values):
             delay_data.append(delay_values)
             flow_labels.append(f'Flow {flow_id}')
     
     if delay_data:
-        box_plot = ax2.boxplot(delay_data, labels=flow_labels, patch_artist=True)
-        
-        for i, patch in enumerate(box_plot['boxes']):
-            patch.set_facecolor(colors[i % len(colors)])
-            patch.set_alpha(0.7)
+        boxplot(ax2, delay_data, flow_labels, colors, sampling['boxplot'], max_points)
     
     ax2.set_xlabel('流ID', fontsize=12)
     ax2.set_ylabel('包延迟 (毫秒)', fontsize=12)
@@ -179,16 +262,42 @@ def plot_delays(flow_delays, output_file, title):
     
     # 创建输出目录
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight')
     plt.close()
     print(f"✅ 延迟图已保存: {output_file}")
 
-def generate_comparison_plots(data_dir, output_dir=None):
-    """生成FIFO vs WFQ对比图"""
+def render_chart(func, args):
+    """在当前进程渲染一个图表，失败时只打印错误，不影响其他图表"""
+    try:
+        func(*args)
+    except Exception as e:
+        print(f"❌ 图表生成失败 ({func.__name__}): {e}")
+
+def render_charts(tasks, jobs=None):
+    """
+    渲染相互独立的图表，tasks为 [(绘图函数, 参数元组)]
+    jobs为并行进程数（默认CPU核数），只有一个图或jobs为1时在本进程内依次渲染
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs <= 1:
+        for func, args in tasks:
+            render_chart(func, args)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for future in [pool.submit(render_chart, func, args) for func, args in tasks]:
+            future.result()
+
+def generate_comparison_plots(data_dir, output_dir=None, bin_width=THROUGHPUT_BIN, cache=True,
+                              sampling=DOWNSAMPLE, max_points=MAX_POINTS, dpi=FINAL_DPI,
+                              suffix='', jobs=None, all_charts=False):
+    """
+    生成FIFO vs WFQ对比图
+    all_charts为True时同时生成两种算法各自的吞吐量图和延迟图，与对比图并行渲染
+    """
     
     # 读取数据
-    fifo_data = read_throughput_data(f'{data_dir}/fifo_received_data.log')
-    wfq_data = read_throughput_data(f'{data_dir}/wfq_received_data.log')
+    fifo_data = read_throughput_data(f'{data_dir}/fifo_received_data.log', bin_width, cache)
+    wfq_data = read_throughput_data(f'{data_dir}/wfq_received_data.log', bin_width, cache)
     
     # 读取延迟数据
     fifo_delay_files = {}
@@ -203,13 +312,37 @@ def generate_comparison_plots(data_dir, output_dir=None):
         if os.path.exists(wfq_delay_file):
             wfq_delay_files[flow_id] = wfq_delay_file
     
-    fifo_delays = read_delay_data(fifo_delay_files)
-    wfq_delays = read_delay_data(wfq_delay_files)
+    fifo_delays = read_delay_data(fifo_delay_files, cache)
+    wfq_delays = read_delay_data(wfq_delay_files, cache)
     
     if not fifo_data and not wfq_data:
         print("❌ 没有找到实验数据，请先运行实验")
         return
     
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    else:
+        output_dir = data_dir
+    
+    tasks = [(plot_comparison, (fifo_data, wfq_data, fifo_delays, wfq_delays,
+                                f'{output_dir}/algorithm_comparison{suffix}.png',
+                                sampling, max_points, dpi))]
+    if all_charts:
+        for algorithm, flow_data, flow_delays in (('fifo', fifo_data, fifo_delays),
+                                                  ('wfq', wfq_data, wfq_delays)):
+            title = f'{algorithm.upper()}调度算法'
+            if flow_data:
+                tasks.append((plot_throughput, (flow_data, f'{output_dir}/{algorithm}_throughput{suffix}.png',
+                                                title, sampling, max_points, dpi)))
+            if flow_delays:
+                tasks.append((plot_delays, (flow_delays, f'{output_dir}/{algorithm}_delays{suffix}.png',
+                                            title, sampling, max_points, dpi)))
+    render_charts(tasks, jobs)
+
+def plot_comparison(fifo_data, wfq_data, fifo_delays, wfq_delays, comparison_file,
+                    sampling=DOWNSAMPLE, max_points=MAX_POINTS, dpi=FINAL_DPI):
+    """绘制6子图的FIFO vs WFQ对比图"""
+    
     # 生成6子图对比图
     plt.figure(figsize=(16, 12))
     colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
@@ -217,16 +350,11 @@ def generate_comparison_plots(data_dir, output_dir=None):
     # 子图1：FIFO吞吐量
     plt.subplot(2, 3, 1)
     for i, flow_id in enumerate(sorted(fifo_data.keys())):
-        data = fifo_data[flow_id]
-        if data:
-            data.sort(key=lambda x: x[0])
-            timestamps = [d[0] for d in data]
-            cumulative_bytes = []
-            total = 0
-            for _, size in data:
-                total += size
-                cumulative_bytes.append(total)
-            plt.plot(timestamps, [b/1024 for b in cumulative_bytes], 
+        timestamps, cumulative_bytes = fifo_data[flow_id]
+        if len(timestamps):
+            timestamps, cumulative_bytes = downsample(timestamps, cumulative_bytes,
+                                                      sampling['throughput'], max_points)
+            plt.plot(timestamps, cumulative_bytes / 1024, 
                     label=f'Flow {flow_id}', color=colors[i % len(colors)], linewidth=2)
     plt.title('FIFO调度算法 - 吞吐量', fontsize=12, fontweight='bold')
     plt.xlabel('时间 (秒)')
@@ -237,16 +365,11 @@ def generate_comparison_plots(data_dir, output_dir=None):
     # 子图2：WFQ吞吐量
     plt.subplot(2, 3, 2)
     for i, flow_id in enumerate(sorted(wfq_data.keys())):
-        data = wfq_data[flow_id]
-        if data:
-            data.sort(key=lambda x: x[0])
-            timestamps = [d[0] for d in data]
-            cumulative_bytes = []
-            total = 0
-            for _, size in data:
-                total += size
-                cumulative_bytes.append(total)
-            plt.plot(timestamps, [b/1024 for b in cumulative_bytes], 
+        timestamps, cumulative_bytes = wfq_data[flow_id]
+        if len(timestamps):
+            timestamps, cumulative_bytes = downsample(timestamps, cumulative_bytes,
+                                                      sampling['throughput'], max_points)
+            plt.plot(timestamps, cumulative_bytes / 1024, 
                     label=f'Flow {flow_id}', color=colors[i % len(colors)], linewidth=2)
     plt.title('WFQ调度算法 - 吞吐量', fontsize=12, fontweight='bold')
     plt.xlabel('时间 (秒)')
@@ -260,8 +383,9 @@ def generate_comparison_plots(data_dir, output_dir=None):
     wfq_totals = {}
     
     for flow_id in sorted(set(list(fifo_data.keys()) + list(wfq_data.keys()))):
-        fifo_total = sum(size for _, size in fifo_data.get(flow_id, []))
-        wfq_total = sum(size for _, size in wfq_data.get(flow_id, []))
+        # 累计曲线的最后一点即总字节数
+        fifo_total = fifo_data[flow_id][1][-1] if flow_id in fifo_data else 0
+        wfq_total = wfq_data[flow_id][1][-1] if flow_id in wfq_data else 0
         fifo_totals[flow_id] = fifo_total / 1024
         wfq_totals[flow_id] = wfq_total / 1024
     
@@ -289,17 +413,13 @@ def generate_comparison_plots(data_dir, output_dir=None):
             delay_data = []
             flow_labels = []
             for flow_id in sorted(fifo_delays.keys()):
-                delays = fifo_delays[flow_id]
-                if delays:
-                    delay_values = [d[1] for d in delays]
+                _, delay_values = fifo_delays[flow_id]
+                if len(delay_values):
                     delay_data.append(delay_values)
                     flow_labels.append(f'Flow {flow_id}')
             
             if delay_data:
-                box_plot = plt.boxplot(delay_data, labels=flow_labels, patch_artist=True)
-                for i, patch in enumerate(box_plot['boxes']):
-                    patch.set_facecolor(colors[i % len(colors)])
-                    patch.set_alpha(0.7)
+                boxplot(plt.gca(), delay_data, flow_labels, colors, sampling['boxplot'], max_points)
         
         plt.title('FIFO - 延迟分布', fontsize=12, fontweight='bold')
         plt.xlabel('流ID')
@@ -312,17 +432,13 @@ def generate_comparison_plots(data_dir, output_dir=None):
             delay_data = []
             flow_labels = []
             for flow_id in sorted(wfq_delays.keys()):
-                delays = wfq_delays[flow_id]
-                if delays:
-                    delay_values = [d[1] for d in delays]
+                _, delay_values = wfq_delays[flow_id]
+                if len(delay_values):
                     delay_data.append(delay_values)
                     flow_labels.append(f'Flow {flow_id}')
             
             if delay_data:
-                box_plot = plt.boxplot(delay_data, labels=flow_labels, patch_artist=True)
-                for i, patch in enumerate(box_plot['boxes']):
-                    patch.set_facecolor(colors[i % len(colors)])
-                    patch.set_alpha(0.7)
+                boxplot(plt.gca(), delay_data, flow_labels, colors, sampling['boxplot'], max_points)
         
         plt.title('WFQ - 延迟分布', fontsize=12, fontweight='bold')
         plt.xlabel('流ID')
@@ -335,10 +451,10 @@ def generate_comparison_plots(data_dir, output_dir=None):
         wfq_avg_delays = {}
         
         for flow_id in flows:
-            if flow_id in fifo_delays and fifo_delays[flow_id]:
-                fifo_avg_delays[flow_id] = np.mean([d[1] for d in fifo_delays[flow_id]])
-            if flow_id in wfq_delays and wfq_delays[flow_id]:
-                wfq_avg_delays[flow_id] = np.mean([d[1] for d in wfq_delays[flow_id]])
+            if flow_id in fifo_delays and len(fifo_delays[flow_id][1]):
+                fifo_avg_delays[flow_id] = float(np.mean(fifo_delays[flow_id][1], dtype=np.float64))
+            if flow_id in wfq_delays and len(wfq_delays[flow_id][1]):
+                wfq_avg_delays[flow_id] = float(np.mean(wfq_delays[flow_id][1], dtype=np.float64))
         
         if fifo_avg_delays or wfq_avg_delays:
             x = np.arange(len(flows))
@@ -359,16 +475,22 @@ def generate_comparison_plots(data_dir, output_dir=None):
     plt.tight_layout()
     
     # 保存对比图
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-        comparison_file = f'{output_dir}/algorithm_comparison.png'
-    else:
-        comparison_file = f'{data_dir}/algorithm_comparison.png'
-    
-    plt.savefig(comparison_file, dpi=300, bbox_inches='tight')
+    plt.savefig(comparison_file, dpi=dpi, bbox_inches='tight')
     plt.close()
     print(f"✅ 算法对比图已保存: {comparison_file}")
 
+def parse_sampling(specs):
+    """解析 --downsample 图名=方式 列表（图名可为all），返回完整的各图降采样配置"""
+    sampling = dict(DOWNSAMPLE)
+    for spec in specs:
+        chart, _, method = spec.partition('=')
+        if method not in METHODS or (chart not in sampling and chart != 'all'):
+            raise ValueError(f"降采样配置错误: {spec}，图名: {', '.join(DOWNSAMPLE)}, all；"
+                             f"方式: {', '.join(METHODS)}")
+        for name in (sampling if chart == 'all' else [chart]):
+            sampling[name] = method
+    return sampling
+
 def main():
     parser = argparse.ArgumentParser(description='分析WFQ实验结果 - 修正版')
     parser.add_argument('--algorithm', choices=['fifo', 'wfq'], 
@@ -379,12 +501,44 @@ def main():
     parser.add_argument('--experiments-dir', default='.',
                        help='实验数据目录')
     parser.add_argument('--output-dir', help='图表输出目录')
+    parser.add_argument('--throughput-bin', type=float, default=THROUGHPUT_BIN,
+                       help='吞吐量曲线的时间分辨率（秒）')
+    parser.add_argument('--no-cache', action='store_true',
+                       help=f'不读写解析缓存（默认缓存在日志旁的 {parse_cache.CACHE_DIR_NAME}/ 目录，源文件变化时自动失效）')
+    parser.add_argument('--downsample', action='append', default=[], metavar='CHART=METHOD',
+                       help=f'设置某个图的降采样方式，可重复；CHART: {", ".join(DOWNSAMPLE)}, all；'
+                            f'METHOD: {", ".join(METHODS)}（默认 '
+                            + ', '.join(f'{k}={v}' for k, v in DOWNSAMPLE.items()) + '）')
+    parser.add_argument('--max-points', type=int,
+                       help=f'降采样后每条序列的点数上限，点数不超过时原样绘制'
+                            f'（默认{MAX_POINTS}，预览模式{PREVIEW_MAX_POINTS}）')
+    parser.add_argument('--preview', action='store_true',
+                       help=f'快速预览：{PREVIEW_DPI} DPI并进一步降采样，文件名加 _preview 后缀'
+                            f'（默认输出{FINAL_DPI} DPI的最终图表）')
+    parser.add_argument('--jobs', type=int,
+                       help='并行渲染图表的进程数（默认CPU核数，1表示在本进程内依次渲染）')
+    parser.add_argument('--all-charts', action='store_true',
+                       help='对比模式下同时生成每个算法的吞吐量图和延迟图')
     
     args = parser.parse_args()
+    try:
+        sampling = parse_sampling(args.downsample)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.max_points is not None and args.max_points < 3:
+        parser.error('--max-points 至少为3（LTTB需要保留首尾点和至少一个中间点）')
+    if args.preview:
+        max_points = args.max_points or PREVIEW_MAX_POINTS
+        dpi, suffix = PREVIEW_DPI, '_preview'
+    else:
+        max_points = args.max_points or MAX_POINTS
+        dpi, suffix = FINAL_DPI, ''
     
     # 生成对比图
     if args.generate_comparison:
-        generate_comparison_plots(args.experiments_dir, args.output_dir)
+        generate_comparison_plots(args.experiments_dir, args.output_dir, args.throughput_bin,
+                                  not args.no_cache, sampling, max_points, dpi, suffix,
+                                  args.jobs, args.all_charts)
         return
     
     # 生成单个算法图表
@@ -408,14 +562,16 @@ def main():
     else:
         output_dir = data_dir
     
+    title = f'{args.algorithm.upper()}调度算法'
+    tasks = []
+    
     # 读取吞吐量数据
-    flow_data = read_throughput_data(data_file)
+    flow_data = read_throughput_data(data_file, args.throughput_bin, not args.no_cache)
     
     if flow_data:
         # 生成吞吐量图
-        output_file = f'{output_dir}/{args.algorithm}_throughput.png'
-        title = f'{args.algorithm.upper()}调度算法'
-        plot_throughput(flow_data, output_file, title)
+        output_file = f'{output_dir}/{args.algorithm}_throughput{suffix}.png'
+        tasks.append((plot_throughput, (flow_data, output_file, title, sampling, max_points, dpi)))
     
     # 读取延迟数据
     delay_files = {}
@@ -425,17 +581,19 @@ def main():
             delay_files[flow_id] = delay_file
     
     if delay_files:
-        flow_delays = read_delay_data(delay_files)
+        flow_delays = read_delay_data(delay_files, not args.no_cache)
         if flow_delays:
             # 生成延迟图
-            output_file = f'{output_dir}/{args.algorithm}_delays.png'
-            title = f'{args.algorithm.upper()}调度算法'
-            plot_delays(flow_delays, output_file, title)
+            output_file = f'{output_dir}/{args.algorithm}_delays{suffix}.png'
+            tasks.append((plot_delays, (flow_delays, output_file, title, sampling, max_points, dpi)))
         else:
             print(f"⚠️  延迟文件存在但没有有效数据: {list(delay_files.values())}")
     else:
         print(f"⚠️  没有找到延迟文件: {data_dir}/{args.algorithm}_delays_flow_*.csv")
     
+    if tasks:
+        render_charts(tasks, args.jobs)
+    
     print(f"✅ {args.algorithm.upper()}实验分析完成")
 
 if __name__ == '__main__':
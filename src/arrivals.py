@@ -0,0 +1,301 @@
+"""
+到达过程与包大小分布模块
+每个到达模型按平均速率（字节/秒）配置，next(rng)返回 (距上一个包的间隔秒数, 包大小)，
+trace模型读完后返回None。配置字符串格式：
+- cbr                              恒定比特率
+- poisson                          泊松到达
+- onoff:ON:OFF[:exp|pareto[:ALPHA]] 开关模型，ON/OFF为平均时长（秒），ON期间按峰值速率泊松发送
+- mmpp:M1,M2,...:D1,D2,...         马尔可夫调制泊松过程，Mi为各状态速率倍数，Di为平均停留时间（秒）
+- trace:PATH[:FLOW_ID]             按CSV文件（timestamp,packet_size列，兼容received_data.log）回放，
+                                   PATH中可以含冒号，只有末尾的整数被视为FLOW_ID
+包大小分布格式（包大小需在包头长度与最大包长之间）：
+- fixed:SIZE | uniform:MIN:MAX | bimodal:SMALL:LARGE:P_SMALL | empirical:S1=P1,S2=P2,...
+"""
+
+import csv
+from abc import ABC, abstractmethod
+
+from binlog import is_binary_log, read_binary_log
+from packet_format import ProjectPacket
+
+class FixedSize:
+    """固定包大小"""
+
+    def __init__(self, size):
+        self.size = size
+        self.mean = size
+        self.min = size
+        self.max = size
+
+    def sample(self, rng):
+        return self.size
+
+class UniformSize:
+    """[min, max]均匀分布的包大小"""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.mean = (low + high) / 2
+        self.min = low
+        self.max = high
+
+    def sample(self, rng):
+        return rng.randint(self.low, self.high)
+
+class EmpiricalSize:
+    """按给定概率取值的离散包大小分布（bimodal为其两点特例）"""
+
+    def __init__(self, sizes, probabilities):
+        total = sum(probabilities)
+        self.sizes = list(sizes)
+        self.weights = [p / total for p in probabilities]
+        self.mean = sum(s * w for s, w in zip(self.sizes, self.weights))
+        self.min = min(self.sizes)
+        self.max = max(self.sizes)
+
+    def sample(self, rng):
+        return rng.choices(self.sizes, self.weights)[0]
+
+def _build_size_distribution(kind, rest):
+    params = rest.split(':') if rest else []
+    try:
+        if kind == 'fixed':
+            return FixedSize(int(params[0]))
+        if kind == 'uniform':
+            low, high = int(params[0]), int(params[1])
+            if low > high:
+                return None
+            return UniformSize(low, high)
+        if kind == 'bimodal':
+            p_small = float(params[2])
+            if not 0 <= p_small <= 1:
+                return None
+            return EmpiricalSize([int(params[0]), int(params[1])], [p_small, 1 - p_small])
+        if kind == 'empirical':
+            pairs = [item.split('=') for item in rest.split(',') if item]
+            probabilities = [float(p) for _, p in pairs]
+            if not pairs or min(probabilities) < 0 or sum(probabilities) <= 0:
+                return None
+            return EmpiricalSize([int(s) for s, _ in pairs], probabilities)
+    except (IndexError, ValueError):
+        pass
+    return None
+
+def parse_size_distribution(spec, default_size=1024):
+    """
+    解析包大小分布配置，spec为空时返回固定大小default_size
+    可能取到的包大小必须在 [ProjectPacket.HEADER_SIZE, ProjectPacket.MAX_PACKET_SIZE] 内
+    """
+    if not spec:
+        return FixedSize(default_size)
+    kind, _, rest = spec.partition(':')
+    sizes = _build_size_distribution(kind, rest)
+    if sizes is None:
+        raise ValueError(f"包大小分布配置错误: {spec}")
+    if sizes.min < ProjectPacket.HEADER_SIZE or sizes.max > ProjectPacket.MAX_PACKET_SIZE:
+        raise ValueError(f"包大小需在 {ProjectPacket.HEADER_SIZE}-{ProjectPacket.MAX_PACKET_SIZE} "
+                         f"字节之间: {spec}")
+    return sizes
+
+class ArrivalProcess(ABC):
+    """到达过程基类：平均速率rate（字节/秒），包大小来自sizes"""
+
+    def __init__(self, rate, sizes):
+        self.rate = rate
+        self.sizes = sizes
+
+    @property
+    def packet_rate(self):
+        """平均包速率（包/秒）"""
+        return self.rate / self.sizes.mean
+
+    @abstractmethod
+    def next(self, rng):
+        """返回 (距上一个包的间隔秒数, 包大小)，到达序列结束时返回None"""
+
+class CBRArrivals(ArrivalProcess):
+    """恒定比特率：间隔 = 本包大小 / 速率"""
+
+    def next(self, rng):
+        size = self.sizes.sample(rng)
+        return size / self.rate, size
+
+class PoissonArrivals(ArrivalProcess):
+    """泊松到达：指数分布间隔"""
+
+    def next(self, rng):
+        return rng.expovariate(self.packet_rate), self.sizes.sample(rng)
+
+class OnOffArrivals(ArrivalProcess):
+    """
+    开关模型
+    ON/OFF时长服从指数分布或Pareto分布（重尾，alpha需>1），
+    ON期间以峰值速率 rate*(on+off)/on 泊松发送，使长期平均速率等于rate
+    """
+
+    def __init__(self, rate, sizes, on_mean, off_mean, distribution='exp', alpha=1.5):
+        super().__init__(rate, sizes)
+        if distribution not in ('exp', 'pareto'):
+            raise ValueError(f"未知的开关时长分布: {distribution}")
+        if distribution == 'pareto' and alpha <= 1:
+            raise ValueError("Pareto分布的alpha必须大于1")
+        if not on_mean > 0 or not off_mean >= 0:
+            raise ValueError("ON期均值必须大于0，OFF期均值不能为负")
+        self.on_mean = on_mean
+        self.off_mean = off_mean
+        self.distribution = distribution
+        self.alpha = alpha
+        self.peak_packet_rate = self.packet_rate * (on_mean + off_mean) / on_mean
+        self.on_remaining = None
+
+    def _period(self, rng, mean):
+        if mean == 0:
+            return 0.0
+        if self.distribution == 'pareto':
+            scale = mean * (self.alpha - 1) / self.alpha
+            return scale * rng.paretovariate(self.alpha)
+        return rng.expovariate(1.0 / mean)
+
+    def next(self, rng):
+        if self.on_remaining is None:
+            self.on_remaining = self._period(rng, self.on_mean)
+        gap = 0.0
+        while True:
+            candidate = rng.expovariate(self.peak_packet_rate)
+            if candidate <= self.on_remaining:
+                self.on_remaining -= candidate
+                return gap + candidate, self.sizes.sample(rng)
+            # 本ON期结束：跳过OFF期，进入下一个ON期（指数间隔无记忆，可重新抽样）
+            gap += self.on_remaining + self._period(rng, self.off_mean)
+            self.on_remaining = self._period(rng, self.on_mean)
+
+class MMPPArrivals(ArrivalProcess):
+    """
+    马尔可夫调制泊松过程
+    状态i下以 packet_rate*m_i 泊松到达，停留时间服从均值D_i的指数分布，
+    离开时均匀跳到其他状态；倍数按停留时间加权归一化，使长期平均速率等于rate
+    """
+
+    def __init__(self, rate, sizes, multipliers, dwell_means):
+        super().__init__(rate, sizes)
+        if len(multipliers) != len(dwell_means) or len(multipliers) < 2:
+            raise ValueError("MMPP至少需要两个状态，且倍数与停留时间个数一致")
+        if any(not d > 0 for d in dwell_means):
+            raise ValueError("MMPP各状态的停留时间均值必须大于0")
+        if any(not m >= 0 for m in multipliers):
+            raise ValueError("MMPP各状态的速率倍数不能为负")
+        # 均匀跳转时各状态被访问的次数相同，时间占比正比于D_i
+        weighted = sum(m * d for m, d in zip(multipliers, dwell_means)) / sum(dwell_means)
+        if not weighted > 0:
+            raise ValueError("MMPP至少需要一个速率倍数大于0的状态")
+        self.multipliers = [m / weighted for m in multipliers]
+        self.dwell_means = dwell_means
+        self.state = 0
+        self.dwell_remaining = None
+
+    def next(self, rng):
+        if self.dwell_remaining is None:
+            self.state = rng.randrange(len(self.multipliers))
+            self.dwell_remaining = rng.expovariate(1.0 / self.dwell_means[self.state])
+        gap = 0.0
+        while True:
+            state_rate = self.packet_rate * self.multipliers[self.state]
+            candidate = rng.expovariate(state_rate) if state_rate > 0 else float('inf')
+            if candidate <= self.dwell_remaining:
+                self.dwell_remaining -= candidate
+                return gap + candidate, self.sizes.sample(rng)
+            gap += self.dwell_remaining
+            next_state = rng.randrange(len(self.multipliers) - 1)
+            self.state = next_state if next_state < self.state else next_state + 1
+            self.dwell_remaining = rng.expovariate(1.0 / self.dwell_means[self.state])
+
+class TraceArrivals(ArrivalProcess):
+    """
+    按文件回放到达
+    CSV需包含timestamp（秒）和packet_size列（received_data.log、delays_flow_N.csv均可），
+    无表头时取前两列；也可以是binlog.py格式的二进制日志。可按flow_id过滤。忽略rate和包大小分布。
+    """
+
+    def __init__(self, path, flow_id=None):
+        self.path = path
+        self.flow_id = flow_id
+        self.records = self._load(path, flow_id)
+        sizes = [size for _, size in self.records] or [0]
+        super().__init__(0, FixedSize(max(sizes)))
+        self.index = 0
+        self.last_time = self.records[0][0] if self.records else 0.0
+
+    @staticmethod
+    def _load(path, flow_id):
+        if is_binary_log(path):
+            records = read_binary_log(path)
+            if flow_id is not None:
+                records = records[records['flow_id'] == flow_id]
+            return sorted(zip(records['timestamp'].tolist(), records['packet_size'].tolist()))
+        with open(path, newline='') as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            return []
+        header = [name.strip() for name in rows[0]]
+        if 'timestamp' in header:
+            time_col = header.index('timestamp')
+            size_col = header.index('packet_size')
+            flow_col = header.index('flow_id') if 'flow_id' in header else None
+            rows = rows[1:]
+        else:
+            time_col, size_col, flow_col = 0, 1, None
+        records = []
+        for row in rows:
+            if not row:
+                continue
+            if flow_id is not None and flow_col is not None and int(row[flow_col]) != flow_id:
+                continue
+            records.append((float(row[time_col]), int(row[size_col])))
+        records.sort()
+        return records
+
+    def next(self, rng):
+        if self.index >= len(self.records):
+            return None
+        timestamp, size = self.records[self.index]
+        self.index += 1
+        gap = max(0.0, timestamp - self.last_time)
+        self.last_time = timestamp
+        return gap, size
+
+ARRIVAL_MODELS = ('cbr', 'poisson', 'onoff', 'mmpp', 'trace')
+
+def parse_arrival(spec, rate, sizes):
+    """
+    解析到达模型配置
+    :param rate: 平均速率（字节/秒）
+    :param sizes: 包大小分布对象
+    """
+    kind, _, rest = (spec or 'cbr').partition(':')
+    params = rest.split(':') if rest else []
+    try:
+        if kind == 'cbr':
+            return CBRArrivals(rate, sizes)
+        if kind == 'poisson':
+            return PoissonArrivals(rate, sizes)
+        if kind == 'onoff':
+            distribution = params[2] if len(params) > 2 else 'exp'
+            alpha = float(params[3]) if len(params) > 3 else 1.5
+            return OnOffArrivals(rate, sizes, float(params[0]), float(params[1]),
+                                 distribution, alpha)
+        if kind == 'mmpp':
+            multipliers = [float(m) for m in params[0].split(',')]
+            dwell_means = [float(d) for d in params[1].split(',')]
+            return MMPPArrivals(rate, sizes, multipliers, dwell_means)
+        if kind == 'trace':
+            # 路径中可能含冒号，只把末尾的整数（或空串）当作FLOW_ID
+            path, sep, tail = rest.rpartition(':')
+            if not sep or not (tail.isdigit() or tail == ''):
+                path, tail = rest, ''
+            if not path:
+                raise ValueError("缺少trace文件路径")
+            return TraceArrivals(path, int(tail) if tail else None)
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"到达模型配置错误: {spec} ({e})")
+    raise ValueError(f"未知的到达模型: {spec}，可选: {', '.join(ARRIVAL_MODELS)}")
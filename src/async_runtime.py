@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+asyncio运行时
+用DatagramProtocol驱动UDPSender和UDPReceiver：发送节奏、回发处理和统计都在同一个事件循环中完成，
+不再为每个socket创建阻塞线程，一个进程可以托管多个发送器和接收器；
+停止时直接取消协程并关闭transport，无需等待0.1秒的socket超时
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sender import UDPSender
+from receiver import UDPReceiver
+
+LOG_FLUSH_INTERVAL = 1.0  # 接收器数据日志的刷新间隔（秒）
+
+class SenderProtocol(asyncio.DatagramProtocol):
+    """发送器socket上的协议：回发的数据包交给UDPSender.handle_echo"""
+
+    def __init__(self, sender):
+        self.sender = sender
+
+    def datagram_received(self, data, addr):
+        try:
+            self.sender.handle_echo(data, time.time())
+        except Exception as e:
+            self.sender.logger.error("接收数据包失败: %s", e)
+
+    def error_received(self, exc):
+        # transport.sendto失败时不抛出异常，而是回调到这里
+        self.sender.send_failed(exc)
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    """接收器socket上的协议：每个数据报交给UDPReceiver.process_packet"""
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.process_packet(data, addr, time.time())
+
+    def error_received(self, exc):
+        self.receiver.logger.error("接收错误: %s", exc)
+
+class AsyncSender:
+    """在事件循环上运行的UDPSender"""
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.transports = []
+
+    async def open(self, loop):
+        """把UDPSender已创建的socket交给事件循环，发送出口改为transport.sendto"""
+        sender = self.sender
+        recv_transport, _ = await loop.create_datagram_endpoint(
+            lambda: SenderProtocol(sender), sock=sender.recv_socket)
+        send_transport, _ = await loop.create_datagram_endpoint(
+            lambda: SenderProtocol(sender), sock=sender.send_socket)
+        sender._send = send_transport.sendto
+        self.transports = [recv_transport, send_transport]
+        sender.running = True
+        sender.logger.info(f"Sender {sender.flow_id} 已启动（asyncio）")
+
+    async def pace(self):
+        """
+        发送协程，计划时刻与UDPSender.send_loop相同；
+        未到期时让出事件循环休眠，追赶时每连续发送burst个包让出一次，使回发和其他流得到处理
+        """
+        sender = self.sender
+        sender.logger.info(f"开始发送数据包，目标速率: {sender.rate} 字节/秒, "
+                           f"到达模型: {type(sender.arrivals).__name__}")
+        clock = time.perf_counter
+        send_packet = sender.send_packet
+        burst = sender.burst
+        now = clock()
+        sent_in_burst = 0
+
+        for next_due, packet_size in sender.schedule():
+            if next_due > now:
+                await asyncio.sleep(next_due - clock())
+                now = clock()
+                sent_in_burst = 0
+                sender.schedule_lag = max(0.0, now - next_due)
+            elif sent_in_burst >= burst:
+                await asyncio.sleep(0)
+                now = clock()
+                sent_in_burst = 0
+                sender.schedule_lag = max(0.0, now - next_due)
+
+            send_packet(packet_size)
+            sent_in_burst += 1
+
+        sender.logger.info(f"发送协程结束，共发送 {sender.packets_sent} 个数据包")
+
+    async def close(self):
+        for transport in self.transports:
+            transport.close()
+        await asyncio.sleep(0)  # 让transport完成connection_lost回调
+        self.sender.stop()
+
+class AsyncReceiver:
+    """在事件循环上运行的UDPReceiver"""
+
+    def __init__(self, receiver, stats_interval=5):
+        self.receiver = receiver
+        self.stats_interval = stats_interval
+        self.transport = None
+        self.stats_task = None
+        self.flush_handle = None
+
+    async def open(self, loop):
+        receiver = self.receiver
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: ReceiverProtocol(receiver), sock=receiver.socket)
+        receiver._sendto = self.transport.sendto
+        receiver.running = True
+        self.stats_task = asyncio.create_task(self.report())
+        self.flush_handle = loop.call_later(LOG_FLUSH_INTERVAL, self.flush, loop)
+        receiver.logger.info(f"Receiver启动（asyncio），模式: {receiver.mode}, 端口: {receiver.port}")
+
+    async def report(self):
+        """定期打印统计信息"""
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.receiver.print_statistics()
+
+    def flush(self, loop):
+        """定期刷新数据日志：逐包的datagram_received只写缓冲，不做flush系统调用"""
+        try:
+            self.receiver.flush_log()
+        except Exception as e:
+            self.receiver.logger.error("刷新数据日志失败: %s", e)
+        self.flush_handle = loop.call_later(LOG_FLUSH_INTERVAL, self.flush, loop)
+
+    async def close(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+        if self.stats_task:
+            self.stats_task.cancel()
+        if self.transport:
+            self.transport.close()
+        await asyncio.sleep(0)
+        self.receiver.stop()
+
+class AsyncRuntime:
+    """在一个事件循环中托管多个发送器和接收器"""
+
+    def __init__(self, senders=(), receivers=(), linger=1.0):
+        """
+        :param senders: AsyncSender列表
+        :param receivers: AsyncReceiver列表
+        :param linger: 所有发送器结束后继续等待在途包回发的秒数
+        """
+        self.senders = list(senders)
+        self.receivers = list(receivers)
+        self.linger = linger
+        self.stop_event = None
+
+    def stop(self):
+        if self.stop_event:
+            self.stop_event.set()
+
+    async def run(self, duration=None):
+        """
+        运行直到所有发送器完成（并等待linger秒）、duration秒到期或收到SIGINT/SIGTERM；
+        只有接收器时一直运行到收到信号或duration到期
+        """
+        loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+
+        # 接收器先就绪，避免本进程内的发送器的首批包丢失
+        for receiver in self.receivers:
+            await receiver.open(loop)
+        for sender in self.senders:
+            await sender.open(loop)
+
+        pacers = [asyncio.create_task(sender.pace()) for sender in self.senders]
+        stopped = asyncio.create_task(self.stop_event.wait())
+        finished = asyncio.create_task(asyncio.wait(pacers)) if pacers else None
+        try:
+            if finished:
+                await asyncio.wait({finished, stopped}, timeout=duration,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if finished.done() and not self.stop_event.is_set():
+                    await asyncio.wait({stopped}, timeout=self.linger)
+            else:
+                await asyncio.wait({stopped}, timeout=duration)
+        finally:
+            stopped.cancel()
+            if finished:
+                finished.cancel()
+            for task in pacers:
+                task.cancel()
+            for sender, result in zip(self.senders,
+                                      await asyncio.gather(*pacers, return_exceptions=True)):
+                if isinstance(result, Exception):
+                    sender.sender.logger.error("发送协程异常退出: %r", result)
+            for sender in self.senders:
+                await sender.close()
+            for receiver in self.receivers:
+                await receiver.close()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+
+def parse_receiver(spec, count):
+    """
+    解析 MODE:PORT[:LOG_FILE]，返回 (模式, 端口, 数据日志, 汇总文件)；
+    多个接收器时数据日志默认按端口区分，汇总文件总是按端口区分
+    """
+    parts = spec.split(':')
+    if len(parts) < 2 or parts[0] not in ('stats', 'echo'):
+        raise ValueError(f"接收器配置格式错误: {spec}")
+    port = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        log_file = parts[2]
+    else:
+        log_file = 'received_data.log' if count == 1 else f'received_data_{port}.log'
+    summary_file = 'receiver_summary.txt' if count == 1 else f'receiver_summary_{port}.txt'
+    return parts[0], port, log_file, summary_file
+
+def main():
+    parser = argparse.ArgumentParser(description='asyncio运行时：在一个进程中托管多个Sender/Receiver')
+    parser.add_argument('--sender', dest='senders', action='append', default=[],
+                       help='发送器配置 FLOW_ID:WEIGHT:SIZE:RATE，可重复；RATE单位为字节/秒')
+    parser.add_argument('--receiver', dest='receivers', action='append', default=[],
+                       help='接收器配置 MODE:PORT[:LOG_FILE]，MODE为stats或echo，可重复')
+    parser.add_argument('--arrival', default='cbr',
+                       help='发送器的到达模型: cbr | poisson | onoff:ON:OFF[:exp|pareto[:ALPHA]] | '
+                            'mmpp:M1,M2:D1,D2 | trace:PATH[:FLOW_ID]')
+    parser.add_argument('--size-dist',
+                       help='发送器的包大小分布（默认固定为SIZE）')
+    parser.add_argument('--seed', type=int, help='随机种子（各发送器使用 seed+流ID）')
+    parser.add_argument('--burst', type=int, default=64,
+                       help='落后于计划时连续发送的最大包数，之后让出事件循环（每个包仍单独发送）')
+    parser.add_argument('--window', type=int, default=65536,
+                       help='每个发送器的在途窗口槽位数')
+    parser.add_argument('--router-ip', default='127.0.0.1', help='Router IP地址')
+    parser.add_argument('--router-port', type=int, default=8080, help='Router端口')
+    parser.add_argument('--duration', type=float, default=30,
+                       help='发送时长（秒）；只托管接收器时忽略，运行到收到中断信号')
+    parser.add_argument('--linger', type=float, default=1.0,
+                       help='发送结束后等待在途包回发的秒数')
+
+    args = parser.parse_args()
+    if not args.senders and not args.receivers:
+        parser.error('至少需要 --sender 或 --receiver 之一')
+
+    receivers = []
+    for spec in args.receivers:
+        try:
+            mode, port, log_file, summary_file = parse_receiver(spec, len(args.receivers))
+        except ValueError as e:
+            parser.error(str(e))
+        receivers.append(AsyncReceiver(UDPReceiver(mode=mode, port=port, log_file=log_file,
+                                                   summary_file=summary_file,
+                                                   flight_records=0)))
+    senders = []
+    for spec in args.senders:
+        parts = spec.split(':')
+        if len(parts) != 4:
+            parser.error(f"发送器配置格式错误: {spec}")
+        try:
+            flow_id = int(parts[0])
+            senders.append(AsyncSender(UDPSender(
+                flow_id=flow_id,
+                weight=int(parts[1]),
+                packet_size=int(parts[2]),
+                rate_bps=float(parts[3]),
+                router_ip=args.router_ip,
+                router_port=args.router_port,
+                duration=args.duration,
+                flight_records=0,
+                arrival=args.arrival,
+                size_distribution=args.size_dist,
+                seed=None if args.seed is None else args.seed + flow_id,
+                burst=args.burst,
+                window=args.window
+            )))
+        except ValueError as e:
+            parser.error(str(e))
+
+    runtime = AsyncRuntime(senders, receivers, linger=args.linger)
+    asyncio.run(runtime.run(None if not senders else args.duration + args.linger + 1))
+
+if __name__ == '__main__':
+    main()
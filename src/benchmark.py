@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+微基准测试程序
+测量数据包编解码、流队列、调度器、速率限制器和统计模块的单次操作耗时（ns/op），
+调度器按流数量（10 → 100k）给出扩展曲线，结果输出为JSON，可与基线对比发现性能回退
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from packet_format import ProjectPacket
+from router import FlowQueue, FIFOScheduler, WFQScheduler
+from utils import RateLimiter, Statistics, LatencyHistogram, FlowCounter
+
+DEFAULT_FLOW_COUNTS = [10, 100, 1000, 10000, 100000]
+
+def make_packet(flow_id=1, seq_num=0, weight=1, data_size=1000):
+    return ProjectPacket(src_ip='127.0.0.1', dst_ip='127.0.0.1',
+                         src_port=5000, dst_port=8080, weight=weight,
+                         flow_id=flow_id, seq_num=seq_num,
+                         data=b'X' * data_size)
+
+def measure(setup, run, ops, repeat):
+    """
+    执行repeat轮测量
+    :param setup: 每轮开始前调用，返回传给run的状态（不计时）
+    :param run: run(state) 执行ops次操作
+    :return: 每轮的ns/op列表
+    """
+    samples = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter_ns()
+        run(state)
+        elapsed = time.perf_counter_ns() - start
+        samples.append(elapsed / ops)
+    return samples
+
+class BenchmarkSuite:
+    """基准测试集合"""
+
+    def __init__(self, ops=100000, repeat=5, flow_counts=DEFAULT_FLOW_COUNTS,
+                 new_flow_limit=10000):
+        self.ops = ops
+        self.repeat = repeat
+        self.flow_counts = flow_counts
+        self.new_flow_limit = new_flow_limit
+        self.results = []
+
+    def add(self, name, samples, ops, **params):
+        result = {
+            'name': name,
+            'params': params,
+            'ops': ops,
+            'ns_per_op': statistics.median(samples),
+            'min_ns_per_op': min(samples),
+            'max_ns_per_op': max(samples),
+        }
+        self.results.append(result)
+        label = ' '.join(f'{k}={v}' for k, v in params.items())
+        print(f"  {name:<24} {label:<36} {result['ns_per_op']:>12.1f} ns/op")
+
+    def bench_packet_codec(self):
+        ops = self.ops
+        for data_size in (64, 1000):
+            packet = make_packet(data_size=data_size)
+            packed = packet.pack()
+
+            def run_pack(_):
+                pack = packet.pack
+                for _ in range(ops):
+                    pack()
+            self.add('ProjectPacket.pack', measure(lambda: None, run_pack, ops, self.repeat),
+                     ops, data_size=data_size)
+
+            def run_unpack(_):
+                unpack = ProjectPacket.unpack
+                for _ in range(ops):
+                    unpack(packed)
+            self.add('ProjectPacket.unpack', measure(lambda: None, run_unpack, ops, self.repeat),
+                     ops, data_size=data_size)
+
+    def bench_flow_queue(self):
+        ops = min(self.ops, 1000)  # 受FlowQueue默认容量限制
+        packet = make_packet()
+
+        def run_enqueue(fq):
+            enqueue = fq.enqueue
+            for _ in range(ops):
+                enqueue(packet)
+        self.add('FlowQueue.enqueue',
+                 measure(lambda: FlowQueue(1, max_size=ops), run_enqueue, ops, self.repeat),
+                 ops)
+
+        def setup_full():
+            fq = FlowQueue(1, max_size=ops)
+            for _ in range(ops):
+                fq.enqueue(packet)
+            return fq
+
+        def run_dequeue(fq):
+            dequeue = fq.dequeue
+            for _ in range(ops):
+                dequeue()
+        self.add('FlowQueue.dequeue', measure(setup_full, run_dequeue, ops, self.repeat), ops)
+
+    @staticmethod
+    def build_wfq(packets, backlogged):
+        """
+        直接构造含len(packets)个流的WFQ调度器（不计时的准备阶段）
+        绕开逐个新建流的enqueue路径，否则准备阶段本身就是O(N^2)
+        :param backlogged: 需要放入一个包的流对应的packet列表
+        """
+        scheduler = WFQScheduler()
+        for packet in packets:
+            scheduler.flow_queues[packet.flow_id] = FlowQueue(packet.flow_id, packet.weight)
+        scheduler.flow_ids = sorted(scheduler.flow_queues)
+        for packet in backlogged:
+            scheduler.enqueue(packet)
+        return scheduler
+
+    def bench_schedulers(self):
+        for flow_count in self.flow_counts:
+            packets = [make_packet(flow_id=flow_id, weight=1 + flow_id % 4, data_size=0)
+                       for flow_id in range(1, flow_count + 1)]
+            repeat = self.repeat if flow_count <= 10000 else max(1, self.repeat // 2)
+
+            # 所有流都有积压：每次选包都能立即命中
+            def run_wfq(scheduler):
+                dequeue = scheduler.dequeue
+                for _ in range(flow_count):
+                    dequeue()
+            self.add('get_next_wfq_packet',
+                     measure(lambda: self.build_wfq(packets, packets), run_wfq,
+                             flow_count, repeat),
+                     flow_count, flows=flow_count, backlog='dense')
+
+            # 稀疏积压：只有1%的流有包，轮询需要跳过空队列
+            sparse = packets[::100]
+
+            def run_wfq_sparse(scheduler):
+                dequeue = scheduler.dequeue
+                for _ in range(len(sparse)):
+                    dequeue()
+            self.add('get_next_wfq_packet',
+                     measure(lambda: self.build_wfq(packets, sparse), run_wfq_sparse,
+                             len(sparse), repeat),
+                     len(sparse), flows=flow_count, backlog='sparse')
+
+            def setup_fifo():
+                scheduler = FIFOScheduler(max_size=flow_count)
+                for packet in packets:
+                    scheduler.enqueue(packet)
+                return scheduler
+
+            def run_fifo(scheduler):
+                dequeue = scheduler.dequeue
+                for _ in range(flow_count):
+                    dequeue()
+            self.add('get_next_fifo_packet', measure(setup_fifo, run_fifo,
+                                                     flow_count, repeat),
+                     flow_count, flows=flow_count)
+
+            # 已有流的入队（稳态热路径）
+            def run_wfq_enqueue(scheduler):
+                enqueue = scheduler.enqueue
+                for packet in packets:
+                    enqueue(packet)
+            self.add('WFQScheduler.enqueue',
+                     measure(lambda: self.build_wfq(packets, []), run_wfq_enqueue,
+                             flow_count, repeat),
+                     flow_count, flows=flow_count, flow='existing')
+
+            # 新流入队（每次都会重建有序流列表，代价随流数增长）
+            if flow_count <= self.new_flow_limit:
+                self.add('WFQScheduler.enqueue',
+                         measure(WFQScheduler, run_wfq_enqueue, flow_count, repeat),
+                         flow_count, flows=flow_count, flow='new')
+
+    def bench_rate_limiter(self):
+        ops = self.ops
+
+        def run_consume(limiter):
+            consume = limiter.consume
+            for _ in range(ops):
+                consume(1024)
+        # 带宽足够大，测量的是纯计算开销而非等待
+        self.add('RateLimiter.consume',
+                 measure(lambda: RateLimiter(10 ** 12), run_consume, ops, self.repeat), ops)
+
+    def bench_statistics(self):
+        ops = self.ops
+
+        def run_record(stats):
+            record = stats.record
+            for i in range(ops):
+                record('packets_forwarded', 1, 0.0, flow_id=1, size=1024,
+                       queue_delay_ms=1.5)
+        self.add('Statistics.record', measure(Statistics, run_record, ops, self.repeat), ops)
+
+        def run_hist(hist):
+            record = hist.record
+            for i in range(ops):
+                record(1.5 + (i & 1023) * 0.01)
+        self.add('LatencyHistogram.record',
+                 measure(LatencyHistogram, run_hist, ops, self.repeat), ops)
+
+        def run_counter(counter):
+            record = counter.record
+            for i in range(ops):
+                record(1024, i * 1e-5)
+        self.add('FlowCounter.record', measure(FlowCounter, run_counter, ops, self.repeat), ops)
+
+    def run(self, selected=None):
+        benches = [
+            ('codec', self.bench_packet_codec),
+            ('flow_queue', self.bench_flow_queue),
+            ('scheduler', self.bench_schedulers),
+            ('rate_limiter', self.bench_rate_limiter),
+            ('statistics', self.bench_statistics),
+        ]
+        for name, bench in benches:
+            if selected and name not in selected:
+                continue
+            print(f"[{name}]")
+            bench()
+        return self.results
+
+def result_key(result):
+    return (result['name'], json.dumps(result['params'], sort_keys=True))
+
+def compare(results, baseline_path, threshold):
+    """
+    与基线结果比较
+    :return: 回退项列表 (名称, 参数, 基线ns, 当前ns)
+    """
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base and result['ns_per_op'] > base['ns_per_op'] * (1 + threshold):
+            regressions.append((result['name'], result['params'],
+                                base['ns_per_op'], result['ns_per_op']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='调度器/编解码/速率限制器微基准测试')
+    parser.add_argument('--ops', type=int, default=100000, help='每轮操作次数')
+    parser.add_argument('--repeat', type=int, default=5, help='测量轮数（取中位数）')
+    parser.add_argument('--flow-counts', default=','.join(map(str, DEFAULT_FLOW_COUNTS)),
+                       help='调度器测试的流数量列表，逗号分隔')
+    parser.add_argument('--new-flow-limit', type=int, default=10000,
+                       help='新流入队测试的最大流数量（其代价随流数平方增长）')
+    parser.add_argument('--only', help='只运行指定分组，逗号分隔：'
+                                      'codec,flow_queue,scheduler,rate_limiter,statistics')
+    parser.add_argument('--output', help='JSON结果输出路径，默认 results/benchmarks/bench_<时间>.json')
+    parser.add_argument('--baseline', help='基线JSON文件，用于检测性能回退')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                       help='相对基线变慢超过该比例即视为回退（默认0.2）')
+
+    args = parser.parse_args()
+
+    flow_counts = [int(n) for n in args.flow_counts.split(',') if n]
+    selected = set(args.only.split(',')) if args.only else None
+
+    suite = BenchmarkSuite(args.ops, args.repeat, flow_counts, args.new_flow_limit)
+    results = suite.run(selected)
+
+    output = args.output
+    if not output:
+        results_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'results', 'benchmarks')
+        output = os.path.join(results_dir, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'ops': args.ops,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"✅ 结果已保存: {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"❌ 发现 {len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）:")
+            for name, params, base_ns, current_ns in regressions:
+                print(f"  {name} {params}: {base_ns:.1f} → {current_ns:.1f} ns/op")
+            sys.exit(1)
+        print("✅ 未发现性能回退")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+二进制定长记录日志
+接收数据日志和延迟日志的列相同（timestamp,flow_id,packet_size,sequence_number,delay_ms），
+二进制格式为8字节魔数 + 连续的24字节小端记录，可直接用NumPy结构化dtype整体读入；
+写入端在内存块中用struct.pack_into原地填充记录，块满或超过刷新间隔才写文件，
+不做逐包的文本格式化和flush。
+命令行用于CSV与二进制之间互相转换：
+    python3 src/binlog.py received_data.bin received_data.csv
+"""
+
+import argparse
+import csv
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b'WFQBLOG1'
+RECORD = struct.Struct('<dIIIf')
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('flow_id', '<u4'),
+    ('packet_size', '<u4'),
+    ('sequence_number', '<u4'),
+    ('delay_ms', '<f4'),
+])
+COLUMNS = RECORD_DTYPE.names
+CSV_HEADER = ','.join(COLUMNS) + '\n'
+
+class BinaryLogWriter:
+    """缓冲写入的二进制记录日志"""
+
+    def __init__(self, path, block_records=8192, flush_interval=1.0):
+        """
+        :param block_records: 内存块可容纳的记录数，写满即写入文件
+        :param flush_interval: maybe_flush的最小刷新间隔（秒）
+        """
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.capacity = block_records
+        self.buffer = bytearray(RECORD.size * block_records)
+        self.count = 0
+        self.records = 0
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self._pack = RECORD.pack_into
+
+    def write(self, timestamp, flow_id, packet_size, seq_num, delay_ms):
+        """追加一条记录"""
+        self._pack(self.buffer, self.count * RECORD.size,
+                   timestamp, flow_id, packet_size, seq_num, delay_ms)
+        self.count += 1
+        if self.count == self.capacity:
+            self.flush()
+
+    def flush(self):
+        """把内存块中的记录写入文件"""
+        if self.count:
+            self.file.write(memoryview(self.buffer)[:self.count * RECORD.size])
+            self.records += self.count
+            self.count = 0
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        """距上次刷新超过flush_interval时刷新（供收发循环定期调用）"""
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def is_binary_log(path):
+    """根据魔数判断是否为二进制日志"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_binary_log(path):
+    """读取二进制日志为结构化数组（忽略写入中断留下的不完整尾记录）"""
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD_DTYPE.itemsize
+    return np.fromfile(path, dtype=RECORD_DTYPE, count=max(count, 0), offset=len(MAGIC))
+
+def open_binary_log(path):
+    """以只读memmap打开二进制日志，按需分块访问，不把整个文件读入内存"""
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD_DTYPE.itemsize
+    if count <= 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=len(MAGIC), shape=(count,))
+
+def read_csv_log(path):
+    """读取CSV日志为同样的结构化数组"""
+    rows = []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # 表头
+        for row in reader:
+            if len(row) >= 5:
+                rows.append((float(row[0]), int(row[1]), int(row[2]), int(row[3]), float(row[4])))
+    return np.array(rows, dtype=RECORD_DTYPE)
+
+def load_log(path):
+    """按文件内容自动识别格式，返回结构化数组"""
+    if is_binary_log(path):
+        return read_binary_log(path)
+    return read_csv_log(path)
+
+def write_binary_log(path, records):
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        np.asarray(records, dtype=RECORD_DTYPE).tofile(f)
+
+def write_csv_log(path, records):
+    with open(path, 'w') as f:
+        f.write(CSV_HEADER)
+        for timestamp, flow_id, packet_size, seq_num, delay_ms in records.tolist():
+            f.write(f"{timestamp},{flow_id},{packet_size},{seq_num},{delay_ms:.2f}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description='二进制记录日志与CSV互相转换')
+    parser.add_argument('input', help='输入日志（CSV或二进制，自动识别）')
+    parser.add_argument('output', help='输出文件')
+    parser.add_argument('--to', choices=['csv', 'binary'],
+                       help='输出格式（默认与输入相反）')
+
+    args = parser.parse_args()
+    binary_input = is_binary_log(args.input)
+    records = read_binary_log(args.input) if binary_input else read_csv_log(args.input)
+    target = args.to or ('csv' if binary_input else 'binary')
+    if target == 'csv':
+        write_csv_log(args.output, records)
+    else:
+        write_binary_log(args.output, records)
+    print(f"✅ 已转换 {len(records)} 条记录: {args.output}")
+
+if __name__ == '__main__':
+    main()
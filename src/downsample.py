@@ -0,0 +1,119 @@
+"""
+绘图前的序列降采样
+在数据交给Matplotlib之前把百万级的点降到与输出像素同量级，保持图形外观：
+- lttb:   Largest-Triangle-Three-Buckets，适合折线（累计吞吐量），保留拐点和形状
+- minmax: 每个像素列保留最小值和最大值的点，保留尖峰和长尾的包络
+- pixel:  在二维网格的每个有点的格子中保留一个点，并叠加minmax包络，适合散点（延迟），
+          网格比散点标记更细，因此被点覆盖的区域和原图一致；有点的格子太多时逐级加粗网格
+- exact:  不降采样
+点数不超过max_points时任何方式都原样返回，否则结果不超过max_points个点
+"""
+
+import numpy as np
+
+METHODS = ('exact', 'lttb', 'minmax', 'pixel')
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets降采样，返回选中的点的下标（含首尾点）"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # 首尾点单独保留，中间n-2个点均分为threshold-2个桶：第i个桶为 [bounds[i], bounds[i+1])
+    every = (n - 2) / (threshold - 2)
+    bounds = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    # 用前缀和一次算出所有桶的均值点
+    cx = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    cy = np.concatenate(([0.0], np.cumsum(y, dtype=np.float64)))
+    counts = bounds[1:] - bounds[:-1]
+    mean_x = (cx[bounds[1:]] - cx[bounds[:-1]]) / counts
+    mean_y = (cy[bounds[1:]] - cy[bounds[:-1]]) / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        if i + 1 < threshold - 2:
+            next_x, next_y = mean_x[i + 1], mean_y[i + 1]
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # 以上一个选中点和下一个桶的均值点为底，选本桶中三角形面积最大的点
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax(x, y, columns):
+    """按x等分为columns列，每列保留y最小和最大的点，返回按x排序的下标（y不能含NaN）"""
+    n = len(x)
+    if n <= 2 * columns:
+        return np.arange(n)
+    x0, x1 = float(np.min(x)), float(np.max(x))
+    if x1 <= x0:
+        return np.array([int(np.argmin(y)), int(np.argmax(y))])
+    order = None
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], y[order]
+    column = np.minimum(((x - x0) / (x1 - x0) * columns).astype(np.int64), columns - 1)
+    # x有序时每列是连续的一段，用reduceat求每段的极值，再取每段第一个等于极值的点
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    segment = np.repeat(np.arange(len(starts)), counts)
+    picks = []
+    for extreme in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == np.repeat(extreme.reduceat(y, starts), counts))
+        picks.append(hits[np.r_[True, segment[hits][1:] != segment[hits][:-1]]])
+    selected = np.unique(np.concatenate(picks))
+    return selected if order is None else order[selected]
+
+def pixel(x, y, columns, rows, max_points=None, envelope_columns=None):
+    """
+    每个有点的网格格子保留一个点，并保留每列的极值点，返回按x排序的下标
+    :param max_points: 结果点数上限；超过时把网格的行列数逐级缩小为约1/√2，直到不超过
+    :param envelope_columns: minmax包络的列数（默认与网格列数相同），包络最多占2倍列数个点
+    """
+    n = len(x)
+    envelope_columns = envelope_columns or columns
+    x0, x1 = float(np.min(x)), float(np.max(x))
+    y0, y1 = float(np.min(y)), float(np.max(y))
+    fx = (x - x0) / ((x1 - x0) or 1.0)
+    fy = (y - y0) / ((y1 - y0) or 1.0)
+
+    def occupy(fx, fy, columns, rows):
+        cx = np.minimum((fx * columns).astype(np.int64), columns - 1)
+        cy = np.minimum((fy * rows).astype(np.int64), rows - 1)
+        return np.unique(cx * rows + cy, return_index=True)[1]
+
+    occupied = occupy(fx, fy, columns, rows)
+    envelope = minmax(x, y, envelope_columns) if n > 2 * envelope_columns else occupied[:0]
+    selected = np.union1d(occupied, envelope)
+    # 加粗网格时只在已占用格子的代表点上重新去重，不再遍历全部数据
+    while max_points and len(selected) > max_points and (columns > 1 or rows > 1):
+        columns, rows = max(1, int(columns / 1.4)), max(1, int(rows / 1.4))
+        occupied = occupied[occupy(fx[occupied], fy[occupied], columns, rows)]
+        selected = np.union1d(occupied, envelope)
+    return selected[np.argsort(x[selected], kind='stable')]
+
+def downsample(x, y, method='lttb', max_points=4000):
+    """
+    按指定方式降采样，返回 (x, y)
+    :param method: exact | lttb | minmax | pixel
+    :param max_points: 结果点数上限（minmax为列数的两倍；pixel的网格边长从sqrt(8*max_points)起，
+                       有点的格子过多时逐级缩小，包络最多占一半），不超过时原样返回
+    """
+    if method not in METHODS:
+        raise ValueError(f"未知的降采样方式: {method}，可选: {', '.join(METHODS)}")
+    if method == 'exact' or len(x) <= max_points:
+        return x, y
+    if method == 'lttb':
+        selected = lttb(x, y, max_points)
+    elif method == 'minmax':
+        selected = minmax(x, y, max(1, max_points // 2))
+    else:
+        side = max(1, int(np.sqrt(8 * max_points)))
+        selected = pixel(x, y, side, side, max_points, min(side, max(1, max_points // 4)))
+    return x[selected], y[selected]
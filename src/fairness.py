@@ -0,0 +1,175 @@
+"""
+公平性度量模块
+在Router运行时增量计算：
+- 流体GPS（广义处理器共享）参考服务量，以及各流相对GPS的服务滞后（service lag）
+  GPS参考按Router实际转发的字节数推进（总服务量与Router一致），
+  因此令牌桶突发等出口速率波动不会计入，只衡量调度顺序本身的公平性
+- 滑动窗口内各流"实际服务/GPS服务"之比的Jain公平性指数
+"""
+
+import heapq
+from collections import deque, defaultdict
+
+class GPSReference:
+    """
+    流体GPS参考服务器
+    使用虚拟时间V：每服务1字节V增加 1/W_active（W_active为GPS中积压流的权重和），
+    流i的虚拟完成时间F_i = max(F_i, V) + bytes/w_i；
+    流i在GPS中已获得的服务 = 到达字节数 - w_i * max(0, F_i - V)。
+    每次到达/推进为O(log N)。
+    """
+
+    def __init__(self):
+        self.virtual_time = 0.0
+        self.active_weight = 0
+        self.active = set()
+        self.heap = []  # (完成时间F, flow_id)，可能含过期项
+        self.finish = {}
+        self.weights = {}
+        self.arrived = defaultdict(int)
+
+    def advance(self, work):
+        """GPS服务work字节，按权重分给当前积压的流"""
+        heap = self.heap
+        while work > 0 and self.active_weight > 0:
+            finish, flow_id = heap[0]
+            needed = (finish - self.virtual_time) * self.active_weight
+            if needed > work:
+                self.virtual_time += work / self.active_weight
+                break
+            # 该流在GPS中服务完毕
+            work -= max(needed, 0)
+            self.virtual_time = max(self.virtual_time, finish)
+            heapq.heappop(heap)
+            if flow_id in self.active and self.finish[flow_id] == finish:
+                self.active.discard(flow_id)
+                self.active_weight -= self.weights[flow_id]
+
+    def arrive(self, flow_id, weight, size):
+        """流flow_id到达size字节"""
+        weight = self.weights.setdefault(flow_id, max(weight, 1))
+        if flow_id in self.active:
+            finish = self.finish[flow_id] + size / weight
+        else:
+            finish = self.virtual_time + size / weight
+            self.active.add(flow_id)
+            self.active_weight += weight
+        self.finish[flow_id] = finish
+        self.arrived[flow_id] += size
+        heapq.heappush(self.heap, (finish, flow_id))
+
+    def served(self, flow_id):
+        """流flow_id在GPS中截至当前已获得的服务（字节）"""
+        if flow_id in self.active:
+            backlog = self.weights[flow_id] * (self.finish[flow_id] - self.virtual_time)
+            return self.arrived[flow_id] - max(backlog, 0)
+        return self.arrived[flow_id]
+
+class FairnessTracker:
+    """
+    运行时公平性跟踪
+    接收线程只调用on_arrival（deque.append，在GIL下原子）；
+    其余方法只应由转发线程调用，因此GPS状态无需加锁。
+    """
+
+    def __init__(self, capacity, window=1.0, step=0.25):
+        """
+        :param capacity: 链路容量（字节/秒），仅用于把服务滞后折算为时间
+        :param window: Jain指数的滑动窗口长度（秒）
+        :param step: 滑动步长（秒），每步对所有流做一次快照
+        """
+        self.gps = GPSReference()
+        self.capacity = capacity
+        self.window = window
+        self.step = step
+        self.arrivals = deque()
+        self.service = defaultdict(int)  # flow_id -> 实际转发字节数
+        self.max_lag = {}  # flow_id -> 最大服务滞后（字节，正值表示落后于GPS）
+        self.snapshots = deque()  # (时刻, {flow_id: (实际服务, GPS服务)})
+        self.next_snapshot = None
+        self.jain_latest = None
+        self.jain_min = None
+        self.jain_sum = 0.0
+        self.jain_count = 0
+
+    def on_arrival(self, flow_id, weight, size):
+        """记录一个成功入队的数据包（接收线程调用）"""
+        self.arrivals.append((flow_id, weight, size))
+
+    def _drain(self):
+        arrive = self.gps.arrive
+        arrivals = self.arrivals
+        while arrivals:
+            arrive(*arrivals.popleft())
+
+    def on_departure(self, now, flow_id, size):
+        """记录一个转发完成的数据包，并采样该流的服务滞后"""
+        self._drain()
+        self.gps.advance(size)
+        self.service[flow_id] += size
+        lag = self.gps.served(flow_id) - self.service[flow_id]
+        if lag > self.max_lag.get(flow_id, float('-inf')):
+            self.max_lag[flow_id] = lag
+        self._maybe_snapshot(now)
+
+    def poll(self, now):
+        """空闲时调用，保证没有转发时窗口仍然推进"""
+        self._drain()
+        self._maybe_snapshot(now)
+
+    def _maybe_snapshot(self, now):
+        if self.next_snapshot is None:
+            self.next_snapshot = now
+        if now < self.next_snapshot:
+            return
+        self.next_snapshot = now + self.step
+
+        gps = self.gps
+        current = {flow_id: (served, gps.served(flow_id))
+                   for flow_id, served in self.service.items()}
+        for flow_id in gps.arrived:
+            if flow_id not in current:
+                current[flow_id] = (0, gps.served(flow_id))
+        self.snapshots.append((now, current))
+
+        # 找到窗口起点的快照
+        snapshots = self.snapshots
+        while len(snapshots) > 1 and snapshots[1][0] <= now - self.window:
+            snapshots.popleft()
+        start_time, start = snapshots[0]
+        if now - start_time < self.window:
+            return
+
+        index = self.jain_index(start, current)
+        if index is not None:
+            self.jain_latest = index
+            self.jain_min = index if self.jain_min is None else min(self.jain_min, index)
+            self.jain_sum += index
+            self.jain_count += 1
+
+    @staticmethod
+    def jain_index(start, end):
+        """
+        计算窗口内的Jain公平性指数
+        x_i = 窗口内实际服务 / 窗口内GPS服务，只统计GPS中获得服务的流；
+        与GPS完全一致时为1，越不公平越接近1/n
+        """
+        ratios = []
+        for flow_id, (served, gps_served) in end.items():
+            served_before, gps_before = start.get(flow_id, (0, 0))
+            gps_delta = gps_served - gps_before
+            if gps_delta > 0:
+                ratios.append((served - served_before) / gps_delta)
+        if not ratios:
+            return None
+        square_sum = sum(x * x for x in ratios)
+        if square_sum == 0:
+            return None
+        return sum(ratios) ** 2 / (len(ratios) * square_sum)
+
+    def jain_mean(self):
+        return self.jain_sum / self.jain_count if self.jain_count else None
+
+    def max_lag_ms(self, flow_id):
+        """最大服务滞后折算为链路传输时间（毫秒）"""
+        return self.max_lag.get(flow_id, 0) / self.capacity * 1000
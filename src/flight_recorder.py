@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+飞行记录器模块
+在固定大小的二进制环形缓冲区中保存最近的数据包事件，可通过信号按需转储，
+并提供解码工具把转储文件还原为 analyze_results.py 可直接读取的CSV
+"""
+
+import argparse
+import itertools
+import os
+import signal
+import struct
+import time
+from collections import defaultdict
+
+# 事件类型
+EVENT_RECV = 1      # 收到数据包（router/receiver）
+EVENT_ENQUEUE = 2   # 入队成功（router）
+EVENT_DROP = 3      # 队列已满被丢弃（router）
+EVENT_FORWARD = 4   # 转发完成（router）
+EVENT_SEND = 5      # 发出数据包（sender）
+EVENT_ACK = 6       # 收到回发（sender）
+
+EVENT_NAMES = {
+    EVENT_RECV: 'recv',
+    EVENT_ENQUEUE: 'enqueue',
+    EVENT_DROP: 'drop',
+    EVENT_FORWARD: 'forward',
+    EVENT_SEND: 'send',
+    EVENT_ACK: 'ack',
+}
+
+# 各角色的 (起始事件, 终止事件)，用于计算延迟和生成CSV
+ROLE_EVENTS = {
+    'router': (EVENT_RECV, EVENT_FORWARD),
+    'sender': (EVENT_SEND, EVENT_ACK),
+    'receiver': (None, EVENT_RECV),
+}
+
+# 记录格式：时间戳ns(8) + 流ID(4) + 序列号(4) + 包大小(4) + 事件类型(1) + 填充(3) = 24字节
+RECORD_FORMAT = '<qIIIB3x'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# 文件头：魔数(8) + 角色(16) + 记录大小(4) + 容量(4) + 记录数(8) = 40字节
+MAGIC = b'WFQFR01\0'
+FILE_HEADER_FORMAT = '<8s16sIIQ'
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FORMAT)
+
+class FlightRecorder:
+    """
+    数据包事件环形缓冲区
+    写入只是一次struct.pack_into，槽位由itertools.count分配（在GIL下原子），
+    因此收发多个线程可以无锁并发记录。
+    """
+
+    def __init__(self, role, capacity=65536):
+        """
+        :param role: 'router'、'sender' 或 'receiver'
+        :param capacity: 环形缓冲区可容纳的事件数
+        """
+        self.role = role
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.counter = itertools.count()
+        self.written = 0
+        self._pack_into = struct.Struct(RECORD_FORMAT).pack_into
+
+    def record(self, event, flow_id, seq_num, size, timestamp_ns=None):
+        """记录一个事件"""
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        index = next(self.counter)
+        self._pack_into(self.buffer, (index % self.capacity) * RECORD_SIZE,
+                        timestamp_ns, flow_id, seq_num, size, event)
+        if index >= self.written:
+            self.written = index + 1
+
+    def snapshot(self):
+        """按时间顺序返回缓冲区中的记录字节"""
+        written = self.written
+        data = bytes(self.buffer)
+        if written <= self.capacity:
+            return data[:written * RECORD_SIZE], written
+        start = (written % self.capacity) * RECORD_SIZE
+        return data[start:] + data[:start], self.capacity
+
+    def dump(self, path):
+        """把当前缓冲区转储到文件"""
+        records, count = self.snapshot()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(struct.pack(FILE_HEADER_FORMAT, MAGIC,
+                                self.role.encode('ascii'), RECORD_SIZE,
+                                self.capacity, count))
+            f.write(records)
+        return path
+
+    def install_signal_handler(self, dump_dir, logger=None, signum=None):
+        """
+        注册信号处理：收到信号（默认SIGUSR1）时把缓冲区转储到dump_dir
+        文件名为 flight_<role>_<pid>_<时间>.bin
+        """
+        if signum is None:
+            signum = getattr(signal, 'SIGUSR1', None)
+            if signum is None:
+                return  # 平台不支持SIGUSR1
+
+        def handler(signo, frame):
+            path = os.path.join(
+                dump_dir,
+                f"flight_{self.role}_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.bin"
+            )
+            self.dump(path)
+            if logger:
+                logger.info("飞行记录器已转储: %s", path)
+
+        signal.signal(signum, handler)
+
+def read_dump(path):
+    """
+    读取转储文件
+    :return: (role, 记录列表)，记录为 (timestamp_ns, flow_id, seq_num, size, event)
+    """
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER_SIZE)
+        magic, role, record_size, capacity, count = struct.unpack(
+            FILE_HEADER_FORMAT, header)
+        if magic != MAGIC:
+            raise ValueError(f"不是飞行记录器转储文件: {path}")
+        if record_size != RECORD_SIZE:
+            raise ValueError(f"记录大小不匹配: {record_size} != {RECORD_SIZE}")
+        data = f.read(count * RECORD_SIZE)
+    return role.rstrip(b'\0').decode('ascii'), list(struct.iter_unpack(RECORD_FORMAT, data))
+
+def decode_to_csv(dump_path, output_dir, prefix=''):
+    """
+    将转储文件解码为现有CSV格式
+    - {prefix}received_data.log：终止事件（同receiver数据日志格式，相对时间）
+    - {prefix}delays_flow_<id>.csv：起止事件配对得到的延迟（同sender延迟日志格式）
+    :return: 生成的文件路径列表
+    """
+    role, records = read_dump(dump_path)
+    start_event, end_event = ROLE_EVENTS.get(role, (None, EVENT_RECV))
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = []
+
+    start_times = {}
+    finished = []  # (timestamp_ns, flow_id, size, seq, delay_ms)
+    for timestamp_ns, flow_id, seq_num, size, event in records:
+        if event == start_event:
+            start_times[(flow_id, seq_num)] = timestamp_ns
+        elif event == end_event:
+            started = start_times.pop((flow_id, seq_num), None)
+            delay = (timestamp_ns - started) / 1e6 if started is not None else 0
+            finished.append((timestamp_ns, flow_id, size, seq_num, delay))
+
+    received_path = os.path.join(output_dir, f'{prefix}received_data.log')
+    with open(received_path, 'w') as f:
+        f.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+        base = finished[0][0] if finished else 0
+        for timestamp_ns, flow_id, size, seq_num, delay in finished:
+            f.write(f"{(timestamp_ns - base) / 1e9},{flow_id},{size},{seq_num},{delay:.2f}\n")
+    outputs.append(received_path)
+
+    if start_event is not None:
+        per_flow = defaultdict(list)
+        for item in finished:
+            per_flow[item[1]].append(item)
+        for flow_id in sorted(per_flow):
+            delay_path = os.path.join(output_dir, f'{prefix}delays_flow_{flow_id}.csv')
+            with open(delay_path, 'w') as f:
+                f.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+                for timestamp_ns, _, size, seq_num, delay in per_flow[flow_id]:
+                    f.write(f"{timestamp_ns / 1e9},{flow_id},{size},{seq_num},{delay:.2f}\n")
+            outputs.append(delay_path)
+
+    return outputs
+
+def main():
+    parser = argparse.ArgumentParser(description='飞行记录器转储文件解码')
+    parser.add_argument('dump_file', help='转储文件路径')
+    parser.add_argument('--output-dir', default='.', help='CSV输出目录')
+    parser.add_argument('--prefix', default='',
+                       help='输出文件名前缀，如 wfq_')
+    parser.add_argument('--events', action='store_true',
+                       help='只打印事件列表，不生成CSV')
+
+    args = parser.parse_args()
+
+    if args.events:
+        role, records = read_dump(args.dump_file)
+        print(f"角色: {role}, 事件数: {len(records)}")
+        print('timestamp_ns,flow_id,sequence_number,packet_size,event')
+        for timestamp_ns, flow_id, seq_num, size, event in records:
+            print(f"{timestamp_ns},{flow_id},{seq_num},{size},"
+                  f"{EVENT_NAMES.get(event, event)}")
+        return
+
+    for path in decode_to_csv(args.dump_file, args.output_dir, args.prefix):
+        print(f"✅ 已生成: {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+回环压力测试程序
+在本机启动Router（子进程）和轻量接收端（子进程），由进程内的多个流逐档提高发送速率，
+直到丢包率或p99端到端延迟超出SLO，报告各算法/包大小/流数量下的最大可持续pps和Mbps
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from packet_format import ProjectPacket, SEQ_OFFSET, build_template
+from utils import LatencyHistogram
+
+# 负载开头的时间戳：发送时刻monotonic_ns(8) + 档位编号(4)
+STAMP = struct.Struct('!qI')
+PROBE_STEP = 0xFFFFFFFF  # 探测包使用的档位编号
+
+MIN_PACKET_SIZE = ProjectPacket.HEADER_SIZE + STAMP.size
+
+def sink_main(port, conn):
+    """
+    轻量接收端（独立进程）
+    只统计每档收到的包数和端到端延迟，避免Receiver自身的日志开销成为瓶颈；
+    通过conn接收 ('report', step) / ('stop',) 命令
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind(('127.0.0.1', port))
+    sock.settimeout(0.05)
+    conn.send('ready')
+
+    steps = {}  # step -> [包数, LatencyHistogram]
+    unpack_stamp = STAMP.unpack_from
+    header_size = ProjectPacket.HEADER_SIZE
+    received = 0
+    while True:
+        if received % 256 == 0 and conn.poll():
+            command = conn.recv()
+            if command[0] == 'stop':
+                break
+            entry = steps.pop(command[1], None)
+            if entry:
+                conn.send((entry[0], entry[1].to_dict()))
+            else:
+                conn.send((0, None))
+        try:
+            data = sock.recv(65535)
+        except socket.timeout:
+            received = 0  # 空闲时也检查命令
+            continue
+        now_ns = time.monotonic_ns()
+        received += 1
+        if len(data) < MIN_PACKET_SIZE:
+            continue
+        send_ns, step = unpack_stamp(data, header_size)
+        entry = steps.get(step)
+        if entry is None:
+            entry = steps[step] = [0, LatencyHistogram()]
+        entry[0] += 1
+        entry[1].record((now_ns - send_ns) / 1e6)
+    sock.close()
+
+class LoadGenerator:
+    """进程内多流发送端，单线程按目标速率在各流之间轮转发送"""
+
+    def __init__(self, router_address, flow_count, packet_size):
+        self.router_address = router_address
+        self.flows = []
+        for flow_id in range(1, flow_count + 1):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', 0))
+            template = build_template(flow_id, flow_id, packet_size,
+                                      src_port=sock.getsockname()[1],
+                                      dst_port=router_address[1])
+            self.flows.append([sock, template, 0])
+        self.send_errors = 0
+
+    def send_one(self, step):
+        """每个流发一个探测包"""
+        for flow in self.flows:
+            self._send(flow, step)
+
+    def _send(self, flow, step):
+        sock, template, seq = flow
+        struct.pack_into('!I', template, SEQ_OFFSET, seq)
+        STAMP.pack_into(template, ProjectPacket.HEADER_SIZE, time.monotonic_ns(), step)
+        try:
+            sock.sendto(template, self.router_address)
+        except OSError:
+            self.send_errors += 1  # 如ENOBUFS，计入丢包
+            return
+        flow[2] = (seq + 1) & 0xFFFFFFFF
+
+    def run_step(self, step, rate_pps, duration, burst=64):
+        """
+        以rate_pps发送duration秒
+        :return: (发送包数, 实际发送速率pps)
+        """
+        flows = self.flows
+        flow_count = len(flows)
+        send = self._send
+        sent = 0
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= duration:
+                break
+            due = int(elapsed * rate_pps) - sent
+            if due <= 0:
+                time.sleep(min(0.0005, (sent + 1) / rate_pps - elapsed))
+                continue
+            for _ in range(min(due, burst)):
+                send(flows[sent % flow_count], step)
+                sent += 1
+        elapsed = time.perf_counter() - start
+        return sent, sent / elapsed if elapsed else 0
+
+    def close(self):
+        for sock, _, _ in self.flows:
+            sock.close()
+
+def start_router(algorithm, bandwidth_kbps, router_port, sink_port):
+    """以子进程启动Router（不启用飞行记录器，避免额外开销）"""
+    router_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'router.py')
+    return subprocess.Popen(
+        [sys.executable, router_script,
+         '--algorithm', algorithm,
+         '--bandwidth', str(bandwidth_kbps),
+         '--port', str(router_port),
+         '--receiver-ip', '127.0.0.1',
+         '--receiver-port', str(sink_port),
+         '--flight-records', '0'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def stop_router(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def report(conn, step):
+    conn.send(('report', step))
+    count, hist = conn.recv()
+    return count, LatencyHistogram.from_dict(hist) if hist else LatencyHistogram()
+
+def wait_ready(generator, conn, timeout=10.0):
+    """发送探测包直到接收端经Router收到为止"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        generator.send_one(PROBE_STEP)
+        time.sleep(0.2)
+        count, _ = report(conn, PROBE_STEP)
+        if count:
+            return True
+    return False
+
+def run_case(args, algorithm, packet_size, flow_count, conn):
+    """
+    对一个 (算法, 包大小, 流数量) 组合逐档加压
+    :return: (每档结果列表, 最大可持续档位结果或None)
+    """
+    router = start_router(algorithm, args.bandwidth, args.router_port, args.sink_port)
+    generator = LoadGenerator(('127.0.0.1', args.router_port), flow_count, packet_size)
+    rows = []
+    best = None
+    try:
+        if not wait_ready(generator, conn):
+            print(f"❌ Router未就绪: {algorithm}")
+            return rows, best
+
+        step = 0
+        rate = args.start_pps
+        while rate <= args.max_pps:
+            errors_before = generator.send_errors
+            sent, offered = generator.run_step(step, rate, args.step_duration)
+            time.sleep(args.settle)  # 等待队列排空、在途包到达
+            received, hist = report(conn, step)
+
+            loss = 1 - received / sent if sent else 0
+            p99 = hist.percentile(99) if hist.count else 0
+            generator_limited = offered < rate * 0.95
+            passed = (loss <= args.max_loss and p99 <= args.max_p99_ms
+                      and not generator_limited)
+            row = {
+                'algorithm': algorithm,
+                'packet_size': packet_size,
+                'flows': flow_count,
+                'target_pps': rate,
+                'offered_pps': round(offered, 1),
+                'delivered_pps': round(received / args.step_duration, 1),
+                'mbps': round(received / args.step_duration * packet_size * 8 / 1e6, 3),
+                'loss': round(loss, 5),
+                'send_errors': generator.send_errors - errors_before,
+                'p50_ms': round(hist.percentile(50), 3) if hist.count else 0,
+                'p99_ms': round(p99, 3),
+                'passed': passed,
+            }
+            rows.append(row)
+            status = '✅' if passed else '❌'
+            print(f"  {status} 目标 {rate:>9.0f} pps | 实发 {offered:>9.0f} | "
+                  f"交付 {row['delivered_pps']:>9.0f} pps | 丢包 {loss:6.2%} | "
+                  f"p99 {p99:8.3f} ms")
+
+            if not passed:
+                if generator_limited:
+                    print("  ⚠️ 发送端已达上限，结果受发送端限制")
+                break
+            best = row
+            step += 1
+            rate = rate * args.ramp_factor
+    finally:
+        generator.close()
+        stop_router(router)
+    return rows, best
+
+def write_csv(path, rows):
+    if not rows:
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description='回环压力测试：寻找Router最大可持续吞吐')
+    parser.add_argument('--algorithms', default='fifo,wfq', help='调度算法列表，逗号分隔')
+    parser.add_argument('--packet-sizes', default='64,512,1024',
+                       help='包大小列表（字节，含24字节项目头），逗号分隔')
+    parser.add_argument('--flow-counts', default='1,4,16', help='流数量列表，逗号分隔')
+    parser.add_argument('--bandwidth', type=int, default=1000000,
+                       help='Router输出带宽限制（KB/s），默认足够大以测量处理能力上限')
+    parser.add_argument('--start-pps', type=float, default=1000, help='起始发送速率（pps）')
+    parser.add_argument('--ramp-factor', type=float, default=1.25, help='每档速率倍数')
+    parser.add_argument('--max-pps', type=float, default=1000000, help='速率上限（pps）')
+    parser.add_argument('--step-duration', type=float, default=2.0, help='每档持续时间（秒）')
+    parser.add_argument('--settle', type=float, default=0.5,
+                       help='每档结束后等待在途包到达的时间（秒）')
+    parser.add_argument('--max-loss', type=float, default=0.01, help='丢包率SLO（默认1%%）')
+    parser.add_argument('--max-p99-ms', type=float, default=50.0, help='p99端到端延迟SLO（毫秒）')
+    parser.add_argument('--router-port', type=int, default=8180, help='Router监听端口')
+    parser.add_argument('--sink-port', type=int, default=9190, help='接收端端口')
+    parser.add_argument('--output-dir', help='CSV输出目录，默认 results/loadtest')
+
+    args = parser.parse_args()
+
+    algorithms = [a for a in args.algorithms.split(',') if a]
+    packet_sizes = [int(n) for n in args.packet_sizes.split(',') if n]
+    flow_counts = [int(n) for n in args.flow_counts.split(',') if n]
+    for size in packet_sizes:
+        if not MIN_PACKET_SIZE <= size <= ProjectPacket.MAX_PACKET_SIZE:
+            parser.error(f"包大小需在 {MIN_PACKET_SIZE}-{ProjectPacket.MAX_PACKET_SIZE} 字节之间")
+
+    output_dir = args.output_dir or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'results', 'loadtest')
+    os.makedirs(output_dir, exist_ok=True)
+
+    conn, child_conn = multiprocessing.Pipe()
+    sink = multiprocessing.Process(target=sink_main, args=(args.sink_port, child_conn),
+                                   daemon=True)
+    sink.start()
+    conn.recv()  # 等待接收端绑定端口
+
+    all_rows = []
+    summary = []
+    try:
+        for algorithm in algorithms:
+            for packet_size in packet_sizes:
+                for flow_count in flow_counts:
+                    print(f"=== {algorithm.upper()} | {packet_size} 字节 | {flow_count} 流 ===")
+                    rows, best = run_case(args, algorithm, packet_size, flow_count, conn)
+                    all_rows.extend(rows)
+                    summary.append({
+                        'algorithm': algorithm,
+                        'packet_size': packet_size,
+                        'flows': flow_count,
+                        'max_pps': best['delivered_pps'] if best else 0,
+                        'max_mbps': best['mbps'] if best else 0,
+                        'p99_ms': best['p99_ms'] if best else 0,
+                    })
+    except KeyboardInterrupt:
+        print("\n收到中断信号")
+    finally:
+        conn.send(('stop',))
+        sink.join(timeout=5)
+
+    print("\n=== 最大可持续吞吐 ===")
+    print(f"{'算法':<6} {'包大小':>6} {'流数':>4} {'pps':>10} {'Mbps':>10} {'p99(ms)':>9}")
+    for item in summary:
+        print(f"{item['algorithm']:<8} {item['packet_size']:>8} {item['flows']:>6} "
+              f"{item['max_pps']:>10.0f} {item['max_mbps']:>10.2f} {item['p99_ms']:>9.3f}")
+
+    write_csv(os.path.join(output_dir, 'loadtest_steps.csv'), all_rows)
+    write_csv(os.path.join(output_dir, 'loadtest_summary.csv'), summary)
+    print(f"✅ 结果已保存: {output_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+监控指标模块
+以Prometheus文本格式在本地HTTP端点上导出计数器、仪表和延迟直方图
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图的导出边界（毫秒），导出时换算为秒
+DEFAULT_LATENCY_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50,
+                             100, 250, 500, 1000, 2500, 5000, 10000]
+
+class MetricsRegistry:
+    """
+    指标注册表
+    所有指标都以回调函数注册，只在抓取时读取数据包路径上由单线程更新的
+    普通整数/浮点属性，因此抓取不会在收发线程上引入任何锁竞争。
+    """
+
+    def __init__(self, prefix='wfq'):
+        self.prefix = prefix
+        self.metrics = []  # (name, type, help, label, func)
+        self.lock = threading.Lock()
+
+    def _register(self, name, metric_type, help_text, func, label):
+        with self.lock:
+            self.metrics.append((f'{self.prefix}_{name}', metric_type,
+                                 help_text, label, func))
+
+    def counter(self, name, help_text, func, label=None):
+        """
+        注册计数器
+        :param func: 无参回调；无label时返回数值，有label时返回 {label值: 数值}
+        """
+        self._register(name, 'counter', help_text, func, label)
+
+    def gauge(self, name, help_text, func, label=None):
+        """注册仪表，回调约定同counter"""
+        self._register(name, 'gauge', help_text, func, label)
+
+    def histogram(self, name, help_text, func, label=None,
+                  bounds_ms=DEFAULT_LATENCY_BOUNDS_MS):
+        """
+        注册延迟直方图
+        :param func: 回调，返回LatencyHistogram或 {label值: LatencyHistogram}（毫秒）
+        """
+        self._register(name, 'histogram', help_text, func,
+                       (label, bounds_ms))
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        inner = ','.join(f'{key}="{value}"' for key, value in labels)
+        return '{' + inner + '}'
+
+    def _render_histogram(self, lines, name, label_name, hist, label_value,
+                          bounds_ms):
+        base = [(label_name, label_value)] if label_name else []
+        cumulative = hist.cumulative_counts(bounds_ms)
+        for bound, count in zip(bounds_ms, cumulative):
+            labels = self._format_labels(base + [('le', f'{bound / 1000:g}')])
+            lines.append(f'{name}_bucket{labels} {count}')
+        labels = self._format_labels(base + [('le', '+Inf')])
+        lines.append(f'{name}_bucket{labels} {hist.count}')
+        labels = self._format_labels(base)
+        lines.append(f'{name}_sum{labels} {hist.total_sum / hist.scale / 1000:.6f}')
+        lines.append(f'{name}_count{labels} {hist.count}')
+
+    def render(self):
+        """生成Prometheus文本格式的指标快照"""
+        with self.lock:
+            metrics = list(self.metrics)
+
+        lines = []
+        for name, metric_type, help_text, label, func in metrics:
+            try:
+                value = func()
+            except Exception:
+                continue  # 单个指标失败不影响其余指标
+
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+            if metric_type == 'histogram':
+                label_name, bounds_ms = label
+                if label_name:
+                    for label_value in sorted(value):
+                        self._render_histogram(lines, name, label_name,
+                                               value[label_value], label_value,
+                                               bounds_ms)
+                else:
+                    self._render_histogram(lines, name, None, value, None,
+                                           bounds_ms)
+            elif label:
+                for label_value in sorted(value):
+                    labels = self._format_labels([(label, label_value)])
+                    lines.append(f'{name}{labels} {value[label_value]}')
+            else:
+                lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """本地HTTP指标端点（GET /metrics）"""
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """在后台守护线程中启动HTTP服务"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不输出访问日志
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        """停止HTTP服务"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
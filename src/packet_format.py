@@ -80,6 +80,20 @@ class ProjectPacket:
                 f"src={self._int_to_ip(self.src_ip)}:{self.src_port}, "
                 f"dst={self._int_to_ip(self.dst_ip)}:{self.dst_port})")
 
+# 项目头中序列号（最后一个字段）的偏移，发送快速路径在模板中原地改写
+SEQ_OFFSET = struct.calcsize(ProjectPacket.HEADER_FORMAT) - struct.calcsize('!I')
+
+def build_template(flow_id, weight, max_size, src_ip="127.0.0.1", dst_ip="127.0.0.1",
+                   src_port=0, dst_port=0):
+    """
+    预构造发送模板：项目头 + 填充负载，长度限制在 [HEADER_SIZE, MAX_PACKET_SIZE]；
+    发送时只需在SEQ_OFFSET处写入序列号，再按本包大小切片
+    """
+    header = ProjectPacket(src_ip=src_ip, dst_ip=dst_ip, src_port=src_port, dst_port=dst_port,
+                           weight=weight, flow_id=flow_id).pack()
+    size = min(max(max_size, len(header)), ProjectPacket.MAX_PACKET_SIZE)
+    return bytearray(header + b'X' * (size - len(header)))
+
 # 测试代码
 if __name__ == "__main__":
     # 创建测试数据包
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+到达trace录制与回放模块
+Router可把每个到达包的时间戳、24字节项目头和包大小录制为紧凑的二进制trace；
+回放时通过进程内注入器绕过socket，直接送入UDPRouter的处理路径，
+可按原始节奏（可加速）或以最快速度回放
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from collections import defaultdict
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from packet_format import ProjectPacket
+
+# 文件头：魔数(8) + 记录大小(4) + 项目头大小(4) = 16字节
+MAGIC = b'WFQTR01\0'
+FILE_HEADER_FORMAT = '<8sII'
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FORMAT)
+
+# 记录：到达时间戳ns(8) + 包大小(4) + 原始项目头(24) = 36字节
+RECORD_PREFIX_FORMAT = '<qI'
+RECORD_PREFIX_SIZE = struct.calcsize(RECORD_PREFIX_FORMAT)
+RECORD_SIZE = RECORD_PREFIX_SIZE + ProjectPacket.HEADER_SIZE
+
+class TraceWriter:
+    """
+    到达trace写入器
+    记录先追加到内存缓冲区，攒够flush_records条后一次性写盘；
+    只应由一个线程（router接收路径）调用record。
+    """
+
+    def __init__(self, path, flush_records=4096):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'wb')
+        self.file.write(struct.pack(FILE_HEADER_FORMAT, MAGIC, RECORD_SIZE,
+                                    ProjectPacket.HEADER_SIZE))
+        self.flush_bytes = flush_records * RECORD_SIZE
+        self.buffer = bytearray()
+        self.count = 0
+        self._pack = struct.Struct(RECORD_PREFIX_FORMAT).pack
+
+    def record(self, data, timestamp_ns):
+        """记录一个到达的数据报（只保存项目头和大小，不保存负载）"""
+        buffer = self.buffer
+        buffer += self._pack(timestamp_ns, len(data))
+        buffer += data[:ProjectPacket.HEADER_SIZE]
+        self.count += 1
+        if len(buffer) >= self.flush_bytes:
+            self.file.write(buffer)
+            buffer.clear()
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        if self.file:
+            if self.buffer:
+                self.file.write(self.buffer)
+                self.buffer.clear()
+            self.file.close()
+            self.file = None
+
+def read_trace(path, chunk_records=65536):
+    """
+    逐条读取trace
+    :return: 生成器，元素为 (timestamp_ns, packet_size, header_bytes)
+    """
+    unpack_prefix = struct.Struct(RECORD_PREFIX_FORMAT).unpack_from
+    with open(path, 'rb') as f:
+        magic, record_size, header_size = struct.unpack(
+            FILE_HEADER_FORMAT, f.read(FILE_HEADER_SIZE))
+        if magic != MAGIC:
+            raise ValueError(f"不是trace文件: {path}")
+        if record_size != RECORD_SIZE or header_size != ProjectPacket.HEADER_SIZE:
+            raise ValueError(f"trace记录格式不匹配: {path}")
+        while True:
+            chunk = f.read(chunk_records * RECORD_SIZE)
+            if not chunk:
+                break
+            for offset in range(0, len(chunk) - RECORD_SIZE + 1, RECORD_SIZE):
+                timestamp_ns, size = unpack_prefix(chunk, offset)
+                header = chunk[offset + RECORD_PREFIX_SIZE:offset + RECORD_SIZE]
+                yield timestamp_ns, size, header
+
+class TraceInjector:
+    """
+    进程内注入器：把trace中的包直接送入UDPRouter.process_datagram，绕过socket
+    路由器需以 start(receive=False) 启动，注入线程代替接收线程成为接收侧的唯一写者
+    """
+
+    def __init__(self, router):
+        self.router = router
+        self.payload = b'X' * ProjectPacket.MAX_DATA_SIZE
+        self.injected = 0
+
+    def replay(self, path, pacing='original', speedup=1.0):
+        """
+        回放trace
+        :param pacing: 'original' 按原始到达间隔（除以speedup）回放；'max' 不等待
+        :return: (注入包数, 耗时秒)
+        """
+        router = self.router
+        drop_reporter = router.drop_reporter
+        payload = self.payload
+        header_size = ProjectPacket.HEADER_SIZE
+        paced = pacing == 'original'
+
+        first_ts = None
+        start = time.perf_counter()
+        injected = 0
+        for timestamp_ns, size, header in read_trace(path):
+            if paced:
+                if first_ts is None:
+                    first_ts = timestamp_ns
+                target = start + (timestamp_ns - first_ts) / 1e9 / speedup
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            data = header + payload[:max(0, size - header_size)]
+            recv_time = time.time()
+            try:
+                router.process_datagram(data, recv_time, time.perf_counter_ns())
+            except ValueError:
+                continue  # 与receive_loop一致，跳过无法解析的包
+            finally:
+                drop_reporter.maybe_flush(recv_time)
+            injected += 1
+
+        drop_reporter.flush()
+        self.injected += injected
+        return injected, time.perf_counter() - start
+
+def trace_info(path):
+    """统计trace概况"""
+    count = 0
+    total_bytes = 0
+    first_ts = last_ts = None
+    flows = defaultdict(int)
+    unpack_header = struct.Struct(ProjectPacket.HEADER_FORMAT).unpack
+    for timestamp_ns, size, header in read_trace(path):
+        if first_ts is None:
+            first_ts = timestamp_ns
+        last_ts = timestamp_ns
+        count += 1
+        total_bytes += size
+        flows[unpack_header(header)[5]] += 1
+
+    print(f"trace: {path}")
+    print(f"  包数: {count}")
+    print(f"  字节数: {total_bytes}")
+    if count > 1:
+        duration = (last_ts - first_ts) / 1e9
+        print(f"  时长: {duration:.3f}s")
+        if duration > 0:
+            print(f"  平均速率: {count / duration:.1f} pps, "
+                  f"{total_bytes / duration / 1024:.1f} KB/s")
+    for flow_id in sorted(flows):
+        print(f"  Flow {flow_id}: {flows[flow_id]} 包")
+
+def replay_main(args):
+    """创建路由器并把trace注入其中，报告调度吞吐"""
+    from router import UDPRouter
+
+    router = UDPRouter(
+        algorithm=args.algorithm,
+        bandwidth_kbps=args.bandwidth,
+        port=args.port,
+        receiver_ip=args.receiver_ip,
+        receiver_port=args.receiver_port,
+        flight_records=0
+    )
+    router.start(block=False, receive=False)
+
+    try:
+        started = time.perf_counter()
+        injector = TraceInjector(router)
+        injected, inject_elapsed = injector.replay(args.trace_file, args.pacing,
+                                                   args.speedup)
+
+        # 等待队列排空
+        deadline = time.time() + args.drain_timeout
+        while (router.total_forwarded + router.total_dropped < router.total_received
+               and time.time() < deadline):
+            time.sleep(0.01)
+        total_elapsed = time.perf_counter() - started
+    finally:
+        router.stop()
+
+    print(f"=== Trace回放 ({args.algorithm.upper()}, {args.pacing}) ===")
+    print(f"注入: {injected} 包, 耗时 {inject_elapsed:.3f}s, "
+          f"{injected / inject_elapsed if inject_elapsed else 0:.0f} pps")
+    print(f"转发: {router.total_forwarded} 包, 丢弃: {router.total_dropped} 包, "
+          f"耗时 {total_elapsed:.3f}s, "
+          f"{router.total_forwarded / total_elapsed if total_elapsed else 0:.0f} pps")
+
+def main():
+    parser = argparse.ArgumentParser(description='到达trace查看与回放')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info_parser = subparsers.add_parser('info', help='查看trace概况')
+    info_parser.add_argument('trace_file', help='trace文件路径')
+
+    replay_parser = subparsers.add_parser('replay', help='把trace注入进程内Router')
+    replay_parser.add_argument('trace_file', help='trace文件路径')
+    replay_parser.add_argument('--algorithm', choices=['fifo', 'wfq'], default='wfq',
+                              help='调度算法: fifo 或 wfq')
+    replay_parser.add_argument('--bandwidth', type=int, default=1000,
+                              help='输出带宽限制（KB/s）')
+    replay_parser.add_argument('--pacing', choices=['original', 'max'], default='original',
+                              help='original: 按原始节奏；max: 最快速度')
+    replay_parser.add_argument('--speedup', type=float, default=1.0,
+                              help='original模式下的加速倍数')
+    replay_parser.add_argument('--port', type=int, default=0,
+                              help='Router绑定端口（0表示任意端口）')
+    replay_parser.add_argument('--receiver-ip', default='127.0.0.1',
+                              help='Receiver IP地址')
+    replay_parser.add_argument('--receiver-port', type=int, default=9090,
+                              help='Receiver端口')
+    replay_parser.add_argument('--drain-timeout', type=float, default=30,
+                              help='注入结束后等待队列排空的最长时间（秒）')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        trace_info(args.trace_file)
+    else:
+        replay_main(args)
+
+if __name__ == '__main__':
+    main()
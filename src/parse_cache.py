@@ -0,0 +1,70 @@
+"""
+日志解析结果缓存
+把解析后的列数据（{名称: ndarray}）保存为源文件旁 .analysis_cache/ 目录下的未压缩.npz，
+缓存中记录源文件的绝对路径、大小和mtime（纳秒），三者任一变化即视为失效并重新解析；
+元数据在解析之前取得，解析期间源文件被改写（如接收端仍在写日志）时不写缓存；
+重复生成图表或调整绘图参数时直接读取缓存，不再解析原始日志
+"""
+
+import os
+
+import numpy as np
+
+CACHE_DIR_NAME = '.analysis_cache'
+_META_KEYS = ('_source', '_size', '_mtime_ns')
+
+def cache_path(source, key):
+    """源文件对应的缓存文件路径，key区分同一源文件的不同解析方式（如吞吐量时间片宽度）"""
+    directory, name = os.path.split(os.path.abspath(source))
+    return os.path.join(directory, CACHE_DIR_NAME, f'{name}.{key}.npz')
+
+def _source_meta(source):
+    stat = os.stat(source)
+    return os.path.abspath(source), stat.st_size, stat.st_mtime_ns
+
+def load(source, key):
+    """读取有效的缓存，不存在或已失效时返回None"""
+    path = cache_path(source, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as cached:
+            if tuple(cached[k].item() for k in _META_KEYS) != _source_meta(source):
+                return None
+            return {name: cached[name] for name in cached.files if name not in _META_KEYS}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  解析缓存损坏，重新解析: {path} ({e})")
+        return None
+
+def store(source, key, arrays, meta):
+    """
+    写入缓存（先写临时文件再改名，中断不会留下半个缓存）；目录不可写时只打印警告
+    :param meta: 解析前由_source_meta取得的源文件元数据
+    """
+    path = cache_path(source, key)
+    meta = dict(zip(_META_KEYS, (np.array(value) for value in meta)))
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays, **meta)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️  无法写入解析缓存: {path} ({e})")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def cached(source, key, parse, enabled=True):
+    """返回parse(source)的结果，命中缓存时跳过解析"""
+    if enabled:
+        arrays = load(source, key)
+        if arrays is not None:
+            return arrays
+    meta = _source_meta(source) if enabled else None
+    arrays = parse(source)
+    if enabled:
+        if _source_meta(source) == meta:
+            store(source, key, arrays, meta)
+        else:
+            print(f"⚠️  解析期间源文件发生变化，不写入解析缓存: {source}")
+    return arrays
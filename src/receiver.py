@@ -4,120 +4,301 @@ Receiver程序 - 接收来自Router的数据包
 """
 
 import socket
+import selectors
+import struct
 import time
 import threading
 import argparse
+import heapq
+import numpy as np
+import multiprocessing
+import signal
 import sys
 import os
-from collections import defaultdict
 
 # 添加src目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from packet_format import ProjectPacket
-from utils import Statistics, Logger
+from utils import FlowCounter, SequenceTracker, Logger, install_termination_handler
+from metrics import MetricsRegistry, MetricsServer
+from flight_recorder import FlightRecorder, EVENT_RECV
+from binlog import BinaryLogWriter, read_binary_log, write_binary_log
+
+# 项目头中回发和统计用到的字段：源IP、源端口、流ID、序列号（跳过目标IP/端口和权重）
+HEADER_FIELDS = struct.Struct('!I4xH6xII')
+REPLY_CACHE_SIZE = 65536  # 回发地址缓存的最大条目数
+RESULTS_DIR = '/Users/aviator/Documents/MCP/wfq/results'
+DATA_LOG_HEADER = 'timestamp,flow_id,packet_size,sequence_number,delay_ms\n'
+WORKER_START_TIMEOUT = 10.0  # 等待工作进程绑定端口的最长时间（秒）
+WORKER_STOP_TIMEOUT = 10.0   # 等待工作进程回传统计的最长时间（秒）
+
+def write_summary(path, mode, port, flow_stats, sequences, echo_errors, workers=1):
+    """写出receiver_summary.txt（单进程和多进程汇总共用）"""
+    with open(path, 'w') as f:
+        f.write("=== Receiver Summary ===\n")
+        f.write(f"Mode: {mode}\n")
+        f.write(f"Port: {port}\n")
+        if workers > 1:
+            f.write(f"Workers: {workers}\n")
+        f.write(f"Total Flows: {len(flow_stats)}\n")
+        f.write("\nFlow Statistics:\n")
+        
+        total_packets = 0
+        total_bytes = 0
+        
+        for flow_id in sorted(flow_stats.keys()):
+            counter = flow_stats[flow_id]
+            
+            f.write(f"\nFlow {flow_id}:\n")
+            f.write(f"  Packets: {counter.packets}\n")
+            f.write(f"  Bytes: {counter.bytes} ({counter.bytes/1024:.2f} KB)\n")
+            if counter.packets > 1 and counter.last_time > counter.first_time:
+                duration = counter.last_time - counter.first_time
+                f.write(f"  Average Rate: {counter.bytes / duration / 1024:.2f} KB/s\n")
+            tracker = sequences[flow_id]
+            f.write(f"  Expected: {tracker.expected()}\n")
+            f.write(f"  Lost: {tracker.lost_total()} ({tracker.loss_rate():.2%})\n")
+            f.write(f"  Reordered: {tracker.reordered} (max depth {tracker.max_reorder_depth})\n")
+            f.write(f"  Duplicates: {tracker.duplicates}\n")
+            if tracker.stale:
+                f.write(f"  Stale: {tracker.stale}\n")
+            
+            total_packets += counter.packets
+            total_bytes += counter.bytes
+                
+        f.write(f"\nTotal:\n")
+        f.write(f"  Packets: {total_packets}\n")
+        f.write(f"  Bytes: {total_bytes} ({total_bytes/1024:.2f} KB)\n")
+        if mode == 'echo':
+            f.write(f"  Echo Errors: {echo_errors}\n")
 
 class UDPReceiver:
     """UDP数据包接收器"""
     
-    def __init__(self, mode, port, log_file='received_data.log'):
+    def __init__(self, mode, port, log_file='received_data.log', metrics_port=0,
+                 flight_records=65536, rate_window=1.0, batch_size=64,
+                 reorder_window=1024, worker_id=None, log_format='csv',
+                 summary_file='receiver_summary.txt'):
+        """
+        :param worker_id: 多进程模式下的工作进程编号；设置后以SO_REUSEPORT绑定端口，
+                          数据日志写入分片文件，汇总由主进程合并后写出
+        :param log_format: 数据日志格式，'csv' 或 'binary'（定长二进制记录，见binlog.py）
+        :param summary_file: 汇总文件名（同一进程托管多个接收器时按端口区分）
+        """
         self.mode = mode  # 'stats' 或 'echo'
         self.port = port
         self.log_file = log_file
+        self.summary_file = summary_file
+        self.worker_id = worker_id
         self.running = False
         
         # 创建socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if worker_id is not None:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(('', port))
-        self.socket.settimeout(0.1)
+        self.socket.setblocking(False)
+        self._sendto = self.socket.sendto  # 回发出口，异步运行时替换为transport.sendto
+        
+        # 快速路径：每轮就绪后最多连续收取batch_size个包到预分配缓冲区，
+        # 回发直接发送缓冲区切片；回发地址按(源IP, 源端口)缓存
+        self.batch_size = batch_size
+        self.buffers = [memoryview(bytearray(65535)) for _ in range(batch_size)]
+        self.reply_addrs = {}
+        self.echo_errors = 0
         
-        # 统计信息 (按流ID分组)
-        self.flow_stats = defaultdict(lambda: Statistics())
+        # 统计信息 (按流ID分组的累计计数器，rate_window秒滑动窗口速率)
+        self.rate_window = rate_window
+        self.flow_stats = {}
+        self.total_packets = 0
+        # 每流序列号跟踪（丢包/乱序/重复），位图覆盖最近reorder_window个序列号
+        self.reorder_window = reorder_window
+        self.sequences = {}
         self.start_time = None
+        self.recorder = FlightRecorder('receiver', flight_records) if flight_records else None
         
         # 设置日志
-        log_path = f'/Users/aviator/Documents/MCP/wfq/results/receiver_{port}.log'
+        name = f'receiver_{port}' if worker_id is None else f'receiver_{port}_worker{worker_id}'
+        log_path = os.path.join(RESULTS_DIR, f'{name}.log')
         os.makedirs(os.path.dirname(log_path), exist_ok=True)
-        self.logger = Logger.setup_logger('receiver', log_path)
+        self.logger = Logger.setup_logger(name, log_path)
         
-        # 创建数据日志文件
-        data_log_path = f'/Users/aviator/Documents/MCP/wfq/results/{log_file}'
-        os.makedirs(os.path.dirname(data_log_path), exist_ok=True)
-        self.data_log = open(data_log_path, 'w')
-        self.data_log.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+        # 创建数据日志文件（工作进程写分片，时间相对本进程的第一个包）
+        self.data_log_path = os.path.join(RESULTS_DIR, log_file)
+        if worker_id is not None:
+            self.data_log_path += f'.worker{worker_id}'
+        os.makedirs(os.path.dirname(self.data_log_path), exist_ok=True)
+        self.log_format = log_format
+        if log_format == 'binary':
+            self.data_log = BinaryLogWriter(self.data_log_path)
+            self._write_record = self.data_log.write
+            self._flush_log = self.data_log.maybe_flush
+        else:
+            self.data_log = open(self.data_log_path, 'w')
+            self.data_log.write(DATA_LOG_HEADER)
+            self._write_record = self._write_csv_record
+            self._flush_log = self.data_log.flush
+        
+        # 监控指标
+        self.metrics_port = metrics_port
+        self.metrics_server = None
         
         # 控制线程
         self.receive_thread = None
         
-    def process_packet(self, data, addr, recv_time):
-        """处理接收到的数据包"""
-        try:
-            # 解析数据包
-            packet = ProjectPacket.unpack(data)
-            flow_id = packet.flow_id
-            
-            # 记录开始时间
-            if self.start_time is None:
-                self.start_time = recv_time
-                
-            # 统计信息
-            self.flow_stats[flow_id].record('packets_received', 1, recv_time,
-                                          flow_id=flow_id,
-                                          seq_num=packet.seq_num,
-                                          size=packet.get_size())
-            
-            # 记录到数据日志文件
-            relative_time = recv_time - self.start_time
-            self.data_log.write(
-                f"{relative_time},{flow_id},{packet.get_size()},{packet.seq_num},0\n"
-            )
-            self.data_log.flush()
+    def setup_metrics(self):
+        """注册监控指标（全部为无锁读取的回调）"""
+        registry = MetricsRegistry()
+        registry.counter('receiver_flow_packets_total', '每流接收数据包数',
+                         lambda: {flow_id: counter.packets
+                                  for flow_id, counter in dict(self.flow_stats).items()},
+                         label='flow_id')
+        registry.counter('receiver_flow_bytes_total', '每流接收字节数',
+                         lambda: {flow_id: counter.bytes
+                                  for flow_id, counter in dict(self.flow_stats).items()},
+                         label='flow_id')
+        if self.rate_window:
+            registry.gauge('receiver_flow_rate_bytes_per_second',
+                           f'每流最近{self.rate_window}秒的接收速率',
+                           lambda: {flow_id: counter.rate(time.time())[1]
+                                    for flow_id, counter in dict(self.flow_stats).items()},
+                           label='flow_id')
+        registry.counter('receiver_flow_lost_total', '每流按序列号判定丢失的数据包数',
+                         lambda: {flow_id: tracker.lost
+                                  for flow_id, tracker in dict(self.sequences).items()},
+                         label='flow_id')
+        registry.counter('receiver_flow_reordered_total', '每流乱序到达的数据包数',
+                         lambda: {flow_id: tracker.reordered
+                                  for flow_id, tracker in dict(self.sequences).items()},
+                         label='flow_id')
+        registry.counter('receiver_flow_duplicates_total', '每流重复到达的数据包数',
+                         lambda: {flow_id: tracker.duplicates
+                                  for flow_id, tracker in dict(self.sequences).items()},
+                         label='flow_id')
+        registry.gauge('receiver_flow_max_reorder_depth', '每流最大乱序深度（落后的序列号数）',
+                       lambda: {flow_id: tracker.max_reorder_depth
+                                for flow_id, tracker in dict(self.sequences).items()},
+                       label='flow_id')
+        registry.gauge('receiver_flows', '已见到的流数量',
+                       lambda: len(self.flow_stats))
+        registry.counter('receiver_echo_errors_total', '回发失败的数据包数',
+                         lambda: self.echo_errors)
+        return registry
+        
+    def reply_address(self, src_ip, src_port):
+        """包头中的源地址（整数IP）转换为sendto地址，结果缓存"""
+        key = (src_ip, src_port)
+        address = self.reply_addrs.get(key)
+        if address is None:
+            if len(self.reply_addrs) >= REPLY_CACHE_SIZE:
+                self.reply_addrs.clear()
+            address = (socket.inet_ntoa(src_ip.to_bytes(4, 'big')), src_port)
+            self.reply_addrs[key] = address
+        return address
+        
+    def handle_packet(self, data, recv_time):
+        """
+        处理一个数据包：只解析包头字段，不拷贝负载；
+        echo模式下先回发再记录统计，使接收端自身的处理时间尽量不计入测得的延迟
+        :param data: 数据包（bytes或接收缓冲区的memoryview切片）
+        """
+        src_ip, src_port, flow_id, seq_num = HEADER_FIELDS.unpack_from(data)
+        size = len(data)
+        
+        # 如果是echo模式，将数据包发回给发送者（地址取自包头）
+        if self.mode == 'echo':
+            try:
+                self._sendto(data, self.reply_address(src_ip, src_port))
+            except OSError as e:
+                self.echo_errors += 1
+                if self.echo_errors % 100 == 1:
+                    self.logger.warning("回发失败（累计 %d 次）: %s", self.echo_errors, e)
+        
+        # 记录开始时间
+        if self.start_time is None:
+            self.start_time = recv_time
             
-            # 如果是echo模式，将数据包发回给发送者
-            if self.mode == 'echo':
-                # 从包头获取源地址信息
-                sender_addr = (packet._int_to_ip(packet.src_ip), packet.src_port)
-                self.socket.sendto(data, sender_addr)
-                
-                if packet.seq_num % 100 == 0:
-                    self.logger.debug(f"回发数据包: Flow {flow_id}, seq={packet.seq_num}")
+        if self.recorder:
+            self.recorder.record(EVENT_RECV, flow_id, seq_num, size, int(recv_time * 1e9))
             
-            # 定期打印统计信息
-            total_packets = sum(len(stats.get_data('packets_received')) 
-                              for stats in self.flow_stats.values())
-            if total_packets % 100 == 0:
-                self.logger.info(f"已接收 {total_packets} 个数据包")
-                
+        # 统计信息
+        counter = self.flow_stats.get(flow_id)
+        if counter is None:
+            counter = self.flow_stats[flow_id] = FlowCounter(self.rate_window)
+            self.sequences[flow_id] = SequenceTracker(self.reorder_window)
+        counter.record(size, recv_time)
+        self.sequences[flow_id].record(seq_num)
+        self.total_packets += 1
+        
+        # 记录到数据日志文件（由调用方按批flush）
+        self._write_record(recv_time - self.start_time, flow_id, size, seq_num, 0.0)
+        
+        # 定期打印统计信息
+        if self.total_packets % 100 == 0:
+            self.logger.debug("已接收 %d 个数据包", self.total_packets)
+        
+    def _write_csv_record(self, timestamp, flow_id, size, seq_num, delay_ms):
+        self.data_log.write(f"{timestamp},{flow_id},{size},{seq_num},0\n")
+        
+    def process_packet(self, data, addr, recv_time):
+        """处理接收到的单个数据包（不flush数据日志，由调用方定期调用flush_log）"""
+        try:
+            self.handle_packet(data, recv_time)
         except Exception as e:
-            self.logger.error(f"处理数据包失败: {e}")
+            self.logger.error("处理数据包失败: %s", e)
+        
+    def flush_log(self):
+        """把缓冲的数据日志写入文件"""
+        self.data_log.flush()
+        
+    def receive_batch(self):
+        """
+        收取socket中已就绪的数据包（最多batch_size个），逐个处理后统一flush数据日志
+        :return: 本批处理的包数
+        """
+        recv_into = self.socket.recvfrom_into
+        handle = self.handle_packet
+        clock = time.time
+        count = 0
+        for buffer in self.buffers:
+            try:
+                nbytes, addr = recv_into(buffer)
+            except BlockingIOError:
+                break
+            try:
+                handle(buffer[:nbytes], clock())
+            except Exception as e:
+                self.logger.error("处理数据包失败: %s", e)
+            count += 1
+        self._flush_log()
+        return count
     
     def receive_loop(self):
-        """接收循环"""
+        """接收循环：等待socket可读（0.1秒超时以便响应停止），然后按批收取"""
         self.logger.info(f"Receiver启动，模式: {self.mode}, 端口: {self.port}")
         
         total_packets = 0
         last_stats_time = time.time()
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
         
         while self.running:
             try:
-                data, addr = self.socket.recvfrom(65535)
-                recv_time = time.time()
-                
-                # 处理数据包
-                self.process_packet(data, addr, recv_time)
-                total_packets += 1
+                if not selector.select(0.1):
+                    continue
+                total_packets += self.receive_batch()
                 
                 # 每5秒打印一次统计信息
-                if recv_time - last_stats_time >= 5:
+                now = time.time()
+                if now - last_stats_time >= 5:
                     self.print_statistics()
-                    last_stats_time = recv_time
+                    last_stats_time = now
                     
-            except socket.timeout:
-                continue
             except Exception as e:
                 if self.running:
-                    self.logger.error(f"接收错误: {e}")
+                    self.logger.error("接收错误: %s", e)
                     
+        selector.close()
         self.logger.info(f"接收循环结束，共处理 {total_packets} 个数据包")
     
     def print_statistics(self):
@@ -126,21 +307,21 @@ class UDPReceiver:
         
         total_packets = 0
         total_bytes = 0
+        now = time.time()
         
         for flow_id in sorted(self.flow_stats.keys()):
-            stats = self.flow_stats[flow_id]
-            packets_data = stats.get_data('packets_received')
+            counter = self.flow_stats[flow_id]
+            line = f"Flow {flow_id}: {counter.packets} 包, {counter.bytes/1024:.2f} KB"
+            if self.rate_window:
+                pps, bps = counter.rate(now)
+                line += f", 最近{self.rate_window:g}秒 {pps:.0f} 包/秒 {bps/1024:.2f} KB/秒"
+            tracker = self.sequences[flow_id]
+            line += (f", 丢失 {tracker.lost_total()} 包, 乱序 {tracker.reordered} 包"
+                     f"（最大深度 {tracker.max_reorder_depth}）, 重复 {tracker.duplicates} 包")
+            self.logger.info(line)
             
-            if packets_data:
-                flow_packets = len(packets_data)
-                flow_bytes = sum(item['size'] for item in packets_data if 'size' in item)
-                
-                self.logger.info(
-                    f"Flow {flow_id}: {flow_packets} 包, {flow_bytes/1024:.2f} KB"
-                )
-                
-                total_packets += flow_packets
-                total_bytes += flow_bytes
+            total_packets += counter.packets
+            total_bytes += counter.bytes
         
         self.logger.info(f"总计: {total_packets} 包, {total_bytes/1024:.2f} KB")
         self.logger.info("================")
@@ -152,6 +333,11 @@ class UDPReceiver:
         self.receive_thread.start()
         self.logger.info("Receiver已启动")
         
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.setup_metrics(), self.metrics_port)
+            self.metrics_server.start()
+            self.logger.info(f"监控端点: http://127.0.0.1:{self.metrics_port}/metrics")
+        
     def stop(self):
         """停止接收器"""
         self.logger.info("正在停止Receiver")
@@ -163,42 +349,184 @@ class UDPReceiver:
         # 打印最终统计
         self.print_statistics()
         
-        # 保存详细统计信息
-        summary_path = '/Users/aviator/Documents/MCP/wfq/results/receiver_summary.txt'
-        with open(summary_path, 'w') as f:
-            f.write("=== Receiver Summary ===\n")
-            f.write(f"Mode: {self.mode}\n")
-            f.write(f"Port: {self.port}\n")
-            f.write(f"Total Flows: {len(self.flow_stats)}\n")
-            f.write("\nFlow Statistics:\n")
-            
-            total_packets = 0
-            total_bytes = 0
-            
-            for flow_id in sorted(self.flow_stats.keys()):
-                stats = self.flow_stats[flow_id]
-                packets_data = stats.get_data('packets_received')
-                
-                if packets_data:
-                    flow_packets = len(packets_data)
-                    flow_bytes = sum(item['size'] for item in packets_data if 'size' in item)
-                    
-                    f.write(f"\nFlow {flow_id}:\n")
-                    f.write(f"  Packets: {flow_packets}\n")
-                    f.write(f"  Bytes: {flow_bytes} ({flow_bytes/1024:.2f} KB)\n")
-                    
-                    total_packets += flow_packets
-                    total_bytes += flow_bytes
-                    
-            f.write(f"\nTotal:\n")
-            f.write(f"  Packets: {total_packets}\n")
-            f.write(f"  Bytes: {total_bytes} ({total_bytes/1024:.2f} KB)\n")
+        # 保存详细统计信息（工作进程的统计由主进程合并后写出）
+        if self.worker_id is None:
+            write_summary(os.path.join(RESULTS_DIR, self.summary_file), self.mode,
+                          self.port, self.flow_stats, self.sequences, self.echo_errors)
         
         # 关闭资源
         self.socket.close()
         self.data_log.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
         
         self.logger.info("Receiver已停止")
+        
+    def snapshot(self):
+        """工作进程停止后交给主进程合并的统计"""
+        return {
+            'worker_id': self.worker_id,
+            'start_time': self.start_time,
+            'data_log_path': self.data_log_path,
+            'log_format': self.log_format,
+            'flow_stats': self.flow_stats,
+            'sequences': self.sequences,
+            'echo_errors': self.echo_errors,
+        }
+
+def receiver_worker(worker_id, options, conn):
+    """
+    接收工作进程：以SO_REUSEPORT绑定同一端口，内核按四元组把数据报分给各进程。
+    绑定完成后发送就绪通知，收到主进程的停止消息后停止并回传统计
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由主进程统一处理中断
+    receiver = UDPReceiver(worker_id=worker_id, **options)
+    if receiver.recorder:
+        receiver.recorder.install_signal_handler(RESULTS_DIR, receiver.logger)
+    receiver.start()
+    conn.send('ready')
+    conn.recv()
+    receiver.stop()
+    conn.send(receiver.snapshot())
+    Logger.shutdown()
+
+def merge_data_logs(path, snapshots):
+    """
+    把各工作进程的数据日志分片按时间归并为一个文件
+    各分片的时间相对各自的第一个包，归并时统一换算为相对所有进程中最早的包
+    """
+    starts = [snap['start_time'] for snap in snapshots if snap['start_time'] is not None]
+    origin = min(starts) if starts else 0.0
+    
+    if snapshots and snapshots[0]['log_format'] == 'binary':
+        parts = []
+        for snap in snapshots:
+            records = read_binary_log(snap['data_log_path'])
+            records['timestamp'] += (snap['start_time'] or origin) - origin
+            parts.append(records)
+        merged = np.concatenate(parts)
+        write_binary_log(path, merged[np.argsort(merged['timestamp'], kind='stable')])
+        for snap in snapshots:
+            os.remove(snap['data_log_path'])
+        return
+    
+    def rows(snap):
+        offset = (snap['start_time'] or origin) - origin
+        with open(snap['data_log_path']) as f:
+            next(f, None)  # 表头
+            for line in f:
+                timestamp, _, rest = line.partition(',')
+                yield float(timestamp) + offset, rest
+    
+    with open(path, 'w') as out:
+        out.write(DATA_LOG_HEADER)
+        for timestamp, rest in heapq.merge(*(rows(snap) for snap in snapshots),
+                                           key=lambda row: row[0]):
+            out.write(f"{timestamp},{rest}")
+    for snap in snapshots:
+        os.remove(snap['data_log_path'])
+
+def wait_worker(conn, process, timeout):
+    """
+    等待工作进程的一条消息，进程已退出或超时返回None
+    分段poll并检查进程是否存活，进程在发送前崩溃时不会一直阻塞
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if conn.poll(min(max(remaining, 0.0), 0.2)):
+            try:
+                return conn.recv()
+            except (EOFError, OSError):
+                return None
+        if not process.is_alive() and not conn.poll():
+            return None
+        if remaining <= 0:
+            return None
+
+class ReceiverPool:
+    """
+    多进程接收器
+    N个工作进程以SO_REUSEPORT监听同一端口，各自维护每流计数；停止时主进程合并
+    各进程的计数器、序列号跟踪和数据日志，写出与单进程相同格式的receiver_summary.txt和数据日志。
+    注意内核按源地址/端口哈希分配，来自同一个socket（如Router）的数据报总是落到同一个进程
+    """
+    
+    def __init__(self, workers, mode, port, log_file='received_data.log', **options):
+        self.workers = workers
+        self.mode = mode
+        self.port = port
+        self.log_file = log_file
+        self.options = dict(options, mode=mode, port=port, log_file=log_file)
+        self.processes = []
+        self.conns = []
+        
+    def start(self):
+        metrics_port = self.options.get('metrics_port', 0)
+        for worker_id in range(self.workers):
+            options = dict(self.options)
+            if metrics_port:
+                options['metrics_port'] = metrics_port + worker_id
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=receiver_worker,
+                                              args=(worker_id, options, child_conn),
+                                              daemon=True)
+            process.start()
+            child_conn.close()  # 只保留子进程持有的一端，子进程退出时主进程能读到EOF
+            self.processes.append(process)
+            self.conns.append(conn)
+        ready = 0
+        for worker_id, (conn, process) in enumerate(zip(self.conns, self.processes)):
+            if wait_worker(conn, process, WORKER_START_TIMEOUT) == 'ready':  # 等待各进程绑定端口
+                ready += 1
+            else:
+                print(f"⚠️  接收工作进程 {worker_id} 未能启动（退出码: {process.exitcode}）")
+        if not ready:
+            self.stop()
+            raise RuntimeError("所有接收工作进程均未能启动")
+        print(f"Receiver已启动，{ready}/{self.workers} 个工作进程，端口: {self.port}")
+        
+    def stop(self):
+        """通知各工作进程停止，合并统计并写出汇总和数据日志"""
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send('stop')
+                except OSError:
+                    pass
+        snapshots = []
+        for worker_id, (conn, process) in enumerate(zip(self.conns, self.processes)):
+            snapshot = wait_worker(conn, process, WORKER_STOP_TIMEOUT)
+            if isinstance(snapshot, dict):
+                snapshots.append(snapshot)
+            else:
+                print(f"⚠️  接收工作进程 {worker_id} 未回传统计，其计数和数据日志不计入汇总")
+        for conn, process in zip(self.conns, self.processes):
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+        if not snapshots:
+            return
+        
+        flow_stats = {}
+        sequences = {}
+        for snap in snapshots:
+            for flow_id, counter in snap['flow_stats'].items():
+                if flow_id in flow_stats:
+                    flow_stats[flow_id].merge(counter)
+                    sequences[flow_id].merge(snap['sequences'][flow_id])
+                else:
+                    flow_stats[flow_id] = counter
+                    sequences[flow_id] = snap['sequences'][flow_id]
+        echo_errors = sum(snap['echo_errors'] for snap in snapshots)
+        
+        merge_data_logs(os.path.join(RESULTS_DIR, self.log_file), snapshots)
+        write_summary(os.path.join(RESULTS_DIR, 'receiver_summary.txt'), self.mode, self.port,
+                      flow_stats, sequences, echo_errors, workers=self.workers)
+        total = sum(counter.packets for counter in flow_stats.values())
+        print(f"Receiver已停止，{len(flow_stats)} 个流共 {total} 包，汇总已写入receiver_summary.txt")
 
 def main():
     parser = argparse.ArgumentParser(description='UDP Packet Receiver')
@@ -207,15 +535,43 @@ def main():
     parser.add_argument('--port', type=int, default=9090, help='监听端口')
     parser.add_argument('--log-file', default='received_data.log', 
                        help='数据日志文件名')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='本地监控端点端口（0表示不启用）')
+    parser.add_argument('--flight-records', type=int, default=65536,
+                       help='飞行记录器保留的最近事件数（0表示不启用，SIGUSR1转储）')
+    parser.add_argument('--batch-size', type=int, default=64,
+                       help='每次socket就绪后最多连续收取的包数')
+    parser.add_argument('--reorder-window', type=int, default=1024,
+                       help='每流序列号位图的长度，落后超过该距离的包不再参与乱序/重复判断')
+    parser.add_argument('--log-format', choices=['csv', 'binary'], default='csv',
+                       help='数据日志格式：csv，或缓冲写入的定长二进制记录（analyze_results.py可直接读取）')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='接收工作进程数，大于1时各进程以SO_REUSEPORT监听同一端口，'
+                            '停止时合并统计（监控端口依次为metrics-port+编号）')
+    parser.add_argument('--rate-window', type=float, default=1.0,
+                       help='每流接收速率的滑动窗口长度（秒，0表示不统计）')
     
     args = parser.parse_args()
+    install_termination_handler()
     
     # 创建并启动接收器
-    receiver = UDPReceiver(
+    options = dict(
         mode=args.mode,
         port=args.port,
-        log_file=args.log_file
+        log_file=args.log_file,
+        metrics_port=args.metrics_port,
+        flight_records=args.flight_records,
+        rate_window=args.rate_window,
+        batch_size=args.batch_size,
+        reorder_window=args.reorder_window,
+        log_format=args.log_format
     )
+    if args.workers > 1:
+        receiver = ReceiverPool(args.workers, **options)
+    else:
+        receiver = UDPReceiver(**options)
+        if receiver.recorder:
+            receiver.recorder.install_signal_handler(RESULTS_DIR, receiver.logger)
     
     try:
         receiver.start()
@@ -10,13 +10,21 @@ import queue
 import argparse
 import sys
 import os
+import json
 from collections import defaultdict
 
 # 添加src目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from packet_format import ProjectPacket
-from utils import RateLimiter, Statistics, Logger
+from utils import (RateLimiter, Logger, LatencyHistogram,
+                   StageLatency, DropReporter, install_termination_handler)
+from metrics import MetricsRegistry, MetricsServer
+from flight_recorder import (FlightRecorder, EVENT_RECV, EVENT_ENQUEUE,
+                             EVENT_DROP, EVENT_FORWARD)
+from packet_trace import TraceWriter
+from fairness import FairnessTracker
+from binned_metrics import BinnedMetrics
 
 class FlowQueue:
     """每个流的队列"""
@@ -62,11 +70,114 @@ class FlowQueue:
     def size(self):
         """返回队列大小"""
         return self.queue.qsize()
+        
+    def depth(self):
+        """无锁读取当前队列长度（供监控抓取使用）"""
+        return len(self.queue.queue)
+
+class FIFOScheduler:
+    """FIFO调度器：所有流共享一个全局队列"""
+    
+    def __init__(self, max_size=10000):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.flow_queues = {}  # FIFO没有每流队列，保留空字典便于统一访问
+        
+    def enqueue(self, packet):
+        """入队，队列已满时返回False"""
+        try:
+            self.queue.put_nowait(packet)
+            return True
+        except queue.Full:
+            return False
+            
+    def dequeue(self):
+        """获取下一个要发送的包，队列为空时返回None"""
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+class WFQScheduler:
+    """简化WFQ调度器：每流独立队列 + 加权轮询"""
+    
+    def __init__(self, queue_size=1000, on_new_flow=None):
+        """
+        :param queue_size: 每个流队列的容量
+        :param on_new_flow: 创建新流队列时的回调 on_new_flow(flow_id, weight)
+        """
+        self.queue_size = queue_size
+        self.on_new_flow = on_new_flow
+        self.flow_queues = {}  # flow_id -> FlowQueue
+        self.flow_ids = []
+        self.current_flow_index = 0
+        self.served_in_turn = 0  # 当前流在本轮已取出的包数
+        
+    def enqueue(self, packet):
+        """入队，新流自动创建队列；队列已满时返回False"""
+        flow_id = packet.flow_id
+        
+        # 如果是新流，创建队列
+        if flow_id not in self.flow_queues:
+            weight = packet.weight
+            self.flow_queues[flow_id] = FlowQueue(flow_id, weight, self.queue_size)
+            self.flow_ids = sorted(self.flow_queues.keys())
+            if self.on_new_flow:
+                self.on_new_flow(flow_id, weight)
+        
+        return self.flow_queues[flow_id].enqueue(packet)
+        
+    def dequeue(self):
+        """
+        简化WFQ: 使用加权轮询获取下一个要发送的包
+        每轮在一个流上连续取最多weight个包，份额用完或队列取空后轮到下一个流，
+        持续积压时各流的包数按权重比例分配
+        """
+        if not self.flow_ids:
+            return None
+        
+        # 最多把每个流看一遍，再回到当前流（它可能是唯一有包的流）
+        for _ in range(len(self.flow_ids) + 1):
+            # 循环索引
+            if self.current_flow_index >= len(self.flow_ids):
+                self.current_flow_index = 0
+            
+            flow_id = self.flow_ids[self.current_flow_index]
+            flow_queue = self.flow_queues.get(flow_id)
+            
+            if flow_queue and self.served_in_turn < max(flow_queue.weight, 1):
+                packet = flow_queue.dequeue()
+                if packet is not None:
+                    self.served_in_turn += 1
+                    return packet
+            
+            # 移动到下一个流，开始新的份额
+            self.current_flow_index += 1
+            self.served_in_turn = 0
+        
+        return None
+
+def create_scheduler(algorithm, on_new_flow=None):
+    """按算法名创建调度器（router与离线仿真共用）"""
+    if algorithm == 'fifo':
+        return FIFOScheduler()
+    return WFQScheduler(on_new_flow=on_new_flow)
 
 class UDPRouter:
     """UDP路由器，支持FIFO和WFQ调度"""
     
-    def __init__(self, algorithm, bandwidth_kbps, port, receiver_ip, receiver_port):
+    # 数据包生命周期各阶段：
+    #   parse      socket返回 -> 解析完成（含等待GIL的时间）
+    #   enqueue    解析完成 -> 入队完成
+    #   queue      入队完成 -> 被调度器选中（排队时间）
+    #   schedule   调度器一次选包调用本身的耗时
+    #   rate_limit 被选中 -> 令牌桶放行（含sleep）
+    #   send       sendto调用耗时
+    #   total      socket返回 -> 发送完成
+    STAGES = ('parse', 'enqueue', 'queue', 'schedule', 'rate_limit', 'send', 'total')
+    
+    def __init__(self, algorithm, bandwidth_kbps, port, receiver_ip, receiver_port,
+                 metrics_port=0, flight_records=65536, trace_file=None,
+                 fairness_window=1.0, bin_width=0.1):
         self.algorithm = algorithm  # 'fifo' 或 'wfq'
         self.bandwidth = bandwidth_kbps * 1024  # 转换为字节/秒
         self.port = port
@@ -78,32 +189,92 @@ class UDPRouter:
         self.socket.bind(('', port))
         self.socket.settimeout(0.1)
         
-        # 流队列管理
-        self.flow_queues = {}  # flow_id -> FlowQueue
-        self.fifo_queue = queue.Queue(maxsize=10000)  # FIFO模式的全局队列
-        
         # 带宽控制
         self.rate_limiter = RateLimiter(self.bandwidth)
         
-        # WFQ调度状态
-        self.current_flow_index = 0
-        self.flow_ids = []
-        
-        # 统计信息
-        self.stats = Statistics()
+        # 统计信息（逐包只更新计数器和直方图，时间序列按时间片聚合写出）
         self.total_received = 0
         self.total_forwarded = 0
         self.total_dropped = 0
+        self.flow_latency = {}  # flow_id -> LatencyHistogram（排队延迟，毫秒）
+        self.stage_latency = StageLatency(self.STAGES)
+        
+        # 公平性度量（相对流体GPS参考的服务滞后和Jain指数）
+        self.fairness = (FairnessTracker(self.bandwidth, fairness_window)
+                         if fairness_window else None)
+        
+        # 飞行记录器（最近的数据包事件）
+        self.recorder = FlightRecorder('router', flight_records) if flight_records else None
+        
+        # 到达trace录制
+        self.trace_writer = TraceWriter(trace_file) if trace_file else None
         
         # 设置日志
         log_path = f'/Users/aviator/Documents/MCP/wfq/results/router_{algorithm}_{port}.log'
         os.makedirs(os.path.dirname(log_path), exist_ok=True)
         self.logger = Logger.setup_logger(f'router_{algorithm}', log_path)
+        self.drop_reporter = DropReporter(self.logger, label=f'{algorithm.upper()}队列已满')
+        
+        # 按流、按时间片聚合的指标（到达/转发/丢弃/字节/队列长度/排队延迟分位数）
+        bins_path = f'/Users/aviator/Documents/MCP/wfq/results/router_{algorithm}_bins.csv'
+        self.binned = BinnedMetrics(bins_path, bin_width) if bin_width else None
+        
+        # 调度器与流队列管理
+        self.scheduler = create_scheduler(algorithm, on_new_flow=self._on_new_flow)
+        # FIFO模式的全局队列
+        self.fifo_queue = self.scheduler.queue if algorithm == 'fifo' else None
+        self.flow_queues = self.scheduler.flow_queues  # flow_id -> FlowQueue
+        
+        # 监控指标
+        self.metrics_port = metrics_port
+        self.metrics_server = None
         
         # 控制线程
         self.receive_thread = None
         self.forward_thread = None
         
+    def setup_metrics(self):
+        """注册监控指标（全部为无锁读取的回调）"""
+        registry = MetricsRegistry()
+        algorithm = self.algorithm
+        registry.counter('router_packets_received_total', '路由器接收的数据包数',
+                         lambda: self.total_received)
+        registry.counter('router_packets_forwarded_total', '路由器转发的数据包数',
+                         lambda: self.total_forwarded)
+        registry.counter('router_packets_dropped_total', '路由器丢弃的数据包数',
+                         lambda: self.total_dropped)
+        registry.gauge('router_rate_limiter_tokens', '出口令牌桶当前令牌数（字节，负值为等待中的欠额）',
+                       lambda: self.rate_limiter.tokens)
+        if algorithm == 'fifo':
+            registry.gauge('router_fifo_queue_depth', 'FIFO全局队列长度',
+                           lambda: len(self.fifo_queue.queue))
+        registry.gauge('router_queue_depth', '每流队列长度',
+                       lambda: {flow_id: fq.depth()
+                                for flow_id, fq in dict(self.flow_queues).items()},
+                       label='flow_id')
+        registry.counter('router_flow_packets_total', '每流入队数据包数',
+                         lambda: {flow_id: fq.total_packets
+                                  for flow_id, fq in dict(self.flow_queues).items()},
+                         label='flow_id')
+        registry.counter('router_flow_dropped_total', '每流丢弃数据包数',
+                         lambda: {flow_id: fq.packets_dropped
+                                  for flow_id, fq in dict(self.flow_queues).items()},
+                         label='flow_id')
+        registry.histogram('router_queue_delay_seconds', '每流排队延迟',
+                           lambda: dict(self.flow_latency), label='flow_id')
+        registry.histogram('router_stage_latency_seconds', '数据包生命周期各阶段耗时',
+                           lambda: dict(self.stage_latency.items()), label='stage')
+        fairness = self.fairness
+        if fairness:
+            registry.gauge('router_fairness_jain_index',
+                           f'最近{fairness.window:g}秒窗口内相对GPS的Jain公平性指数',
+                           lambda: (fairness.jain_latest if fairness.jain_latest is not None
+                                    else float('nan')))
+            registry.gauge('router_gps_max_service_lag_bytes',
+                           '每流相对GPS参考的最大服务滞后（字节）',
+                           lambda: dict(fairness.max_lag), label='flow_id')
+        return registry
+        
     def receive_loop(self):
         """接收循环"""
         self.logger.info(f"Router接收线程启动，算法: {self.algorithm}")
@@ -111,73 +282,110 @@ class UDPRouter:
         while self.running:
             try:
                 data, addr = self.socket.recvfrom(65535)
+                recv_ns = time.perf_counter_ns()
                 recv_time = time.time()
                 
-                # 解析数据包
-                packet = ProjectPacket.unpack(data)
-                packet.timestamp = recv_time  # 添加接收时间戳
-                
-                self.total_received += 1
-                
-                # 根据调度算法处理
-                if self.algorithm == 'fifo':
-                    self.handle_fifo_enqueue(packet)
-                else:  # wfq
-                    self.handle_wfq_enqueue(packet)
-                
-                # 统计信息
-                self.stats.record('packets_received', 1, recv_time,
-                                flow_id=packet.flow_id,
-                                size=packet.get_size())
-                
-                if self.total_received % 100 == 0:
-                    self.logger.info(f"已接收 {self.total_received} 个数据包")
+                self.process_datagram(data, recv_time, recv_ns)
                     
             except socket.timeout:
+                self.drop_reporter.maybe_flush()
                 continue
             except Exception as e:
                 if self.running:
-                    self.logger.error(f"接收数据包失败: {e}")
+                    self.logger.error("接收数据包失败: %s", e)
                     
+        self.drop_reporter.flush()
         self.logger.info("接收线程结束")
     
+    def process_datagram(self, data, recv_time, recv_ns):
+        """
+        处理一个收到的数据报：解析、入队、记录统计
+        receive_loop和进程内注入（trace回放）共用此路径
+        :param recv_time: 接收时刻（time.time()）
+        :param recv_ns: 接收时刻（time.perf_counter_ns()）
+        :return: 是否成功入队
+        """
+        # 解析数据包
+        packet = ProjectPacket.unpack(data)
+        packet.timestamp = recv_time  # 添加接收时间戳
+        packet.recv_ns = recv_ns
+        parsed_ns = time.perf_counter_ns()
+        
+        self.total_received += 1
+        
+        # 根据调度算法处理
+        if self.algorithm == 'fifo':
+            accepted = self.handle_fifo_enqueue(packet)
+        else:  # wfq
+            accepted = self.handle_wfq_enqueue(packet)
+        
+        enqueued_ns = time.perf_counter_ns()
+        if self.recorder or self.trace_writer:
+            recv_ts_ns = int(recv_time * 1e9)
+            if self.trace_writer:
+                self.trace_writer.record(data, recv_ts_ns)
+            if self.recorder:
+                size = len(data)
+                self.recorder.record(EVENT_RECV, packet.flow_id, packet.seq_num,
+                                     size, recv_ts_ns)
+                self.recorder.record(EVENT_ENQUEUE if accepted else EVENT_DROP,
+                                     packet.flow_id, packet.seq_num, size,
+                                     recv_ts_ns + (enqueued_ns - recv_ns))
+        packet.enqueue_ns = enqueued_ns
+        if accepted and self.fairness:
+            self.fairness.on_arrival(packet.flow_id, packet.weight, len(data))
+        self.stage_latency.record('parse', parsed_ns - recv_ns)
+        self.stage_latency.record('enqueue', enqueued_ns - parsed_ns)
+        
+        self.drop_reporter.maybe_flush(recv_time)
+        
+        if self.binned:
+            self.binned.on_arrival(packet.flow_id, accepted)
+        
+        # 逐包路径上的进度日志只在DEBUG级别输出：QueueHandler.prepare仍在本线程格式化记录
+        if self.total_received % 100 == 0:
+            self.logger.debug("已接收 %d 个数据包", self.total_received)
+        
+        return accepted
+    
+    def _on_new_flow(self, flow_id, weight):
+        """调度器创建新流队列时的回调"""
+        self.logger.info("创建新流队列: Flow %s, 权重=%s", flow_id, weight)
+    
     def handle_fifo_enqueue(self, packet):
         """FIFO入队处理"""
-        try:
-            self.fifo_queue.put_nowait(packet)
-        except queue.Full:
-            self.total_dropped += 1
-            self.logger.warning(f"FIFO队列已满，丢弃包: Flow {packet.flow_id}")
+        if self.scheduler.enqueue(packet):
+            return True
+        self.total_dropped += 1
+        self.drop_reporter.record(packet.flow_id, packet.timestamp)
+        return False
     
     def handle_wfq_enqueue(self, packet):
         """WFQ入队处理"""
-        flow_id = packet.flow_id
-        
-        # 如果是新流，创建队列
-        if flow_id not in self.flow_queues:
-            weight = packet.weight
-            self.flow_queues[flow_id] = FlowQueue(flow_id, weight)
-            self.flow_ids = sorted(self.flow_queues.keys())
-            self.logger.info(f"创建新流队列: Flow {flow_id}, 权重={weight}")
-        
-        # 尝试入队
-        flow_queue = self.flow_queues[flow_id]
-        if not flow_queue.enqueue(packet):
-            self.total_dropped += 1
-            self.logger.warning(f"流队列已满，丢弃包: Flow {flow_id}")
+        if self.scheduler.enqueue(packet):
+            return True
+        self.total_dropped += 1
+        self.drop_reporter.record(packet.flow_id, packet.timestamp)
+        return False
     
     def forward_loop(self):
         """转发循环"""
         self.logger.info(f"Router转发线程启动，带宽限制: {self.bandwidth/1024:.1f} KB/s")
         
+        stage_latency = self.stage_latency
+        fairness = self.fairness
+        binned = self.binned
         while self.running:
             # 根据算法选择下一个要发送的包
+            select_start_ns = time.perf_counter_ns()
             if self.algorithm == 'fifo':
                 packet = self.get_next_fifo_packet()
             else:  # wfq
                 packet = self.get_next_wfq_packet()
             
             if packet:
+                selected_ns = time.perf_counter_ns()
+                
                 # 重新打包数据包
                 packet_data = packet.pack()
                 
@@ -185,76 +393,68 @@ class UDPRouter:
                 wait_time = self.rate_limiter.consume(len(packet_data))
                 if wait_time > 0:
                     time.sleep(wait_time)
+                released_ns = time.perf_counter_ns()
                 
                 try:
                     # 转发数据包
                     forward_time = time.time()
                     self.socket.sendto(packet_data, self.receiver_address)
+                    sent_ns = time.perf_counter_ns()
                     self.total_forwarded += 1
                     
+                    if self.recorder:
+                        self.recorder.record(EVENT_FORWARD, packet.flow_id,
+                                             packet.seq_num, len(packet_data),
+                                             int(forward_time * 1e9))
+                    
+                    if fairness:
+                        fairness.on_departure(sent_ns / 1e9, packet.flow_id,
+                                              len(packet_data))
+                    
+                    stage_latency.record('schedule', selected_ns - select_start_ns)
+                    stage_latency.record('rate_limit', released_ns - selected_ns)
+                    stage_latency.record('send', sent_ns - released_ns)
+                    if hasattr(packet, 'enqueue_ns'):
+                        stage_latency.record('queue', selected_ns - packet.enqueue_ns)
+                        stage_latency.record('total', sent_ns - packet.recv_ns)
+                    
                     # 计算排队延迟
                     if hasattr(packet, 'timestamp'):
                         queue_delay = (forward_time - packet.timestamp) * 1000
                         
-                        self.stats.record('packets_forwarded', 1, forward_time,
-                                        flow_id=packet.flow_id,
-                                        size=len(packet_data),
-                                        queue_delay_ms=queue_delay)
+                        latency = self.flow_latency.get(packet.flow_id)
+                        if latency is None:
+                            latency = LatencyHistogram()
+                            self.flow_latency[packet.flow_id] = latency
+                        latency.record(queue_delay)
+                        
+                        if binned:
+                            binned.maybe_close(forward_time)
+                            binned.on_forward(packet.flow_id, len(packet_data), queue_delay)
                         
                         if self.total_forwarded % 100 == 0:
-                            self.logger.debug(
-                                f"转发包: Flow {packet.flow_id}, "
-                                f"排队延迟={queue_delay:.2f}ms"
-                            )
+                            self.logger.debug("转发包: Flow %s, 排队延迟=%.2fms",
+                                              packet.flow_id, queue_delay)
                     
                 except Exception as e:
-                    self.logger.error(f"转发数据包失败: {e}")
+                    self.logger.error("转发数据包失败: %s", e)
             else:
                 # 没有包可发送，短暂休眠
+                if fairness:
+                    fairness.poll(time.perf_counter_ns() / 1e9)
+                if binned:
+                    binned.maybe_close(time.time())
                 time.sleep(0.001)
                 
         self.logger.info("转发线程结束")
     
     def get_next_fifo_packet(self):
         """FIFO: 获取下一个要发送的包"""
-        try:
-            return self.fifo_queue.get_nowait()
-        except queue.Empty:
-            return None
+        return self.scheduler.dequeue()
     
     def get_next_wfq_packet(self):
         """简化WFQ: 使用加权轮询获取下一个要发送的包"""
-        if not self.flow_ids:
-            return None
-        
-        # 尝试所有流，找到下一个有包的流
-        attempts = 0
-        while attempts < len(self.flow_ids):
-            # 循环索引
-            if self.current_flow_index >= len(self.flow_ids):
-                self.current_flow_index = 0
-            
-            flow_id = self.flow_ids[self.current_flow_index]
-            flow_queue = self.flow_queues.get(flow_id)
-            
-            if flow_queue and not flow_queue.is_empty():
-                # 根据权重决定从这个流发送多少包
-                weight = flow_queue.weight
-                
-                # 简化版本：每次只发送一个包，但权重高的流被选中的概率更大
-                # 通过重复选择权重次数来实现
-                for _ in range(weight):
-                    packet = flow_queue.dequeue()
-                    if packet:
-                        # 下次从下一个流开始
-                        self.current_flow_index += 1
-                        return packet
-            
-            # 移动到下一个流
-            self.current_flow_index += 1
-            attempts += 1
-        
-        return None
+        return self.scheduler.dequeue()
     
     def print_statistics(self):
         """打印统计信息"""
@@ -278,21 +478,61 @@ class UDPRouter:
                     f"丢弃={flow_queue.packets_dropped}"
                 )
         
+        if self.total_forwarded:
+            self.logger.info("\n阶段耗时分解:")
+            for stage, hist in self.stage_latency.items():
+                self.logger.info(f"  {stage:<10} {hist.format_percentiles()} "
+                                 f"(平均={hist.mean():.3f}ms)")
+        
+        if self.fairness and self.fairness.max_lag:
+            fairness = self.fairness
+            if fairness.jain_latest is not None:
+                self.logger.info(f"\n公平性(相对GPS): Jain指数 最近={fairness.jain_latest:.4f}, "
+                                 f"最小={fairness.jain_min:.4f}, 平均={fairness.jain_mean():.4f}")
+            max_lag = dict(fairness.max_lag)
+            for flow_id in sorted(max_lag):
+                self.logger.info(f"  Flow {flow_id}: 最大服务滞后="
+                                 f"{max_lag[flow_id]:.0f} 字节 "
+                                 f"({fairness.max_lag_ms(flow_id):.3f}ms)")
+        
+        if self.flow_latency:
+            self.logger.info("\n排队延迟分位数:")
+            for flow_id in sorted(self.flow_latency.keys()):
+                latency = self.flow_latency[flow_id]
+                self.logger.info(
+                    f"  Flow {flow_id}: {latency.format_percentiles()} "
+                    f"(样本={latency.count})"
+                )
+        
         self.logger.info("==================")
     
-    def start(self):
-        """启动路由器"""
+    def start(self, block=True, receive=True):
+        """
+        启动路由器
+        :param block: 为True时在当前线程定期打印统计直到中断；
+                      为False时启动线程后立即返回（进程内注入/测试使用）
+        :param receive: 为False时不启动接收线程，由调用方（进程内注入）作为唯一调用
+                        process_datagram的线程，接收侧的计数和统计保持单写者
+        """
         self.running = True
         
         # 启动接收和转发线程
-        self.receive_thread = threading.Thread(target=self.receive_loop)
+        if receive:
+            self.receive_thread = threading.Thread(target=self.receive_loop)
+            self.receive_thread.start()
         self.forward_thread = threading.Thread(target=self.forward_loop)
-        
-        self.receive_thread.start()
         self.forward_thread.start()
         
         self.logger.info(f"Router已启动 - 算法: {self.algorithm.upper()}")
         
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.setup_metrics(), self.metrics_port)
+            self.metrics_server.start()
+            self.logger.info(f"监控端点: http://127.0.0.1:{self.metrics_port}/metrics")
+        
+        if not block:
+            return
+        
         # 定期打印统计信息
         try:
             while self.running:
@@ -340,9 +580,58 @@ class UDPRouter:
                     if fq.total_packets > 0:
                         flow_drop_rate = fq.packets_dropped / fq.total_packets * 100
                         f.write(f"  Drop Rate: {flow_drop_rate:.2f}%\n")
+            
+            if self.flow_latency:
+                f.write("\nQueue Delay Percentiles:\n")
+                for flow_id in sorted(self.flow_latency.keys()):
+                    latency = self.flow_latency[flow_id]
+                    pcts = latency.percentiles()
+                    f.write(f"\nFlow {flow_id}:\n")
+                    f.write(f"  Samples: {latency.count}\n")
+                    f.write(f"  Mean: {latency.mean():.3f} ms\n")
+                    for p, value in pcts.items():
+                        f.write(f"  p{p:g}: {value:.3f} ms\n")
+                    f.write(f"  Max: {latency.max():.3f} ms\n")
+        
+            if self.total_forwarded:
+                f.write("\nStage Latency Breakdown (ms):\n")
+                for stage, hist in self.stage_latency.items():
+                    pcts = hist.percentiles()
+                    f.write(f"  {stage:<10} mean={hist.mean():.3f} " +
+                            " ".join(f"p{p:g}={v:.3f}" for p, v in pcts.items()) +
+                            f" max={hist.max():.3f}\n")
+        
+            if self.fairness and self.fairness.max_lag:
+                fairness = self.fairness
+                f.write(f"\nFairness vs GPS (window={fairness.window:g}s):\n")
+                if fairness.jain_latest is not None:
+                    f.write(f"  Jain Index: latest={fairness.jain_latest:.4f} "
+                            f"min={fairness.jain_min:.4f} mean={fairness.jain_mean():.4f} "
+                            f"windows={fairness.jain_count}\n")
+                for flow_id in sorted(fairness.max_lag.keys()):
+                    f.write(f"  Flow {flow_id}: max service lag="
+                            f"{fairness.max_lag[flow_id]:.0f} bytes "
+                            f"({fairness.max_lag_ms(flow_id):.3f} ms)\n")
+        
+        # 保存可合并的直方图（供多进程/多次实验汇总）
+        latency_path = f'/Users/aviator/Documents/MCP/wfq/results/router_{self.algorithm}_latency.json'
+        with open(latency_path, 'w') as f:
+            json.dump({str(flow_id): hist.to_dict()
+                       for flow_id, hist in self.flow_latency.items()}, f)
+        
+        if self.binned:
+            self.binned.close()
+            self.logger.info(f"时间片指标已保存: {self.binned.path} "
+                             f"({self.binned.bins_written} 个时间片, {self.binned.rows_written} 行)")
         
-        # 关闭socket
+        # 关闭socket、trace和监控端点
         self.socket.close()
+        if self.trace_writer:
+            self.trace_writer.close()
+            self.logger.info(f"到达trace已保存: {self.trace_writer.path} "
+                             f"({self.trace_writer.count} 条)")
+        if self.metrics_server:
+            self.metrics_server.stop()
         
         self.logger.info("Router已停止")
 
@@ -358,8 +647,19 @@ def main():
                        help='Receiver IP地址')
     parser.add_argument('--receiver-port', type=int, default=9090,
                        help='Receiver端口')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='本地监控端点端口（0表示不启用）')
+    parser.add_argument('--flight-records', type=int, default=65536,
+                       help='飞行记录器保留的最近事件数（0表示不启用，SIGUSR1转储）')
+    parser.add_argument('--fairness-window', type=float, default=1.0,
+                       help='Jain公平性指数的滑动窗口长度（秒，0表示不计算公平性）')
+    parser.add_argument('--bin-width', type=float, default=0.1,
+                       help='按流聚合指标的时间片宽度（秒，0表示不输出router_<算法>_bins.csv）')
+    parser.add_argument('--trace-file',
+                       help='录制到达trace的文件路径（可用 src/packet_trace.py 回放）')
     
     args = parser.parse_args()
+    install_termination_handler()
     
     # 创建并启动路由器
     router = UDPRouter(
@@ -367,8 +667,15 @@ def main():
         bandwidth_kbps=args.bandwidth,
         port=args.port,
         receiver_ip=args.receiver_ip,
-        receiver_port=args.receiver_port
+        receiver_port=args.receiver_port,
+        metrics_port=args.metrics_port,
+        flight_records=args.flight_records,
+        trace_file=args.trace_file,
+        fairness_window=args.fairness_window,
+        bin_width=args.bin_width
     )
+    if router.recorder:
+        router.recorder.install_signal_handler('/Users/aviator/Documents/MCP/wfq/results', router.logger)
     
     try:
         router.start()
@@ -10,32 +10,56 @@ import argparse
 import sys
 import os
 import signal
+import json
+import random
+import struct
 from collections import defaultdict
 
 # 添加src目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from packet_format import ProjectPacket
-from utils import RateLimiter, Statistics, Logger
+from packet_format import ProjectPacket, SEQ_OFFSET, build_template
+from utils import Logger, LatencyHistogram, InflightWindow, install_termination_handler
+from metrics import MetricsRegistry, MetricsServer
+from flight_recorder import FlightRecorder, EVENT_SEND, EVENT_ACK
+from arrivals import parse_arrival, parse_size_distribution
+from binlog import BinaryLogWriter
+
+LOG_FLUSH_INTERVAL = 1.0  # 延迟日志的刷新间隔（秒）
 
 class UDPSender:
     """UDP数据包发送器"""
     
     def __init__(self, flow_id, weight, packet_size, rate_bps, 
-                 router_ip, router_port, duration=None, log_file=None):
+                 router_ip, router_port, duration=None, log_file=None,
+                 metrics_port=0, flight_records=65536, arrival='cbr',
+                 size_distribution=None, seed=None, burst=64, window=65536,
+                 log_format='csv'):
         self.flow_id = flow_id
         self.weight = weight
         self.packet_size = packet_size
-        self.rate_limiter = RateLimiter(rate_bps)
+        self.rate = rate_bps
+        
+        # 到达过程：决定每个包的发送时刻和大小
+        self.sizes = parse_size_distribution(size_distribution, packet_size)
+        self.arrivals = parse_arrival(arrival, rate_bps, self.sizes)
+        self.rng = random.Random(seed)
+        self.schedule_lag = 0.0  # 最近一个包落后计划发送时刻的秒数
         self.router_address = (router_ip, router_port)
         self.duration = duration
         self.running = False
         
-        # 统计信息
-        self.stats = Statistics()
+        # 统计信息（热路径只维护计数器，不逐包记录）
         self.seq_num = 0
-        self.sent_packets = {}  # 序列号 -> 发送时间
-        self.lock = threading.Lock()
+        self.inflight = InflightWindow(window)  # 在途包的发送时间（定长窗口）
+        self.latency = LatencyHistogram()  # 端到端延迟（毫秒）
+        self.packets_sent = 0
+        self.packets_acked = 0
+        self.send_errors = 0
+        self.router_refused = False  # 是否已收到过ICMP端口不可达（只告警一次）
+        # 落后于计划时连续发送多少个包后再读取时钟（每个包仍是一次send系统调用）
+        self.burst = burst
+        self.recorder = FlightRecorder('sender', flight_records) if flight_records else None
         
         # 创建socket
         self.send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -45,6 +69,17 @@ class UDPSender:
         self.local_port = self.recv_socket.getsockname()[1]
         self.local_ip = '127.0.0.1'
         
+        # 快速路径：发送socket连接到Router，之后只需send而无需每包解析地址
+        self.send_socket.connect(self.router_address)
+        self._send = self.send_socket.send
+        
+        # 预构造最大包大小的模板，发送时只原地改写序列号并按本包大小切片
+        self.template = build_template(flow_id, weight, self.arrivals.sizes.max,
+                                       src_ip=self.local_ip, dst_ip=router_ip,
+                                       src_port=self.local_port, dst_port=router_port)
+        self.view = memoryview(self.template)
+        self._pack_seq = struct.Struct('!I').pack_into
+        
         # 设置日志
         if log_file:
             self.logger = Logger.setup_logger(
@@ -62,17 +97,47 @@ class UDPSender:
         # 创建延迟日志文件
         delay_log_path = f'/Users/aviator/Documents/MCP/wfq/results/experiments/data/delays_flow_{flow_id}.csv'
         os.makedirs(os.path.dirname(delay_log_path), exist_ok=True)
-        self.delay_log = open(delay_log_path, 'w')
-        self.delay_log.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+        if log_format == 'binary':
+            self.delay_log = BinaryLogWriter(delay_log_path)
+            self._write_delay = self.delay_log.write
+        else:
+            self.delay_log = open(delay_log_path, 'w')
+            self.delay_log.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+            self._write_delay = self._write_csv_delay
+        self.last_log_flush = 0.0
+        self.latency_path = os.path.join(os.path.dirname(delay_log_path),
+                                         f'latency_flow_{flow_id}.json')
+        
+        # 监控指标
+        self.metrics_port = metrics_port
+        self.metrics_server = None
         
         # 控制线程
         self.send_thread = None
         self.recv_thread = None
         
-    def create_packet(self):
-        """创建数据包"""
+    def setup_metrics(self):
+        """注册监控指标（全部为无锁读取的回调）"""
+        registry = MetricsRegistry()
+        flow_id = self.flow_id
+        registry.counter('sender_packets_sent_total', '已发送数据包数',
+                         lambda: {flow_id: self.packets_sent}, label='flow_id')
+        registry.counter('sender_packets_acked_total', '已收到回发的数据包数',
+                         lambda: {flow_id: self.packets_acked}, label='flow_id')
+        registry.gauge('sender_packets_in_flight', '尚未收到回发的数据包数',
+                       lambda: {flow_id: self.inflight.in_flight()}, label='flow_id')
+        registry.counter('sender_packets_lost_total', '老化出在途窗口仍未收到回发的数据包数',
+                         lambda: {flow_id: self.inflight.lost_count}, label='flow_id')
+        registry.gauge('sender_schedule_lag_seconds', '最近一个包落后计划发送时刻的时间',
+                       lambda: {flow_id: self.schedule_lag}, label='flow_id')
+        registry.histogram('sender_rtt_seconds', '端到端往返延迟',
+                           lambda: {flow_id: self.latency}, label='flow_id')
+        return registry
+        
+    def create_packet(self, packet_size=None):
+        """创建数据包对象（通用路径，发送循环使用send_packet的模板快速路径）"""
         # 计算数据负载大小 (减去24字节的项目头)
-        data_size = max(0, self.packet_size - 24)
+        data_size = max(0, (packet_size or self.packet_size) - 24)
         data = b'X' * data_size
         
         packet = ProjectPacket(
@@ -89,100 +154,160 @@ class UDPSender:
         self.seq_num += 1
         return packet
         
-    def send_loop(self):
-        """发送循环"""
-        self.logger.info(f"开始发送数据包，目标速率: {self.rate_limiter.rate} 字节/秒")
+    def send_packet(self, packet_size):
+        """
+        快速路径发送一个包：在模板中原地写入序列号，从已连接socket发送模板切片，
+        不创建ProjectPacket、不拼接字节串
+        """
+        seq_num = self.seq_num
+        self._pack_seq(self.template, SEQ_OFFSET, seq_num)
+        send_time = time.time()
+        try:
+            self._send(self.view[:packet_size])
+        except OSError as e:
+            self.send_failed(e)
+            return
+        self.seq_num = (seq_num + 1) & 0xFFFFFFFF
+        
+        # 记录发送时间
+        self.inflight.sent(seq_num, send_time)
+        if self.recorder:
+            self.recorder.record(EVENT_SEND, self.flow_id, seq_num,
+                                 min(packet_size, len(self.template)), int(send_time * 1e9))
         
-        start_time = time.time()
-        packets_sent = 0
+        self.packets_sent += 1
+        if self.packets_sent % 100 == 0:
+            self.logger.debug("已发送 %d 个数据包", self.packets_sent)
+        
+    def send_failed(self, error):
+        """
+        记录一次发送失败
+        socket已连接到Router，Router未运行时内核把ICMP端口不可达报告为后续send的
+        ConnectionRefusedError：只在第一次告警，之后只计数，避免逐包刷屏
+        """
+        self.send_errors += 1
+        if isinstance(error, ConnectionRefusedError):
+            if not self.router_refused:
+                self.router_refused = True
+                self.logger.warning("Router %s:%d 拒绝连接（ICMP端口不可达），请确认Router已启动；"
+                                    "之后的发送失败只计数", *self.router_address)
+        else:
+            self.logger.error("发送数据包失败: %s", error)
         
+    def wait_until(self, deadline):
+        """等待到单调时钟deadline，分段休眠以便及时响应停止"""
         while self.running:
-            if self.duration and (time.time() - start_time) >= self.duration:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.1))
+        
+    def schedule(self):
+        """
+        按到达过程生成 (计划发送时刻, 包大小)
+        计划时刻由间隔在单调时钟上累加得到，超出运行时长或trace回放完毕时结束
+        """
+        start = next_due = time.perf_counter()
+        next_arrival = self.arrivals.next
+        rng = self.rng
+        # 包大小限制在包头与模板长度之间：小于包头的包会被Router当作无法解析而丢弃，
+        # trace回放和--packet-size都可能给出这样的值
+        min_size, max_size = ProjectPacket.HEADER_SIZE, len(self.template)
+        while True:
+            arrival = next_arrival(rng)
+            if arrival is None:
+                self.logger.info("到达trace已回放完毕")
+                return
+            gap, packet_size = arrival
+            next_due += gap
+            if self.duration and next_due - start >= self.duration:
+                return
+            yield next_due, min(max(packet_size, min_size), max_size)
+        
+    def send_loop(self):
+        """
+        发送循环
+        落后于计划时立即发送追赶，不会因休眠误差而累积漂移；
+        追赶时连续发送最多burst个已到期的包，其间只读取一次时钟
+        """
+        self.logger.info(f"开始发送数据包，目标速率: {self.rate} 字节/秒, "
+                         f"到达模型: {type(self.arrivals).__name__}")
+        
+        clock = time.perf_counter
+        send_packet = self.send_packet
+        burst = self.burst
+        now = clock()
+        sent_in_burst = 0
+        
+        for next_due, packet_size in self.schedule():
+            if not self.running:
                 break
-                
-            # 创建数据包
-            packet = self.create_packet()
-            packet_data = packet.pack()
-            
-            # 速率控制
-            wait_time = self.rate_limiter.consume(len(packet_data))
-            if wait_time > 0:
-                time.sleep(wait_time)
+            if next_due > now:
+                self.wait_until(next_due)
+                if not self.running:
+                    break
+                now = clock()
+                sent_in_burst = 0
+                self.schedule_lag = max(0.0, now - next_due)
+            elif sent_in_burst >= burst:
+                now = clock()
+                sent_in_burst = 0
+                self.schedule_lag = max(0.0, now - next_due)
             
-            try:
-                # 发送数据包
-                send_time = time.time()
-                self.send_socket.sendto(packet_data, self.router_address)
-                
-                # 记录发送时间
-                with self.lock:
-                    self.sent_packets[packet.seq_num] = send_time
-                
-                self.stats.record('packets_sent', 1, send_time, 
-                                flow_id=self.flow_id, 
-                                seq_num=packet.seq_num,
-                                size=len(packet_data))
+            send_packet(packet_size)
+            sent_in_burst += 1
                 
-                packets_sent += 1
-                
-                if packets_sent % 100 == 0:
-                    self.logger.info(f"已发送 {packets_sent} 个数据包")
-                    
-            except Exception as e:
-                self.logger.error(f"发送数据包失败: {e}")
-                
-        self.logger.info(f"发送线程结束，共发送 {packets_sent} 个数据包")
+        self.logger.info(f"发送线程结束，共发送 {self.packets_sent} 个数据包")
+        
+    def _write_csv_delay(self, timestamp, flow_id, size, seq_num, delay_ms):
+        self.delay_log.write(f"{timestamp},{flow_id},{size},{seq_num},{delay_ms:.2f}\n")
+        
+    def handle_echo(self, data, recv_time):
+        """处理一个回发的数据包：匹配在途窗口并记录延迟"""
+        packet = ProjectPacket.unpack(data)
+        
+        # 检查是否是我们发送的包
+        if packet.flow_id != self.flow_id:
+            return
+        seq_num = packet.seq_num
+        
+        send_time = self.inflight.acked(seq_num)
+        if send_time is None:
+            return
+        
+        # 计算延迟
+        delay = (recv_time - send_time) * 1000  # 转换为毫秒
+        self.latency.record(delay)
+        if self.recorder:
+            self.recorder.record(EVENT_ACK, self.flow_id, seq_num,
+                                 len(data), int(recv_time * 1e9))
+        
+        # 写入延迟日志（缓冲，按间隔刷新）
+        self._write_delay(recv_time, self.flow_id, packet.get_size(), seq_num, delay)
+        if recv_time - self.last_log_flush >= LOG_FLUSH_INTERVAL:
+            self.delay_log.flush()
+            self.last_log_flush = recv_time
+        
+        self.packets_acked += 1
+        
+        if self.packets_acked % 100 == 0:
+            self.logger.debug("收到确认: seq=%d, 延迟=%.2fms", seq_num, delay)
         
     def recv_loop(self):
         """接收循环"""
         self.logger.info("开始接收返回的数据包")
         
-        packets_received = 0
-        
         while self.running:
             try:
                 data, addr = self.recv_socket.recvfrom(65535)
-                recv_time = time.time()
-                
-                # 解析数据包
-                packet = ProjectPacket.unpack(data)
-                
-                # 检查是否是我们发送的包
-                if packet.flow_id == self.flow_id:
-                    seq_num = packet.seq_num
-                    
-                    with self.lock:
-                        if seq_num in self.sent_packets:
-                            # 计算延迟
-                            send_time = self.sent_packets[seq_num]
-                            delay = (recv_time - send_time) * 1000  # 转换为毫秒
-                            
-                            # 记录统计信息
-                            self.stats.record('packets_received', 1, recv_time,
-                                            flow_id=self.flow_id,
-                                            seq_num=seq_num,
-                                            delay_ms=delay)
-                            
-                            # 写入延迟日志
-                            self.delay_log.write(
-                                f"{recv_time},{self.flow_id},{packet.get_size()},{seq_num},{delay:.2f}\n"
-                            )
-                            self.delay_log.flush()
-                            
-                            # 删除已确认的包
-                            del self.sent_packets[seq_num]
-                            packets_received += 1
-                            
-                            if packets_received % 100 == 0:
-                                self.logger.info(f"收到确认: seq={seq_num}, 延迟={delay:.2f}ms")
-                
+                self.handle_echo(data, time.time())
             except socket.timeout:
                 continue
             except Exception as e:
                 if self.running:
-                    self.logger.error(f"接收数据包失败: {e}")
+                    self.logger.error("接收数据包失败: %s", e)
                     
-        self.logger.info(f"接收线程结束，收到 {packets_received} 个确认包")
+        self.logger.info(f"接收线程结束，收到 {self.packets_acked} 个确认包")
         
     def start(self):
         """启动发送器"""
@@ -197,6 +322,11 @@ class UDPSender:
         
         self.logger.info(f"Sender {self.flow_id} 已启动")
         
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.setup_metrics(), self.metrics_port)
+            self.metrics_server.start()
+            self.logger.info(f"监控端点: http://127.0.0.1:{self.metrics_port}/metrics")
+        
     def stop(self):
         """停止发送器"""
         self.logger.info(f"正在停止 Sender {self.flow_id}")
@@ -209,23 +339,31 @@ class UDPSender:
             self.recv_thread.join()
             
         # 打印统计信息
-        sent_data = self.stats.get_data('packets_sent')
-        recv_data = self.stats.get_data('packets_received')
+        self.logger.info(f"统计信息: 发送 {self.packets_sent} 包，接收 {self.packets_acked} 包")
+        inflight = self.inflight
+        self.logger.info(f"丢失: {inflight.lost_count} 包（老化出{inflight.size}槽位窗口）, "
+                         f"停止时在途: {inflight.in_flight()} 包, "
+                         f"无匹配回发: {inflight.unmatched_count} 包")
+        if self.send_errors:
+            self.logger.info(f"发送失败: {self.send_errors} 包")
         
-        self.logger.info(f"统计信息: 发送 {len(sent_data)} 包，接收 {len(recv_data)} 包")
+        if self.latency.count:
+            self.logger.info(
+                f"延迟统计: 平均={self.latency.mean():.2f}ms, "
+                f"最小={self.latency.min():.2f}ms, 最大={self.latency.max():.2f}ms"
+            )
+            self.logger.info(f"延迟分位数: {self.latency.format_percentiles()}")
         
-        if recv_data:
-            delays = [item['delay_ms'] for item in recv_data if 'delay_ms' in item]
-            if delays:
-                avg_delay = sum(delays) / len(delays)
-                min_delay = min(delays)
-                max_delay = max(delays)
-                self.logger.info(f"延迟统计: 平均={avg_delay:.2f}ms, 最小={min_delay:.2f}ms, 最大={max_delay:.2f}ms")
+        # 保存可合并的延迟直方图
+        with open(self.latency_path, 'w') as f:
+            json.dump(self.latency.to_dict(), f)
         
         # 关闭资源
         self.send_socket.close()
         self.recv_socket.close()
         self.delay_log.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
         
         self.logger.info(f"Sender {self.flow_id} 已停止")
 
@@ -235,24 +373,55 @@ def main():
     parser.add_argument('--weight', type=int, default=1, help='权重')
     parser.add_argument('--packet-size', type=int, default=1024, help='数据包大小（字节）')
     parser.add_argument('--rate', type=int, default=102400, help='发送速率（字节/秒）')
+    parser.add_argument('--arrival', default='cbr',
+                       help='到达模型: cbr | poisson | onoff:ON:OFF[:exp|pareto[:ALPHA]] | '
+                            'mmpp:M1,M2:D1,D2 | trace:PATH[:FLOW_ID]')
+    parser.add_argument('--size-dist',
+                       help='包大小分布: fixed:SIZE | uniform:MIN:MAX | '
+                            'bimodal:SMALL:LARGE:P_SMALL | empirical:S1=P1,S2=P2（默认固定为--packet-size）')
+    parser.add_argument('--seed', type=int, help='随机种子（便于复现随机到达）')
+    parser.add_argument('--burst', type=int, default=64,
+                       help='落后于计划时连续发送的最大包数，之后重新读取时钟（每个包仍单独发送）')
+    parser.add_argument('--window', type=int, default=65536,
+                       help='在途窗口槽位数，超过该数量仍未回发的包计为丢失')
+    parser.add_argument('--log-format', choices=['csv', 'binary'], default='csv',
+                       help='延迟日志格式：csv，或缓冲写入的定长二进制记录')
     parser.add_argument('--router-ip', default='127.0.0.1', help='Router IP地址')
     parser.add_argument('--router-port', type=int, default=8080, help='Router端口')
     parser.add_argument('--duration', type=int, default=30, help='运行时长（秒）')
     parser.add_argument('--log-file', help='日志文件路径')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='本地监控端点端口（0表示不启用）')
+    parser.add_argument('--flight-records', type=int, default=65536,
+                       help='飞行记录器保留的最近事件数（0表示不启用，SIGUSR1转储）')
     
     args = parser.parse_args()
+    install_termination_handler()
     
-    # 创建并启动发送器
-    sender = UDPSender(
-        flow_id=args.flow_id,
-        weight=args.weight,
-        packet_size=args.packet_size,
-        rate_bps=args.rate,
-        router_ip=args.router_ip,
-        router_port=args.router_port,
-        duration=args.duration,
-        log_file=args.log_file
-    )
+    # 创建并启动发送器（到达模型和包大小分布配置错误时按用法错误退出）
+    try:
+        sender = UDPSender(
+            flow_id=args.flow_id,
+            weight=args.weight,
+            packet_size=args.packet_size,
+            rate_bps=args.rate,
+            router_ip=args.router_ip,
+            router_port=args.router_port,
+            duration=args.duration,
+            log_file=args.log_file,
+            metrics_port=args.metrics_port,
+            flight_records=args.flight_records,
+            arrival=args.arrival,
+            size_distribution=args.size_dist,
+            seed=args.seed,
+            burst=args.burst,
+            window=args.window,
+            log_format=args.log_format
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if sender.recorder:
+        sender.recorder.install_signal_handler('/Users/aviator/Documents/MCP/wfq/results', sender.logger)
     
     try:
         sender.start()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+离散事件仿真程序 - 在虚拟时钟上驱动路由器调度算法
+不使用socket和真实时间，用事件堆驱动与Router相同的调度器、FlowQueue和RateLimiter，
+结果以现有CSV格式输出，可直接交给 analyze_results.py 分析
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from router import create_scheduler
+from utils import RateLimiter, LatencyHistogram
+
+# 事件类型（同一时刻先处理到达，再处理链路空闲）
+EVENT_ARRIVAL = 0
+EVENT_LINK_FREE = 1
+
+class VirtualClock:
+    """虚拟时钟，可作为RateLimiter的clock参数"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+class SimPacket:
+    """仿真数据包，只包含调度器用到的字段"""
+
+    __slots__ = ('flow_id', 'weight', 'seq_num', 'size', 'timestamp')
+
+    def __init__(self, flow_id, weight, seq_num, size, timestamp):
+        self.flow_id = flow_id
+        self.weight = weight
+        self.seq_num = seq_num
+        self.size = size
+        self.timestamp = timestamp
+
+    def get_size(self):
+        return self.size
+
+class SimFlow:
+    """仿真流配置"""
+
+    def __init__(self, flow_id, weight, packet_size, rate_bps,
+                 start=0.0, stop=None, arrival='cbr'):
+        self.flow_id = flow_id
+        self.weight = weight
+        self.packet_size = packet_size
+        self.rate = rate_bps
+        self.start = start
+        self.stop = stop
+        self.arrival = arrival
+        self.seq_num = 0
+
+    @classmethod
+    def parse(cls, spec, arrival='cbr'):
+        """解析 FLOW_ID:WEIGHT:SIZE:RATE[:START[:STOP]] 形式的配置"""
+        parts = spec.split(':')
+        if len(parts) < 4:
+            raise ValueError(f"流配置格式错误: {spec}")
+        start = float(parts[4]) if len(parts) > 4 and parts[4] else 0.0
+        stop = float(parts[5]) if len(parts) > 5 and parts[5] else None
+        return cls(int(parts[0]), int(parts[1]), int(parts[2]), float(parts[3]),
+                   start, stop, arrival)
+
+    def next_interval(self, rng):
+        """下一个包的到达间隔（秒）"""
+        mean = self.packet_size / self.rate
+        if self.arrival == 'poisson':
+            return rng.expovariate(1.0 / mean)
+        return mean
+
+# 与 scripts/run_*_experiment.sh 相同的实验序列
+DEFAULT_FLOWS = ['1:1:1024:51200:0:8', '2:1:512:25600:2:6', '3:2:1024:102400:4:8']
+
+class Simulation:
+    """单次仿真运行"""
+
+    def __init__(self, algorithm, bandwidth_kbps, flows, duration=None, seed=0,
+                 record_packets=True):
+        """
+        :param algorithm: 'fifo' 或 'wfq'
+        :param bandwidth_kbps: 出口带宽（KB/s），与router.py的--bandwidth一致
+        :param flows: SimFlow列表
+        :param duration: 仿真时长（秒），None表示直到所有流结束且队列清空
+        :param record_packets: 是否保留逐包记录（用于输出CSV）
+        """
+        self.algorithm = algorithm
+        self.bandwidth = bandwidth_kbps * 1024
+        self.flows = {flow.flow_id: flow for flow in flows}
+        self.duration = duration
+        self.rng = random.Random(seed)
+        self.record_packets = record_packets
+
+        self.clock = VirtualClock()
+        self.scheduler = create_scheduler(algorithm)
+        self.rate_limiter = RateLimiter(self.bandwidth, clock=self.clock)
+
+        self.events = []
+        self.event_seq = itertools.count()
+        self.link_busy = False
+
+        # 统计信息
+        self.arrived = defaultdict(int)
+        self.forwarded = defaultdict(int)
+        self.forwarded_bytes = defaultdict(int)
+        self.dropped = defaultdict(int)
+        self.flow_latency = defaultdict(LatencyHistogram)
+        self.packet_log = []  # (forward_time, flow_id, size, seq_num, queue_delay_ms)
+
+    def schedule(self, when, event, payload=None):
+        heapq.heappush(self.events, (when, event, next(self.event_seq), payload))
+
+    def on_arrival(self, flow):
+        """处理一个包到达，并安排该流的下一次到达"""
+        now = self.clock.now
+        packet = SimPacket(flow.flow_id, flow.weight, flow.seq_num,
+                           flow.packet_size, now)
+        flow.seq_num += 1
+        self.arrived[flow.flow_id] += 1
+        if not self.scheduler.enqueue(packet):
+            self.dropped[flow.flow_id] += 1
+
+        next_time = now + flow.next_interval(self.rng)
+        if flow.stop is None or next_time < flow.stop:
+            self.schedule(next_time, EVENT_ARRIVAL, flow)
+
+        if not self.link_busy:
+            self.serve()
+
+    def serve(self):
+        """链路空闲时取下一个包，按令牌桶计算发送完成时刻"""
+        packet = self.scheduler.dequeue()
+        if packet is None:
+            self.link_busy = False
+            return
+
+        self.link_busy = True
+        wait_time = self.rate_limiter.consume(packet.size)
+        forward_time = self.clock.now + wait_time
+        queue_delay = (forward_time - packet.timestamp) * 1000
+
+        flow_id = packet.flow_id
+        self.forwarded[flow_id] += 1
+        self.forwarded_bytes[flow_id] += packet.size
+        self.flow_latency[flow_id].record(queue_delay)
+        if self.record_packets:
+            self.packet_log.append((forward_time, flow_id, packet.size,
+                                    packet.seq_num, queue_delay))
+
+        self.schedule(forward_time, EVENT_LINK_FREE)
+
+    def run(self):
+        """运行仿真直到事件耗尽或到达duration"""
+        for flow in self.flows.values():
+            if flow.stop is None and self.duration is None:
+                raise ValueError(f"Flow {flow.flow_id} 没有结束时间，必须指定duration")
+            self.schedule(flow.start, EVENT_ARRIVAL, flow)
+
+        events = self.events
+        while events:
+            when, event, _, payload = heapq.heappop(events)
+            if self.duration is not None and when > self.duration:
+                break
+            self.clock.now = when
+            if event == EVENT_ARRIVAL:
+                self.on_arrival(payload)
+            else:
+                self.serve()
+        return self
+
+    def summary_rows(self):
+        """每流汇总：(flow_id, weight, arrived, forwarded, bytes, dropped, 直方图)"""
+        rows = []
+        for flow_id in sorted(self.flows):
+            rows.append((flow_id, self.flows[flow_id].weight,
+                         self.arrived[flow_id], self.forwarded[flow_id],
+                         self.forwarded_bytes[flow_id], self.dropped[flow_id],
+                         self.flow_latency[flow_id]))
+        return rows
+
+    def write_results(self, output_dir, prefix=''):
+        """
+        按现有格式写出结果
+        - {prefix}received_data.log：与receiver数据日志相同（相对时间）
+        - {prefix}delays_flow_<id>.csv：与sender延迟日志相同（delay为路由器排队延迟）
+        - {prefix}sim_summary.txt：与router汇总相似的文本汇总
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = []
+
+        received_path = os.path.join(output_dir, f'{prefix}received_data.log')
+        with open(received_path, 'w') as f:
+            f.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+            base = self.packet_log[0][0] if self.packet_log else 0
+            f.writelines(f"{t - base},{flow_id},{size},{seq},0\n"
+                         for t, flow_id, size, seq, _ in self.packet_log)
+        outputs.append(received_path)
+
+        delay_files = {}
+        try:
+            for flow_id in sorted(self.flows):
+                path = os.path.join(output_dir, f'{prefix}delays_flow_{flow_id}.csv')
+                delay_files[flow_id] = open(path, 'w')
+                delay_files[flow_id].write(
+                    'timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+                outputs.append(path)
+            for t, flow_id, size, seq, delay in self.packet_log:
+                delay_files[flow_id].write(f"{t},{flow_id},{size},{seq},{delay:.2f}\n")
+        finally:
+            for f in delay_files.values():
+                f.close()
+
+        summary_path = os.path.join(output_dir, f'{prefix}sim_summary.txt')
+        with open(summary_path, 'w') as f:
+            f.write(f"=== Simulation Summary ({self.algorithm.upper()}) ===\n")
+            f.write(f"Bandwidth: {self.bandwidth / 1024:.1f} KB/s\n")
+            f.write(f"Virtual Time: {self.clock.now:.3f} s\n")
+            for flow_id, weight, arrived, forwarded, nbytes, dropped, hist in self.summary_rows():
+                f.write(f"\nFlow {flow_id} (weight={weight}):\n")
+                f.write(f"  Packets Arrived: {arrived}\n")
+                f.write(f"  Packets Forwarded: {forwarded}\n")
+                f.write(f"  Bytes Forwarded: {nbytes}\n")
+                f.write(f"  Packets Dropped: {dropped}\n")
+                f.write(f"  Queue Delay: {hist.format_percentiles()}\n")
+        outputs.append(summary_path)
+        return outputs
+
+def run_weight_sweep(algorithm, bandwidth_kbps, flow_specs, weight_sets, duration,
+                     arrival, seed, output_file):
+    """
+    对多组权重配置依次仿真，汇总到一个CSV
+    :param weight_sets: 权重列表的列表，长度与flow_specs一致
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        f.write('weight_set,flow_id,weight,packets_arrived,packets_forwarded,'
+                'bytes_forwarded,packets_dropped,byte_share,p50_ms,p99_ms,p99_9_ms\n')
+        for weights in weight_sets:
+            if len(weights) != len(flow_specs):
+                raise ValueError(f"权重组 {weights} 与流数量 {len(flow_specs)} 不一致")
+            flows = [SimFlow.parse(spec, arrival) for spec in flow_specs]
+            for flow, weight in zip(flows, weights):
+                flow.weight = weight
+            sim = Simulation(algorithm, bandwidth_kbps, flows, duration, seed,
+                             record_packets=False).run()
+            rows = sim.summary_rows()
+            total_bytes = sum(row[4] for row in rows) or 1
+            label = '/'.join(str(w) for w in weights)
+            for flow_id, weight, arrived, forwarded, nbytes, dropped, hist in rows:
+                pcts = hist.percentiles()
+                f.write(f"{label},{flow_id},{weight},{arrived},{forwarded},{nbytes},"
+                        f"{dropped},{nbytes / total_bytes:.4f},"
+                        f"{pcts[50]:.3f},{pcts[99]:.3f},{pcts[99.9]:.3f}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description='FIFO/WFQ离散事件仿真（虚拟时钟，无socket）')
+    parser.add_argument('--algorithm', choices=['fifo', 'wfq'], default='wfq',
+                       help='调度算法: fifo 或 wfq')
+    parser.add_argument('--bandwidth', type=float, default=500,
+                       help='输出带宽限制（KB/s）')
+    parser.add_argument('--flow', action='append', dest='flows',
+                       help='流配置 FLOW_ID:WEIGHT:SIZE:RATE[:START[:STOP]]，可重复；'
+                            '默认使用实验脚本中的三流序列')
+    parser.add_argument('--duration', type=float,
+                       help='仿真时长（秒），默认直到所有流结束')
+    parser.add_argument('--arrival', choices=['cbr', 'poisson'], default='cbr',
+                       help='到达过程')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--output-dir', default='.', help='结果输出目录')
+    parser.add_argument('--prefix', help='输出文件名前缀，默认为 <algorithm>_')
+    parser.add_argument('--weight-sets',
+                       help='权重扫描，如 "1,1,2;1,2,4"，结果写入 <prefix>weight_sweep.csv')
+
+    args = parser.parse_args()
+
+    flow_specs = args.flows or DEFAULT_FLOWS
+    prefix = args.prefix if args.prefix is not None else f'{args.algorithm}_'
+
+    started = time.perf_counter()
+
+    if args.weight_sets:
+        weight_sets = [[int(w) for w in group.split(',')]
+                       for group in args.weight_sets.split(';') if group.strip()]
+        output_file = os.path.join(args.output_dir, f'{prefix}weight_sweep.csv')
+        run_weight_sweep(args.algorithm, args.bandwidth, flow_specs, weight_sets,
+                         args.duration, args.arrival, args.seed, output_file)
+        print(f"✅ {len(weight_sets)} 组权重仿真完成，耗时 "
+              f"{time.perf_counter() - started:.2f}s: {output_file}")
+        return
+
+    flows = [SimFlow.parse(spec, args.arrival) for spec in flow_specs]
+    sim = Simulation(args.algorithm, args.bandwidth, flows, args.duration,
+                     args.seed).run()
+    elapsed = time.perf_counter() - started
+
+    total_packets = sum(sim.arrived.values())
+    print(f"仿真完成: {total_packets} 个包, 虚拟时间 {sim.clock.now:.2f}s, "
+          f"实际耗时 {elapsed:.2f}s")
+    for flow_id, weight, arrived, forwarded, nbytes, dropped, hist in sim.summary_rows():
+        print(f"  Flow {flow_id} (权重={weight}): 到达={arrived}, 转发={forwarded}, "
+              f"丢弃={dropped}, {hist.format_percentiles()}")
+
+    for path in sim.write_results(args.output_dir, prefix):
+        print(f"✅ 已生成: {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+多流流量生成器
+在单个进程内驱动大量流：发送线程用最小堆维护各流的下一次发送时刻，
+按单调时钟精确调度；所有流共享一个socket或一个小的socket池，
+一个接收线程通过selectors收取所有socket上的回发并计算每流延迟
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+
+# 添加src目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from packet_format import ProjectPacket, SEQ_OFFSET, build_template
+from utils import Logger, LatencyHistogram, InflightWindow, install_termination_handler
+from metrics import MetricsRegistry, MetricsServer
+from flight_recorder import FlightRecorder, EVENT_SEND, EVENT_ACK
+from arrivals import parse_arrival, parse_size_distribution
+
+FLOW_SEQ = struct.Struct('!II')  # 偏移16处：流ID + 序列号
+
+class GeneratorFlow:
+    """生成器中的一个流"""
+
+    __slots__ = ('flow_id', 'weight', 'packet_size', 'rate', 'start', 'stop',
+                 'arrivals', 'rng', 'next_size', 'sock', 'template', 'view', 'seq_num',
+                 'inflight', 'latency', 'packets_sent', 'packets_acked')
+
+    def __init__(self, flow_id, weight, packet_size, rate_bps, start=0.0, stop=None,
+                 arrival='cbr', size_distribution=None, seed=None):
+        self.flow_id = flow_id
+        self.weight = weight
+        self.packet_size = max(packet_size, ProjectPacket.HEADER_SIZE)
+        self.rate = rate_bps
+        self.start = start
+        self.stop = stop
+        self.arrivals = parse_arrival(arrival, rate_bps,
+                                      parse_size_distribution(size_distribution,
+                                                              self.packet_size))
+        self.rng = random.Random(None if seed is None else seed + flow_id)
+        self.next_size = self.packet_size
+        self.sock = None
+        self.template = None
+        self.view = None
+        self.seq_num = 0
+        self.inflight = None  # 在途包窗口，bind时按生成器配置创建
+        self.latency = LatencyHistogram()
+        self.packets_sent = 0
+        self.packets_acked = 0
+
+    @classmethod
+    def parse(cls, spec, **kwargs):
+        """解析 FLOW_ID:WEIGHT:SIZE:RATE[:START[:STOP]] 形式的配置（与simulator.py一致）"""
+        parts = spec.split(':')
+        if len(parts) < 4:
+            raise ValueError(f"流配置格式错误: {spec}")
+        start = float(parts[4]) if len(parts) > 4 and parts[4] else 0.0
+        stop = float(parts[5]) if len(parts) > 5 and parts[5] else None
+        return cls(int(parts[0]), int(parts[1]), int(parts[2]), float(parts[3]),
+                   start, stop, **kwargs)
+
+    def bind(self, sock, local_ip, router_address, window=1024):
+        """绑定到共享socket，创建在途窗口并预先构造数据包模板"""
+        self.sock = sock
+        self.inflight = InflightWindow(window)
+        self.template = build_template(self.flow_id, self.weight, self.arrivals.sizes.max,
+                                       src_ip=local_ip, dst_ip=router_address[0],
+                                       src_port=sock.getsockname()[1],
+                                       dst_port=router_address[1])
+        self.view = memoryview(self.template)
+
+    def mean_interval(self):
+        """相邻两个包的平均发送间隔（秒）"""
+        packet_rate = self.arrivals.packet_rate
+        return 1 / packet_rate if packet_rate else 0.0
+
+    def next_departure(self):
+        """抽取下一个包：返回距上一个包的间隔并记下其大小，到达过程结束时返回None"""
+        arrival = self.arrivals.next(self.rng)
+        if arrival is None:
+            return None
+        gap, size = arrival
+        # trace回放的包大小不经过分布校验，限制在包头与最大包长之间，保证Router能解析
+        self.next_size = min(max(size, ProjectPacket.HEADER_SIZE), ProjectPacket.MAX_PACKET_SIZE)
+        return gap
+
+class MultiFlowSender:
+    """单进程多流发送器"""
+
+    def __init__(self, flows, router_ip, router_port, socket_count=1, duration=None,
+                 log_file=None, metrics_port=0, flight_records=65536, window=1024):
+        """
+        :param flows: GeneratorFlow列表
+        :param socket_count: socket池大小，流按 索引 % socket_count 分配
+        :param window: 每个流的在途窗口槽位数
+        """
+        self.flows = {flow.flow_id: flow for flow in flows}
+        self.router_address = (router_ip, router_port)
+        self.duration = duration
+        self.running = False
+        self.local_ip = '127.0.0.1'
+        self.window = window
+
+        # socket池
+        self.sockets = []
+        for _ in range(max(1, min(socket_count, len(flows)))):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+            sock.bind(('', 0))
+            sock.setblocking(False)
+            self.sockets.append(sock)
+        for index, flow in enumerate(flows):
+            flow.bind(self.sockets[index % len(self.sockets)], self.local_ip,
+                      self.router_address, window)
+
+        self.packets_sent = 0
+        self.packets_acked = 0
+        self.send_errors = 0
+        self.late_sends = 0  # 实际发送时刻落后计划超过1ms的包数
+        self.recorder = FlightRecorder('sender', flight_records) if flight_records else None
+
+        # 设置日志
+        log_path = log_file or '/Users/aviator/Documents/MCP/wfq/results/generator.log'
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self.logger = Logger.setup_logger('generator', log_path)
+
+        # 延迟日志（所有流写入同一个文件，列格式与delays_flow_N.csv一致）
+        data_dir = '/Users/aviator/Documents/MCP/wfq/results/experiments/data'
+        os.makedirs(data_dir, exist_ok=True)
+        self.delay_log = open(os.path.join(data_dir, 'delays_generator.csv'), 'w')
+        self.delay_log.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+        self.latency_path = os.path.join(data_dir, 'latency_generator.json')
+
+        # 监控指标
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+
+        # 控制线程
+        self.send_thread = None
+        self.recv_thread = None
+
+    def setup_metrics(self):
+        """注册监控指标（全部为无锁读取的回调）"""
+        registry = MetricsRegistry()
+        flows = self.flows
+        registry.counter('sender_packets_sent_total', '已发送数据包数',
+                         lambda: {flow_id: flow.packets_sent
+                                  for flow_id, flow in flows.items()}, label='flow_id')
+        registry.counter('sender_packets_acked_total', '已收到回发的数据包数',
+                         lambda: {flow_id: flow.packets_acked
+                                  for flow_id, flow in flows.items()}, label='flow_id')
+        registry.gauge('sender_packets_in_flight', '尚未收到回发的数据包数',
+                       lambda: {flow_id: flow.inflight.in_flight()
+                                for flow_id, flow in flows.items()}, label='flow_id')
+        registry.counter('sender_packets_lost_total', '老化出在途窗口仍未收到回发的数据包数',
+                         lambda: {flow_id: flow.inflight.lost_count
+                                  for flow_id, flow in flows.items()}, label='flow_id')
+        registry.counter('generator_late_sends_total', '落后计划发送时刻超过1ms的包数',
+                         lambda: self.late_sends)
+        registry.histogram('sender_rtt_seconds', '端到端往返延迟',
+                           lambda: {flow_id: flow.latency
+                                    for flow_id, flow in flows.items()}, label='flow_id')
+        return registry
+
+    def send_loop(self):
+        """发送循环：每次取出最早到期的流，发送后按其到达过程安排下一次发送"""
+        self.logger.info("开始发送: %d 个流, %d 个socket", len(self.flows), len(self.sockets))
+
+        clock = time.perf_counter
+        start = clock()
+        end = start + self.duration if self.duration else None
+        # 各流的首包相位在一个发送间隔内均匀错开，避免所有流同时到期形成突发
+        flow_count = len(self.flows)
+        heap = []
+        for index, flow in enumerate(self.flows.values()):
+            gap = flow.next_departure()
+            if gap is not None:
+                phase = flow.mean_interval() * index / flow_count
+                heap.append((start + flow.start + phase + gap, flow.flow_id))
+        heapq.heapify(heap)
+        flows = self.flows
+        router_address = self.router_address
+        recorder = self.recorder
+        pack_seq = struct.Struct('!I').pack_into
+
+        while self.running and heap:
+            due, flow_id = heap[0]
+            if end is not None and due >= end:
+                break
+            now = clock()
+            if due > now:
+                time.sleep(min(due - now, 0.1))
+                continue
+            if now - due > 0.001:
+                self.late_sends += 1
+
+            flow = flows[flow_id]
+            seq_num = flow.seq_num
+            size = flow.next_size
+            pack_seq(flow.template, SEQ_OFFSET, seq_num)
+            send_time = time.time()
+            try:
+                flow.sock.sendto(flow.view[:size], router_address)
+            except BlockingIOError:
+                # 发送缓冲区已满，本地丢弃：不推进序列号（与UDPSender一致），
+                # 接收端的序列号跟踪不会把它算作网络丢包，本地丢弃只计入发送失败
+                self.send_errors += 1
+            except OSError as e:
+                self.send_errors += 1
+                self.logger.error("发送数据包失败: Flow %s, %s", flow_id, e)
+            else:
+                flow.inflight.sent(seq_num, send_time)
+                flow.packets_sent += 1
+                self.packets_sent += 1
+                if recorder:
+                    recorder.record(EVENT_SEND, flow_id, seq_num, size,
+                                    int(send_time * 1e9))
+                if self.packets_sent % 10000 == 0:
+                    self.logger.info("已发送 %d 个数据包", self.packets_sent)
+                flow.seq_num = (seq_num + 1) & 0xFFFFFFFF
+
+            # 按计划时刻而非实际时刻推进，避免累积漂移
+            gap = flow.next_departure()
+            next_due = due + gap if gap is not None else None
+            if next_due is None or (flow.stop is not None and next_due - start >= flow.stop):
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (next_due, flow_id))
+
+        self.logger.info("发送线程结束，共发送 %d 个数据包", self.packets_sent)
+
+    def recv_loop(self):
+        """接收循环：收取socket池上所有回发"""
+        selector = selectors.DefaultSelector()
+        for sock in self.sockets:
+            selector.register(sock, selectors.EVENT_READ)
+        flows = self.flows
+        recorder = self.recorder
+        unpack_flow_seq = FLOW_SEQ.unpack_from
+        delay_log = self.delay_log
+
+        while self.running:
+            for key, _ in selector.select(timeout=0.1):
+                sock = key.fileobj
+                while True:
+                    try:
+                        data = sock.recv(65535)
+                    except OSError:  # 包括BlockingIOError：已读空
+                        break
+                    recv_time = time.time()
+                    if len(data) < ProjectPacket.HEADER_SIZE:
+                        continue
+                    flow_id, seq_num = unpack_flow_seq(data, 16)
+                    flow = flows.get(flow_id)
+                    if flow is None:
+                        continue
+                    send_time = flow.inflight.acked(seq_num)
+                    if send_time is None:
+                        continue
+                    delay = (recv_time - send_time) * 1000
+                    flow.latency.record(delay)
+                    flow.packets_acked += 1
+                    self.packets_acked += 1
+                    if recorder:
+                        recorder.record(EVENT_ACK, flow_id, seq_num, len(data),
+                                        int(recv_time * 1e9))
+                    delay_log.write(f"{recv_time},{flow_id},{len(data)},{seq_num},{delay:.2f}\n")
+        selector.close()
+
+        self.logger.info("接收线程结束，收到 %d 个确认包", self.packets_acked)
+
+    def start(self):
+        """启动生成器"""
+        self.running = True
+        self.send_thread = threading.Thread(target=self.send_loop)
+        self.recv_thread = threading.Thread(target=self.recv_loop)
+        self.send_thread.start()
+        self.recv_thread.start()
+        self.logger.info("流量生成器已启动")
+
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.setup_metrics(), self.metrics_port)
+            self.metrics_server.start()
+            self.logger.info(f"监控端点: http://127.0.0.1:{self.metrics_port}/metrics")
+
+    def wait(self):
+        """等待发送线程结束（到达时长或所有流停止）"""
+        while self.send_thread.is_alive():
+            self.send_thread.join(timeout=0.5)
+
+    def stop(self):
+        """停止生成器"""
+        self.logger.info("正在停止流量生成器")
+        self.running = False
+        if self.send_thread:
+            self.send_thread.join()
+        if self.recv_thread:
+            self.recv_thread.join()
+
+        total = LatencyHistogram()
+        for flow in self.flows.values():
+            total.merge(flow.latency)
+        self.logger.info(f"统计信息: {len(self.flows)} 个流, 发送 {self.packets_sent} 包, "
+                         f"接收 {self.packets_acked} 包, 发送失败 {self.send_errors} 包, "
+                         f"延迟发送 {self.late_sends} 包")
+        lost = sum(flow.inflight.lost_count for flow in self.flows.values())
+        in_flight = sum(flow.inflight.in_flight() for flow in self.flows.values())
+        self.logger.info(f"丢失: {lost} 包（老化出每流{self.window}槽位窗口）, "
+                         f"停止时在途: {in_flight} 包")
+        if total.count:
+            self.logger.info(f"延迟分位数（所有流）: {total.format_percentiles()}")
+
+        # 保存每流可合并的延迟直方图
+        with open(self.latency_path, 'w') as f:
+            json.dump({str(flow_id): flow.latency.to_dict()
+                       for flow_id, flow in self.flows.items() if flow.latency.count}, f)
+
+        for sock in self.sockets:
+            sock.close()
+        self.delay_log.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+
+        self.logger.info("流量生成器已停止")
+
+def build_flows(args):
+    """根据命令行参数构造流列表"""
+    options = {'arrival': args.arrival, 'size_distribution': args.size_dist,
+               'seed': args.seed}
+    flows = [GeneratorFlow.parse(spec, **options) for spec in args.flows or []]
+    if args.flow_count:
+        weights = [int(w) for w in args.weights.split(',') if w]
+        first = max((flow.flow_id for flow in flows), default=0) + 1
+        for index in range(args.flow_count):
+            flows.append(GeneratorFlow(first + index, weights[index % len(weights)],
+                                       args.packet_size, args.rate, **options))
+    return flows
+
+def main():
+    parser = argparse.ArgumentParser(description='单进程多流UDP流量生成器')
+    parser.add_argument('--flow', dest='flows', action='append',
+                       help='流配置 FLOW_ID:WEIGHT:SIZE:RATE[:START[:STOP]]，可重复；'
+                            'RATE单位为字节/秒，START/STOP为相对开始的秒数')
+    parser.add_argument('--flow-count', type=int, default=0,
+                       help='额外生成的同构流数量（流ID接在--flow之后编号）')
+    parser.add_argument('--weights', default='1',
+                       help='同构流的权重列表，逗号分隔，按流循环使用')
+    parser.add_argument('--packet-size', type=int, default=1024, help='同构流的数据包大小（字节）')
+    parser.add_argument('--rate', type=float, default=10240, help='同构流的发送速率（字节/秒）')
+    parser.add_argument('--arrival', default='cbr',
+                       help='所有流的到达模型: cbr | poisson | onoff:ON:OFF[:exp|pareto[:ALPHA]] | '
+                            'mmpp:M1,M2:D1,D2 | trace:PATH[:FLOW_ID]')
+    parser.add_argument('--size-dist',
+                       help='所有流的包大小分布: fixed:SIZE | uniform:MIN:MAX | '
+                            'bimodal:SMALL:LARGE:P_SMALL | empirical:S1=P1,S2=P2（默认固定为流的SIZE）')
+    parser.add_argument('--seed', type=int, help='随机种子（各流使用 seed+流ID）')
+    parser.add_argument('--sockets', type=int, default=1,
+                       help='socket池大小（默认所有流共享一个socket）')
+    parser.add_argument('--window', type=int, default=1024,
+                       help='每个流的在途窗口槽位数，超过该数量仍未回发的包计为丢失')
+    parser.add_argument('--router-ip', default='127.0.0.1', help='Router IP地址')
+    parser.add_argument('--router-port', type=int, default=8080, help='Router端口')
+    parser.add_argument('--duration', type=float, default=30, help='运行时长（秒）')
+    parser.add_argument('--log-file', help='日志文件路径')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                       help='本地监控端点端口（0表示不启用）')
+    parser.add_argument('--flight-records', type=int, default=65536,
+                       help='飞行记录器保留的最近事件数（0表示不启用，SIGUSR1转储）')
+
+    args = parser.parse_args()
+    try:
+        flows = build_flows(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if not flows:
+        parser.error('至少需要 --flow 或 --flow-count 之一')
+    if len({flow.flow_id for flow in flows}) != len(flows):
+        parser.error('流ID重复')
+    install_termination_handler()
+
+    generator = MultiFlowSender(
+        flows,
+        router_ip=args.router_ip,
+        router_port=args.router_port,
+        socket_count=args.sockets,
+        duration=args.duration,
+        log_file=args.log_file,
+        metrics_port=args.metrics_port,
+        flight_records=args.flight_records,
+        window=args.window
+    )
+    if generator.recorder:
+        generator.recorder.install_signal_handler('/Users/aviator/Documents/MCP/wfq/results',
+                                                  generator.logger)
+
+    try:
+        generator.start()
+        generator.wait()
+        time.sleep(1)  # 等待在途包回发
+    except KeyboardInterrupt:
+        print("\n收到中断信号，停止流量生成器")
+    finally:
+        generator.stop()
+
+if __name__ == '__main__':
+    main()
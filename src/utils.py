@@ -3,10 +3,15 @@
 包含项目中使用的通用工具函数
 """
 
+import math
 import time
 import threading
 import logging
+import logging.handlers
 import queue
+import atexit
+import signal
+from array import array
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
@@ -19,40 +24,40 @@ plt.rcParams['axes.unicode_minus'] = False
 class RateLimiter:
     """速率限制器，使用令牌桶算法"""
     
-    def __init__(self, rate_bps):
+    def __init__(self, rate_bps, clock=time.time):
         """
         初始化速率限制器
         :param rate_bps: 速率（字节/秒）
+        :param clock: 时钟函数，默认time.time；仿真时传入虚拟时钟
         """
         self.rate = rate_bps
         self.bucket_size = rate_bps * 2  # 桶大小为2秒的速率
         self.tokens = self.bucket_size
-        self.last_update = time.time()
+        self.clock = clock
+        self.last_update = clock()
         self.lock = threading.Lock()
         
     def consume(self, bytes_count):
         """
         消费令牌
+        令牌不足时令牌数记为负（欠下的字节），调用方等待返回的时间后正好补足欠额；
+        若直接清零，等待期间补充的令牌会被下一个包再用一次，饱和时实际速率为rate的两倍
         :param bytes_count: 需要发送的字节数
         :return: 需要等待的时间
         """
         with self.lock:
-            now = time.time()
+            now = self.clock()
             # 补充令牌
             elapsed = now - self.last_update
             self.tokens = min(self.bucket_size, 
                             self.tokens + elapsed * self.rate)
             self.last_update = now
             
-            if self.tokens >= bytes_count:
-                self.tokens -= bytes_count
+            self.tokens -= bytes_count
+            if self.tokens >= 0:
                 return 0  # 无需等待
-            else:
-                # 计算需要等待的时间
-                needed_tokens = bytes_count - self.tokens
-                wait_time = needed_tokens / self.rate
-                self.tokens = 0
-                return wait_time
+            # 等待欠额按速率补足的时间
+            return -self.tokens / self.rate
 
 class Statistics:
     """统计信息收集器"""
@@ -83,29 +88,577 @@ class Statistics:
         with self.lock:
             self.data.clear()
 
+class LatencyHistogram:
+    """
+    对数线性延迟直方图（HDR风格）
+    内存恒定，相对误差约为 2^-(sub_bucket_bits-1)，支持跨进程合并。
+    每个直方图只应由一个线程写入；读取方拿到的是近似一致的快照。
+    """
+
+    DEFAULT_PERCENTILES = (50, 99, 99.9)
+
+    def __init__(self, scale=1000, sub_bucket_bits=8, max_groups=40):
+        """
+        初始化直方图
+        :param scale: 记录值到内部整数单位的换算系数（默认毫秒 -> 微秒）
+        :param sub_bucket_bits: 每个数量级的子桶位数，决定精度
+        :param max_groups: 数量级（2的幂）分组数，超出范围的值记入最后一个桶
+        """
+        self.scale = scale
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_groups = max_groups
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.counts = [0] * (self.sub_bucket_count + max_groups * self.half_count)
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = None
+        self.max_value = None
+
+    def _bucket_index(self, value):
+        """计算内部整数值对应的桶下标"""
+        if value < self.sub_bucket_count:
+            return value
+        group = value.bit_length() - self.sub_bucket_bits
+        if group > self.max_groups:
+            return len(self.counts) - 1
+        sub = (value >> group) - self.half_count
+        return self.sub_bucket_count + (group - 1) * self.half_count + sub
+
+    def _bucket_value(self, index):
+        """返回桶的代表值（桶内中点，内部整数单位）"""
+        if index < self.sub_bucket_count:
+            return index
+        group, sub = divmod(index - self.sub_bucket_count, self.half_count)
+        group += 1
+        lower = (sub + self.half_count) << group
+        return lower + ((1 << group) >> 1)
+
+    def record(self, value):
+        """记录一个延迟值（单位由scale决定）"""
+        self.record_raw(int(value * self.scale))
+
+    def record_raw(self, raw):
+        """直接记录内部整数单位的值"""
+        if raw < 0:
+            raw = 0
+        self.counts[self._bucket_index(raw)] += 1
+        self.total_count += 1
+        self.total_sum += raw
+        if self.min_value is None or raw < self.min_value:
+            self.min_value = raw
+        if self.max_value is None or raw > self.max_value:
+            self.max_value = raw
+
+    @property
+    def count(self):
+        return self.total_count
+
+    def mean(self):
+        """平均值"""
+        if self.total_count == 0:
+            return 0.0
+        return self.total_sum / self.total_count / self.scale
+
+    def min(self):
+        return (self.min_value or 0) / self.scale
+
+    def max(self):
+        return (self.max_value or 0) / self.scale
+
+    def percentile(self, p):
+        """返回第p百分位的值（0 <= p <= 100）"""
+        return self.percentiles((p,))[p]
+
+    def percentiles(self, ps=DEFAULT_PERCENTILES):
+        """一次遍历计算多个百分位"""
+        result = {p: 0.0 for p in ps}
+        if self.total_count == 0:
+            return result
+        targets = sorted((max(1, math.ceil(self.total_count * p / 100.0)), p)
+                         for p in ps)
+        running = 0
+        pending = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            running += bucket_count
+            while pending < len(targets) and running >= targets[pending][0]:
+                value = min(self._bucket_value(index), self.max_value)
+                result[targets[pending][1]] = max(value, self.min_value) / self.scale
+                pending += 1
+            if pending == len(targets):
+                break
+        return result
+
+    def cumulative_counts(self, bounds):
+        """
+        计算小于等于各边界值的累计样本数（用于导出Prometheus直方图）
+        :param bounds: 升序边界列表（单位与record一致）
+        :return: 与bounds等长的累计计数列表
+        """
+        counts = list(self.counts)  # 快照，避免遍历时被写线程修改
+        raw_bounds = [int(b * self.scale) for b in bounds]
+        result = []
+        running = 0
+        index = 0
+        for raw in raw_bounds:
+            limit = self._bucket_index(raw)
+            while index <= limit:
+                running += counts[index]
+                index += 1
+            result.append(running)
+        return result
+
+    def format_percentiles(self, ps=DEFAULT_PERCENTILES, unit='ms'):
+        """格式化为 "p50=1.23ms, p99=..." 形式的字符串"""
+        return ', '.join(f"p{p:g}={v:.3f}{unit}"
+                         for p, v in self.percentiles(ps).items())
+
+    def merge(self, other):
+        """合并另一个同构直方图（可来自其他进程）"""
+        if (other.scale != self.scale or
+                other.sub_bucket_bits != self.sub_bucket_bits or
+                other.max_groups != self.max_groups):
+            raise ValueError("直方图参数不一致，无法合并")
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        if other.min_value is not None:
+            if self.min_value is None or other.min_value < self.min_value:
+                self.min_value = other.min_value
+        if other.max_value is not None:
+            if self.max_value is None or other.max_value > self.max_value:
+                self.max_value = other.max_value
+        return self
+
+    def to_dict(self):
+        """序列化为可JSON化的字典（稀疏桶）"""
+        return {
+            'scale': self.scale,
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'max_groups': self.max_groups,
+            'count': self.total_count,
+            'sum': self.total_sum,
+            'min': self.min_value,
+            'max': self.max_value,
+            'buckets': {str(i): c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从to_dict()的结果恢复直方图"""
+        hist = cls(scale=data['scale'],
+                   sub_bucket_bits=data['sub_bucket_bits'],
+                   max_groups=data['max_groups'])
+        for index, bucket_count in data['buckets'].items():
+            hist.counts[int(index)] = bucket_count
+        hist.total_count = data['count']
+        hist.total_sum = data['sum']
+        hist.min_value = data['min']
+        hist.max_value = data['max']
+        return hist
+
+class StageLatency:
+    """
+    数据包生命周期分阶段耗时统计
+    各阶段耗时由time.perf_counter_ns()差值得到，按阶段聚合到纳秒精度的
+    LatencyHistogram中（百分位以毫秒输出）。同一阶段只应由一个线程写入。
+    """
+    
+    NS_PER_MS = 1000000
+    
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.histograms = {stage: LatencyHistogram(scale=self.NS_PER_MS)
+                           for stage in self.stages}
+        
+    def record(self, stage, elapsed_ns):
+        """记录一个阶段的耗时（纳秒）"""
+        self.histograms[stage].record_raw(elapsed_ns)
+        
+    def items(self):
+        """按阶段顺序返回 (阶段名, 直方图)"""
+        return [(stage, self.histograms[stage]) for stage in self.stages]
+
+class InflightWindow:
+    """
+    在途数据包滑动窗口
+    以 seq % size 为下标的定长数组保存发送时刻和序列号，另用一个字节位图标记未确认的槽位；
+    新包占用仍未确认的槽位时，旧包视为丢失（已老化出窗口）。
+    内存固定、各操作O(1)；发送线程只调用sent、接收线程只调用acked，无需加锁。
+    """
+    
+    def __init__(self, size=65536):
+        """
+        :param size: 窗口槽位数，应大于 发送速率(包/秒) × 最大往返时间(秒)
+        """
+        self.size = size
+        self.send_times = array('d', bytes(8 * size))
+        self.seqs = array('q', bytes(8 * size))
+        self.pending = bytearray(size)
+        self.sent_count = 0
+        self.acked_count = 0
+        self.lost_count = 0        # 老化出窗口仍未确认的包
+        self.unmatched_count = 0   # 找不到对应在途记录的回发（重复或老化后才到达）
+        
+    def sent(self, seq_num, send_time):
+        """记录一个已发送的包"""
+        index = seq_num % self.size
+        if self.pending[index]:
+            self.lost_count += 1
+        self.send_times[index] = send_time
+        self.seqs[index] = seq_num
+        self.pending[index] = 1
+        self.sent_count += 1
+        
+    def acked(self, seq_num):
+        """
+        确认一个包
+        :return: 该包的发送时刻；不在窗口内时返回None
+        """
+        index = seq_num % self.size
+        if self.pending[index] and self.seqs[index] == seq_num:
+            self.pending[index] = 0
+            self.acked_count += 1
+            return self.send_times[index]
+        self.unmatched_count += 1
+        return None
+        
+    def in_flight(self):
+        """当前在途（已发送、未确认且未判定丢失）的包数"""
+        return max(0, self.sent_count - self.acked_count - self.lost_count)
+
+class SequenceTracker:
+    """
+    单个流的序列号跟踪：在线统计丢包、乱序和重复
+    以 seq % window 为下标的字节位图记录最近window个序列号是否已收到；
+    序列号前进时，滑出窗口仍未收到的包计为丢失，窗口内迟到的包计为乱序（深度为落后于
+    最大序列号的距离），已收到的再次出现计为重复，早于窗口的包计为过期。
+    32位序列号回绕后展开为连续整数，内存固定，每个包均摊O(1)。
+    """
+    
+    SEQ_SPACE = 1 << 32
+    
+    def __init__(self, window=1024):
+        self.window = window
+        self.bitmap = bytearray(window)
+        self.base = None      # 第一个收到的序列号（展开后）
+        self.highest = None   # 已收到的最大序列号（展开后）
+        self.missing = 0      # 当前窗口内尚未收到的包数（尚未判定丢失）
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.max_reorder_depth = 0
+        self.duplicates = 0
+        self.stale = 0        # 早于窗口、无法判断是否重复的包
+        
+    def record(self, seq_num):
+        """记录一个收到的序列号"""
+        self.received += 1
+        window = self.window
+        bitmap = self.bitmap
+        if self.highest is None:
+            self.base = self.highest = seq_num
+            bitmap[seq_num % window] = 1
+            return
+        
+        half = self.SEQ_SPACE >> 1
+        delta = (seq_num - self.highest + half) % self.SEQ_SPACE - half
+        seq = self.highest + delta
+        
+        if delta > 0:
+            if delta >= window:
+                # 整个窗口滑出：窗口内缺失的和跳过的序列号都判定丢失
+                self.lost += self.missing + (delta - window)
+                bitmap[:] = bytes(window)
+                self.missing = window - 1
+            else:
+                base = self.base
+                for expected in range(self.highest + 1, seq):
+                    index = expected % window
+                    if not bitmap[index] and expected - window >= base:
+                        self.lost += 1
+                        self.missing -= 1
+                    bitmap[index] = 0
+                    self.missing += 1
+                index = seq % window
+                if not bitmap[index] and seq - window >= base:
+                    self.lost += 1
+                    self.missing -= 1
+            bitmap[seq % window] = 1
+            self.highest = seq
+        elif delta == 0:
+            self.duplicates += 1
+        elif -delta >= window:
+            self.stale += 1
+        else:
+            index = seq % window
+            if bitmap[index] and seq >= self.base:
+                self.duplicates += 1
+                return
+            bitmap[index] = 1
+            if seq >= self.base:
+                self.missing -= 1
+            else:
+                # 早于第一个包的乱序包：窗口起点前移，其间的序列号变为缺失
+                self.missing += self.base - seq - 1
+                self.base = seq
+            self.reordered += 1
+            if -delta > self.max_reorder_depth:
+                self.max_reorder_depth = -delta
+            
+    def expected(self):
+        """按序列号范围应收到的包数"""
+        return 0 if self.highest is None else self.highest - self.base + 1
+        
+    def lost_total(self):
+        """已判定丢失的包加上窗口内仍缺失的包（运行结束时视为丢失）"""
+        return self.lost + self.missing
+        
+    def loss_rate(self):
+        expected = self.expected()
+        return self.lost_total() / expected if expected else 0.0
+        
+    def merge(self, other):
+        """
+        合并另一个跟踪器的计数（同一流的包分散到多个接收进程时使用）
+        假设各跟踪器收到的序列号互不相交；合并后丢包数按 期望包数 - 各自收到的不同序列号数 计算，
+        位图不再有意义，合并结果只用于汇总
+        """
+        if other.highest is None:
+            return self
+        if self.highest is None:
+            unique = other.expected() - other.lost_total()
+            self.base, self.highest = other.base, other.highest
+        else:
+            unique = (self.expected() - self.lost_total()) + (other.expected() - other.lost_total())
+            self.base = min(self.base, other.base)
+            self.highest = max(self.highest, other.highest)
+        self.lost = max(0, self.expected() - unique)
+        self.missing = 0
+        self.received += other.received
+        self.reordered += other.reordered
+        self.max_reorder_depth = max(self.max_reorder_depth, other.max_reorder_depth)
+        self.duplicates += other.duplicates
+        self.stale += other.stale
+        return self
+
+class FlowCounter:
+    """
+    单个流的累计计数与滑动窗口速率
+    累计包数/字节数O(1)更新；速率按定长时间桶组成的环形数组统计最近window秒，
+    过期的桶在被复用时清零，内存固定。只应由一个线程写入，读取方无需加锁。
+    """
+    
+    __slots__ = ('packets', 'bytes', 'first_time', 'last_time', 'window',
+                 'bucket_width', 'bucket_packets', 'bucket_bytes', 'bucket_slots')
+    
+    def __init__(self, window=1.0, buckets=10):
+        """
+        :param window: 速率窗口长度（秒），0表示不统计速率
+        :param buckets: 窗口划分的时间桶个数
+        """
+        self.packets = 0
+        self.bytes = 0
+        self.first_time = None
+        self.last_time = None
+        self.window = window
+        self.bucket_width = window / buckets if window else 0.0
+        self.bucket_packets = array('q', bytes(8 * buckets))
+        self.bucket_bytes = array('q', bytes(8 * buckets))
+        self.bucket_slots = array('q', [-1] * buckets)  # 各桶当前对应的时间片编号
+        
+    def record(self, size, now):
+        """记录一个size字节的包"""
+        self.packets += 1
+        self.bytes += size
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        if self.window:
+            slot = int(now / self.bucket_width)
+            index = slot % len(self.bucket_slots)
+            if self.bucket_slots[index] != slot:
+                self.bucket_slots[index] = slot
+                self.bucket_packets[index] = 0
+                self.bucket_bytes[index] = 0
+            self.bucket_packets[index] += 1
+            self.bucket_bytes[index] += size
+            
+    def rate(self, now):
+        """
+        最近window秒的平均速率
+        :return: (包/秒, 字节/秒)；未启用速率统计时为 (0.0, 0.0)
+        """
+        if not self.window:
+            return 0.0, 0.0
+        current = int(now / self.bucket_width)
+        buckets = len(self.bucket_slots)
+        packets = 0
+        total_bytes = 0
+        for index, slot in enumerate(self.bucket_slots):
+            if 0 <= current - slot < buckets:
+                packets += self.bucket_packets[index]
+                total_bytes += self.bucket_bytes[index]
+        return packets / self.window, total_bytes / self.window
+        
+    def merge(self, other):
+        """合并另一个计数器（多进程接收时按流汇总）"""
+        self.packets += other.packets
+        self.bytes += other.bytes
+        if other.first_time is not None:
+            if self.first_time is None or other.first_time < self.first_time:
+                self.first_time = other.first_time
+            if self.last_time is None or other.last_time > self.last_time:
+                self.last_time = other.last_time
+        if self.window and self.window == other.window:
+            for index, slot in enumerate(other.bucket_slots):
+                if slot == self.bucket_slots[index]:
+                    self.bucket_packets[index] += other.bucket_packets[index]
+                    self.bucket_bytes[index] += other.bucket_bytes[index]
+                elif slot > self.bucket_slots[index]:
+                    self.bucket_slots[index] = slot
+                    self.bucket_packets[index] = other.bucket_packets[index]
+                    self.bucket_bytes[index] = other.bucket_bytes[index]
+        return self
+
+class _EndpointQueueHandler(logging.handlers.QueueHandler):
+    """把记录放入共享日志队列，并标记该记录器对应的日志文件"""
+
+    def __init__(self, log_queue, file_handler):
+        super().__init__(log_queue)
+        self.file_handler = file_handler
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.log_file_handler = self.file_handler
+        return record
+
+class _FileDispatcher(logging.Handler):
+    """在日志线程中把记录写入入队时标记的日志文件"""
+
+    def emit(self, record):
+        handler = getattr(record, 'log_file_handler', None)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
 class Logger:
-    """日志工具类"""
+    """
+    日志工具类
+    每个进程只有一个日志队列和一个后台QueueListener线程：各记录器只把LogRecord放入共享队列，
+    日志线程把记录写入各自的日志文件并统一输出到控制台，
+    同一进程托管多少个发送器/接收器都只占用一个日志线程。
+    """
+    
+    _queue = None
+    _listener = None
+    _files = []
+    _pid = None
+    _lock = threading.Lock()
     
     @staticmethod
-    def setup_logger(name, log_file, level=logging.INFO):
-        """设置日志记录器"""
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    def _ensure_listener():
+        """启动本进程的共享日志线程（fork出的子进程中重新创建）"""
+        if Logger._listener is not None and Logger._pid == os.getpid():
+            return
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(Logger._formatter())
+        Logger._queue = queue.SimpleQueue()
+        Logger._files = []
+        Logger._listener = logging.handlers.QueueListener(
+            Logger._queue, _FileDispatcher(), console_handler, respect_handler_level=True
         )
-        
+        Logger._listener.start()
+        Logger._pid = os.getpid()
+    
+    @staticmethod
+    def _formatter():
+        return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    @staticmethod
+    def setup_logger(name, log_file, level=logging.INFO):
+        """
+        设置日志记录器
+        日志记录只是把LogRecord放入内存队列，格式化和文件/控制台写入
+        由本进程共享的后台日志线程完成，不阻塞收发线程。
+        同名记录器重复设置时改写到新的日志文件（已入队的记录仍写入原文件）。
+        """
         handler = logging.FileHandler(log_file)
-        handler.setFormatter(formatter)
+        handler.setFormatter(Logger._formatter())
         
-        logger = logging.getLogger(name)
-        logger.setLevel(level)
-        logger.addHandler(handler)
-        
-        # 同时输出到控制台
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        with Logger._lock:
+            Logger._ensure_listener()
+            Logger._files.append(handler)
+            
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            for existing in list(logger.handlers):
+                if isinstance(existing, logging.handlers.QueueHandler):
+                    logger.removeHandler(existing)
+            logger.addHandler(_EndpointQueueHandler(Logger._queue, handler))
         
         return logger
+    
+    @staticmethod
+    def shutdown():
+        """停止后台日志线程，写出队列中剩余的日志并关闭日志文件"""
+        with Logger._lock:
+            listener, files = Logger._listener, Logger._files
+            Logger._listener = Logger._queue = None
+            Logger._files = []
+            if listener is None or Logger._pid != os.getpid():
+                return
+            listener.stop()
+            for handler in files:
+                handler.close()
+
+atexit.register(Logger.shutdown)
+
+class DropReporter:
+    """
+    丢包聚合上报器
+    热路径上只做计数，每个周期为每个流输出一条 "N drops" 汇总日志。
+    """
+    
+    def __init__(self, logger, interval=1.0, label='丢弃'):
+        self.logger = logger
+        self.interval = interval
+        self.label = label
+        self.counts = defaultdict(int)
+        self.last_flush = time.time()
+        
+    def record(self, flow_id, now=None):
+        """记录一次丢包"""
+        self.counts[flow_id] += 1
+        self.maybe_flush(now)
+        
+    def maybe_flush(self, now=None):
+        """距上次输出超过一个周期时输出汇总"""
+        if now is None:
+            now = time.time()
+        if now - self.last_flush >= self.interval:
+            self.flush(now)
+            
+    def flush(self, now=None):
+        """输出并清空当前周期的丢包汇总"""
+        if now is None:
+            now = time.time()
+        if self.counts:
+            elapsed = now - self.last_flush
+            counts, self.counts = self.counts, defaultdict(int)
+            for flow_id in sorted(counts):
+                self.logger.warning("%s: 最近%.1f秒内丢弃 %d 个包: Flow %s",
+                                    self.label, elapsed, counts[flow_id], flow_id)
+        self.last_flush = now
+
+def install_termination_handler():
+    """将SIGTERM转换为KeyboardInterrupt，使kill也能走正常的stop()清理流程"""
+    def handler(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, handler)
 
 class DataAnalyzer:
     """数据分析和可视化工具"""
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与src下各模块一致：把src目录加入路径，测试直接按模块名导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,72 @@
+"""分时间片吞吐量解析与逐包累计的一致性"""
+
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import analyze_results
+from analyze_results import parse_throughput
+
+# 乱序到达、同一时间片多个包、跨越空闲时间片，以及一行列数不足的坏行
+ROWS = [
+    (0.001, 1, 1024, 0), (0.004, 2, 512, 0), (0.003, 1, 1024, 1),
+    (0.012, 1, 256, 2), (0.0095, 2, 512, 1), (0.051, 1, 1024, 3),
+    (0.0505, 2, 100, 2), (0.020, 3, 64, 0), (0.1234, 1, 1500, 4),
+]
+
+def write_fixture(path):
+    with open(path, 'w') as f:
+        f.write('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+        for timestamp, flow_id, size, seq_num in ROWS[:5]:
+            f.write(f"{timestamp},{flow_id},{size},{seq_num},1.00\n")
+        f.write('0.03,1\n')
+        for timestamp, flow_id, size, seq_num in ROWS[5:]:
+            f.write(f"{timestamp},{flow_id},{size},{seq_num},1.00\n")
+    return path
+
+def per_packet_cumulative():
+    """逐包排序累加（原read_throughput_data + plot_throughput的算法）"""
+    flow_data = defaultdict(list)
+    for timestamp, flow_id, size, _ in ROWS:
+        flow_data[flow_id].append((timestamp, size))
+    series = {}
+    for flow_id, data in flow_data.items():
+        data.sort()
+        series[flow_id] = (np.array([t for t, _ in data]),
+                           np.cumsum([s for _, s in data]))
+    return series
+
+def assert_matches_per_packet(arrays, bin_width):
+    baseline = per_packet_cumulative()
+    assert arrays['flow_ids'].tolist() == sorted(baseline)
+    for flow_id, (times, cumulative) in baseline.items():
+        bin_ends = arrays[f'{flow_id}_times']
+        binned = arrays[f'{flow_id}_bytes']
+        # 每个时间片结束时的累计字节 = 该时刻之前到达的所有包之和
+        before = np.searchsorted(times, bin_ends, side='left')
+        assert binned.tolist() == pytest.approx(cumulative[before - 1].tolist())
+        # 只输出有包到达的时间片，且每个包都落在某个输出的时间片里
+        expected_bins = np.unique(np.floor(times / bin_width))
+        assert bin_ends.tolist() == pytest.approx(((expected_bins + 1) * bin_width).tolist())
+        assert binned[-1] == cumulative[-1]
+
+@pytest.mark.parametrize('bin_width', [0.01, 0.001, 0.05])
+def test_binned_cumulative_matches_per_packet(tmp_path, bin_width):
+    arrays = parse_throughput(write_fixture(tmp_path / 'received_data.log'), bin_width)
+    assert_matches_per_packet(arrays, bin_width)
+
+def test_bins_split_across_chunks_are_merged(tmp_path, monkeypatch):
+    path = write_fixture(tmp_path / 'received_data.log')
+    whole = parse_throughput(path)
+    monkeypatch.setattr(analyze_results.iter_log_chunks, '__defaults__', (2,))
+    chunked = parse_throughput(path)
+    assert chunked.keys() == whole.keys()
+    for key in whole:
+        assert chunked[key].tolist() == pytest.approx(whole[key].tolist())
+    assert_matches_per_packet(chunked, analyze_results.THROUGHPUT_BIN)
+
+def test_empty_log(tmp_path):
+    path = tmp_path / 'received_data.log'
+    path.write_text('timestamp,flow_id,packet_size,sequence_number,delay_ms\n')
+    assert parse_throughput(path)['flow_ids'].tolist() == []
@@ -0,0 +1,103 @@
+"""到达模型与包大小分布的配置解析"""
+
+import random
+
+import pytest
+
+from arrivals import (ArrivalProcess, CBRArrivals, EmpiricalSize, FixedSize, TraceArrivals,
+                      UniformSize, parse_arrival, parse_size_distribution)
+from packet_format import ProjectPacket
+
+@pytest.mark.parametrize('spec, cls', [
+    ('fixed:512', FixedSize),
+    ('uniform:64:1400', UniformSize),
+    ('bimodal:64:1424:0.7', EmpiricalSize),
+    ('empirical:64=0.5,576=0.3,1424=0.2', EmpiricalSize),
+])
+def test_valid_size_distributions(spec, cls):
+    sizes = parse_size_distribution(spec)
+    assert isinstance(sizes, cls)
+    rng = random.Random(1)
+    for _ in range(200):
+        assert sizes.min <= sizes.sample(rng) <= sizes.max
+
+@pytest.mark.parametrize('spec', [
+    'fixed:10',
+    'uniform:10:100',
+    'uniform:500:100',
+    'bimodal:10:1000:0.5',
+    'bimodal:64:1000:1.5',
+    f'fixed:{ProjectPacket.MAX_PACKET_SIZE + 1}',
+    'empirical:64=0.5,8=0.5',
+    'empirical:64=-1,128=2',
+    'empirical:',
+    'fixed:abc',
+    'lognormal:3',
+])
+def test_invalid_size_distributions(spec):
+    with pytest.raises(ValueError):
+        parse_size_distribution(spec)
+
+def test_default_size_without_spec():
+    assert parse_size_distribution(None, default_size=256).sample(random.Random()) == 256
+
+def test_arrival_process_is_abstract():
+    with pytest.raises(TypeError):
+        ArrivalProcess(1000, FixedSize(100))
+
+def test_cbr_gap_matches_rate():
+    arrivals = parse_arrival('cbr', 10000, FixedSize(500))
+    assert isinstance(arrivals, CBRArrivals)
+    assert arrivals.next(random.Random()) == (0.05, 500)
+
+@pytest.mark.parametrize('spec', ['poisson', 'onoff:0.5:0.5', 'onoff:0.5:0.5:pareto:1.8',
+                                  'mmpp:1,4:0.2,0.1'])
+def test_stochastic_models_keep_mean_rate(spec):
+    arrivals = parse_arrival(spec, 100000, FixedSize(1000))
+    rng = random.Random(5)
+    elapsed = 0.0
+    count = 20000
+    for _ in range(count):
+        gap, _ = arrivals.next(rng)
+        elapsed += gap
+    assert count * 1000 / elapsed == pytest.approx(100000, rel=0.15)
+
+@pytest.mark.parametrize('spec', ['onoff:0:1', 'onoff:-1:1', 'onoff:1:-0.5', 'onoff:1',
+                                  'onoff:1:1:pareto:1', 'onoff:1:1:uniform',
+                                  'mmpp:0,0:1,1', 'mmpp:1,2:0,1', 'mmpp:1,2:1,-1',
+                                  'mmpp:-1,2:1,1', 'mmpp:1:1', 'mmpp:1,2:1'])
+def test_invalid_arrival_parameters(spec):
+    with pytest.raises(ValueError):
+        parse_arrival(spec, 100000, FixedSize(1000))
+
+def test_onoff_without_off_period_is_poisson_like():
+    arrivals = parse_arrival('onoff:0.5:0', 100000, FixedSize(1000))
+    rng = random.Random(3)
+    elapsed = sum(arrivals.next(rng)[0] for _ in range(20000))
+    assert 20000 * 1000 / elapsed == pytest.approx(100000, rel=0.05)
+
+def _write_trace(path):
+    path.write_text('timestamp,flow_id,packet_size,sequence_number,delay_ms\n'
+                    '10.0,1,100,0,0\n10.5,2,200,0,0\n11.0,1,300,1,0\n')
+    return path
+
+def test_trace_path_with_colon_and_flow_id(tmp_path):
+    trace = _write_trace(tmp_path / 'run:1.csv')
+    arrivals = parse_arrival(f'trace:{trace}:1', 0, None)
+    assert isinstance(arrivals, TraceArrivals)
+    assert arrivals.path == str(trace) and arrivals.flow_id == 1
+    rng = random.Random()
+    assert [arrivals.next(rng) for _ in range(3)] == [(0.0, 100), (1.0, 300), None]
+
+def test_trace_path_with_colon_without_flow_id(tmp_path):
+    trace = _write_trace(tmp_path / 'a:b.csv')
+    arrivals = parse_arrival(f'trace:{trace}', 0, None)
+    assert arrivals.path == str(trace) and arrivals.flow_id is None
+    assert len(arrivals.records) == 3
+    assert parse_arrival(f'trace:{trace}:', 0, None).flow_id is None
+
+def test_unknown_arrival_model():
+    with pytest.raises(ValueError):
+        parse_arrival('burst', 1000, FixedSize(100))
+    with pytest.raises(ValueError):
+        parse_arrival('trace:', 1000, FixedSize(100))
@@ -0,0 +1,85 @@
+"""二进制记录日志的写入、读取和CSV互转"""
+
+import numpy as np
+import pytest
+
+from binlog import (MAGIC, RECORD_DTYPE, BinaryLogWriter, is_binary_log, load_log,
+                    open_binary_log, read_binary_log, read_csv_log, write_binary_log,
+                    write_csv_log)
+
+ROWS = [(0.0, 1, 1024, 0, 0.0),
+        (0.001234, 2, 512, 0, 1.5),
+        (0.5, 1, 1024, 1, 12.25),
+        (1.75, 3, 64, 7, 0.75)]
+
+def write_rows(path, rows, **kwargs):
+    writer = BinaryLogWriter(path, **kwargs)
+    for row in rows:
+        writer.write(*row)
+    writer.close()
+    return writer
+
+def test_writer_round_trip(tmp_path):
+    path = tmp_path / 'data.bin'
+    writer = write_rows(path, ROWS)
+    assert writer.records == len(ROWS)
+    assert is_binary_log(path)
+    records = read_binary_log(path)
+    assert records.dtype == RECORD_DTYPE
+    assert records.tolist() == ROWS
+
+def test_writer_flushes_full_blocks(tmp_path):
+    path = tmp_path / 'data.bin'
+    rows = [(i * 0.01, i % 4, 100 + i, i, 0.5) for i in range(10)]
+    writer = BinaryLogWriter(path, block_records=3)
+    for row in rows:
+        writer.write(*row)
+    # 写满3个块后未满的1条仍在内存中
+    assert writer.records == 9 and writer.count == 1
+    writer.close()
+    assert read_binary_log(path)['sequence_number'].tolist() == list(range(10))
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / 'data.bin'
+    write_rows(path, ROWS)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * (RECORD_DTYPE.itemsize - 5))
+    assert read_binary_log(path).tolist() == ROWS
+    assert open_binary_log(path).tolist() == ROWS
+
+def test_empty_log(tmp_path):
+    path = tmp_path / 'empty.bin'
+    write_rows(path, [])
+    assert path.read_bytes() == MAGIC
+    assert len(read_binary_log(path)) == 0
+    assert len(open_binary_log(path)) == 0
+
+def test_memmap_matches_full_read(tmp_path):
+    path = tmp_path / 'data.bin'
+    write_rows(path, ROWS)
+    mapped = open_binary_log(path)
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, read_binary_log(path))
+
+def test_csv_binary_conversion_round_trip(tmp_path):
+    records = np.array(ROWS, dtype=RECORD_DTYPE)
+    csv_path = tmp_path / 'data.csv'
+    bin_path = tmp_path / 'data.bin'
+    write_csv_log(csv_path, records)
+    assert not is_binary_log(csv_path)
+    from_csv = load_log(csv_path)
+    write_binary_log(bin_path, from_csv)
+    from_bin = load_log(bin_path)
+    assert np.array_equal(from_bin, from_csv)
+    for name in ('flow_id', 'packet_size', 'sequence_number'):
+        assert from_bin[name].tolist() == records[name].tolist()
+    assert from_bin['timestamp'] == pytest.approx(records['timestamp'])
+    # CSV中延迟保留两位小数
+    assert from_bin['delay_ms'] == pytest.approx(records['delay_ms'], abs=0.005)
+
+def test_csv_reader_skips_short_rows(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('timestamp,flow_id,packet_size,sequence_number,delay_ms\n'
+                    '0.1,1,100,0,0.50\n'
+                    '0.2,1\n')
+    assert read_csv_log(path).tolist() == [(0.1, 1, 100, 0, 0.5)]
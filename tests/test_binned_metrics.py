@@ -0,0 +1,81 @@
+"""按时间片聚合的路由器指标"""
+
+import csv
+
+import pytest
+
+from binned_metrics import COLUMNS, BinnedMetrics
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        assert tuple(reader.fieldnames) == COLUMNS
+        return list(reader)
+
+def forward(metrics, now, flow_id, delay_ms, size=100):
+    metrics.maybe_close(now)
+    metrics.on_arrival(flow_id, True)
+    metrics.on_forward(flow_id, size, delay_ms)
+
+def test_samples_land_in_their_own_bin(tmp_path):
+    path = tmp_path / 'bins.csv'
+    metrics = BinnedMetrics(path, bin_width=1.0)
+    forward(metrics, 10.2, 1, 1.0)
+    forward(metrics, 10.7, 1, 3.0)
+    forward(metrics, 11.5, 1, 5.0)
+    metrics.close()
+    rows = read_rows(path)
+    assert [(r['bin_start'], r['forwarded'], r['bytes']) for r in rows] == [
+        ('10.000', '2', '200'), ('11.000', '1', '100')]
+    assert float(rows[0]['delay_mean_ms']) == pytest.approx(2.0)
+    assert float(rows[0]['delay_max_ms']) == pytest.approx(3.0)
+
+def test_skipped_bins_are_written_as_empty_rows(tmp_path):
+    path = tmp_path / 'bins.csv'
+    metrics = BinnedMetrics(path, bin_width=1.0)
+    forward(metrics, 10.5, 1, 1.0)
+    forward(metrics, 10.6, 2, 1.0)
+    forward(metrics, 14.2, 1, 2.0)  # 跳过11、12、13三个时间片
+    metrics.close()
+    rows = read_rows(path)
+    by_bin = {}
+    for row in rows:
+        by_bin.setdefault(row['bin_start'], []).append(row)
+    assert list(by_bin) == ['10.000', '11.000', '12.000', '13.000', '14.000']
+    # 累计计数写入尚未结束的时间片10，而不是14之前的时间片13
+    assert [(r['flow_id'], r['forwarded']) for r in by_bin['10.000']] == [('1', '1'), ('2', '1')]
+    # 全部流空闲的时间片只有一行flow_id为空的占位行，与流的个数无关
+    for bin_start in ('11.000', '12.000', '13.000'):
+        assert [(r['flow_id'], r['received'], r['forwarded'], r['delay_p50_ms'])
+                for r in by_bin[bin_start]] == [('', '0', '0', '')]
+    assert [(r['flow_id'], r['forwarded']) for r in by_bin['14.000']] == [('1', '1')]
+    assert metrics.bins_written == 5
+
+def test_queue_depth_and_drops(tmp_path):
+    path = tmp_path / 'bins.csv'
+    metrics = BinnedMetrics(path, bin_width=1.0)
+    metrics.maybe_close(0.1)
+    for accepted in (True, True, True, False):
+        metrics.on_arrival(7, accepted)
+    metrics.on_forward(7, 100, 0.5)
+    metrics.maybe_close(1.1)
+    metrics.close()
+    rows = read_rows(path)
+    assert (rows[0]['received'], rows[0]['dropped'], rows[0]['forwarded'],
+            rows[0]['queue_depth']) == ('4', '1', '1', '2')
+    # 下一个时间片没有活动但仍有积压，照样写出
+    assert (rows[1]['bin_start'], rows[1]['received'], rows[1]['queue_depth']) == ('1.000', '0', '2')
+
+def test_delay_percentiles_use_bounded_histogram(tmp_path):
+    path = tmp_path / 'bins.csv'
+    metrics = BinnedMetrics(path, bin_width=1.0)
+    metrics.maybe_close(0.0)
+    for i in range(1, 10001):
+        metrics.on_forward(1, 100, i / 100)   # 0.01 ~ 100ms 均匀分布
+    assert len(metrics.flows[1].delays.counts) < 10000
+    metrics.close()
+    row = read_rows(path)[0]
+    assert float(row['delay_mean_ms']) == pytest.approx(50.005, rel=1e-3)
+    assert float(row['delay_p50_ms']) == pytest.approx(50, rel=0.02)
+    assert float(row['delay_p99_ms']) == pytest.approx(99, rel=0.02)
+    assert float(row['delay_max_ms']) == pytest.approx(100)
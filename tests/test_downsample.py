@@ -0,0 +1,58 @@
+"""绘图前的序列降采样"""
+
+import numpy as np
+import pytest
+
+from downsample import METHODS, downsample, lttb
+
+def scatter(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.sort(rng.uniform(0, 100, n))
+    y = rng.exponential(5, n)
+    return x, y
+
+@pytest.mark.parametrize('method', [m for m in METHODS if m != 'exact'])
+@pytest.mark.parametrize('n, max_points', [(50_000, 4000), (50_000, 1000), (20_000, 3)])
+def test_output_is_capped_and_keeps_extremes(method, n, max_points):
+    x, y = scatter(n)
+    xs, ys = downsample(x, y, method, max_points)
+    assert len(xs) <= max_points
+    if method != 'lttb':  # LTTB保留形状和尖峰，不保证全局极值（见下面的尖峰用例）
+        assert ys.max() == y.max()
+        assert ys.min() == y.min()
+    assert np.all(np.diff(xs) >= 0)
+
+def test_pixel_uses_most_of_the_budget_on_dense_scatter():
+    x, y = scatter(200_000)
+    xs, _ = downsample(x, y, 'pixel', 4000)
+    assert 2000 <= len(xs) <= 4000
+
+def test_short_series_and_exact_are_unchanged():
+    x, y = scatter(100)
+    for method in METHODS:
+        xs, ys = downsample(x, y, method, 4000)
+        assert xs is x and ys is y
+    xs, ys = downsample(*scatter(10_000), 'exact', 100)
+    assert len(xs) == 10_000
+
+def test_lttb_keeps_endpoints_and_spike():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    selected = lttb(x, y, 200)
+    assert len(selected) == 200
+    assert selected[0] == 0 and selected[-1] == len(x) - 1
+    assert 4321 in selected
+    assert np.all(np.diff(selected) > 0)
+
+def test_unsorted_x_is_supported():
+    x, y = scatter(20_000)
+    order = np.random.default_rng(1).permutation(len(x))
+    xs, ys = downsample(x[order], y[order], 'minmax', 500)
+    assert len(xs) <= 500
+    assert ys.max() == y.max()
+    assert np.all(np.diff(xs) >= 0)
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample(np.arange(10), np.arange(10), 'nearest')
@@ -0,0 +1,83 @@
+"""流体GPS参考、Jain指数和运行时公平性跟踪"""
+
+import pytest
+
+from fairness import FairnessTracker, GPSReference
+
+def test_gps_splits_service_by_weight():
+    gps = GPSReference()
+    gps.arrive(1, 1, 4000)
+    gps.arrive(2, 3, 4000)
+    gps.advance(400)
+    assert gps.served(1) == pytest.approx(100)
+    assert gps.served(2) == pytest.approx(300)
+
+def test_gps_redistributes_after_a_flow_empties():
+    gps = GPSReference()
+    gps.arrive(1, 1, 4000)
+    gps.arrive(2, 3, 4000)
+    # 流2在 4000/(3/4) 字节后服务完毕，此后流1独占
+    gps.advance(4000 / 0.75)
+    assert gps.served(2) == pytest.approx(4000)
+    assert gps.served(1) == pytest.approx(4000 / 3)
+    gps.advance(1000)
+    assert gps.served(1) == pytest.approx(4000 / 3 + 1000)
+    assert gps.active == {1}
+
+def test_gps_conserves_work_and_caps_at_arrivals():
+    gps = GPSReference()
+    sizes = {1: 1500, 2: 700, 3: 2500}
+    for flow_id, size in sizes.items():
+        gps.arrive(flow_id, flow_id, size)
+    gps.advance(3000)
+    assert sum(gps.served(f) for f in sizes) == pytest.approx(3000)
+    gps.advance(10 ** 6)
+    for flow_id, size in sizes.items():
+        assert gps.served(flow_id) == pytest.approx(size)
+    assert gps.active_weight == 0
+
+def test_gps_late_arrival_starts_at_current_virtual_time():
+    gps = GPSReference()
+    gps.arrive(1, 1, 10000)
+    gps.advance(5000)
+    gps.arrive(2, 1, 10000)
+    gps.advance(2000)
+    assert gps.served(1) == pytest.approx(6000)
+    assert gps.served(2) == pytest.approx(1000)
+
+@pytest.mark.parametrize('shares, expected', [
+    ((1, 1, 1), 1.0),
+    ((1, 0), 0.5),
+    ((1, 2), 0.9),
+    ((1, 0, 0, 0), 0.25),
+])
+def test_jain_index(shares, expected):
+    end = {flow_id: (share * 100, 100) for flow_id, share in enumerate(shares)}
+    assert FairnessTracker.jain_index({}, end) == pytest.approx(expected)
+
+def test_jain_index_ignores_flows_without_gps_service():
+    start = {1: (0, 0), 2: (50, 500)}
+    end = {1: (100, 100), 2: (50, 500)}
+    assert FairnessTracker.jain_index(start, end) == pytest.approx(1.0)
+    assert FairnessTracker.jain_index(end, end) is None
+
+def _run(tracker, order, size=100):
+    for flow_id in (1, 2):
+        for _ in range(len(order)):
+            tracker.on_arrival(flow_id, 1, size)
+    now = 0.0
+    for flow_id in order:
+        now += 0.01
+        tracker.on_departure(now, flow_id, size)
+    return tracker
+
+def test_tracker_alternating_service_is_fair():
+    tracker = _run(FairnessTracker(capacity=10000, window=0.2, step=0.05), [1, 2] * 100)
+    assert tracker.jain_min == pytest.approx(1.0, abs=0.01)
+    assert max(tracker.max_lag.values()) <= 100
+
+def test_tracker_starving_a_flow_is_unfair():
+    tracker = _run(FairnessTracker(capacity=10000, window=0.2, step=0.05), [1] * 200)
+    assert tracker.jain_latest == pytest.approx(0.5, abs=0.01)
+    assert tracker.max_lag[1] < 0
+    assert tracker.max_lag_ms(1) < 0
@@ -0,0 +1,72 @@
+"""飞行记录器转储与解码"""
+
+import csv
+import os
+
+import pytest
+
+from flight_recorder import (EVENT_ACK, EVENT_DROP, EVENT_FORWARD, EVENT_RECV,
+                             EVENT_SEND, FlightRecorder, decode_to_csv, read_dump)
+
+def read_csv(path):
+    with open(path) as f:
+        return list(csv.DictReader(f))
+
+def test_dump_read_round_trip(tmp_path):
+    recorder = FlightRecorder('router', capacity=16)
+    events = [
+        (1_000_000_000, 1, 0, 1024, EVENT_RECV),
+        (1_000_500_000, 2, 0, 512, EVENT_DROP),
+        (1_002_000_000, 1, 0, 1024, EVENT_FORWARD),
+    ]
+    for timestamp_ns, flow_id, seq_num, size, event in events:
+        recorder.record(event, flow_id, seq_num, size, timestamp_ns)
+
+    role, records = read_dump(recorder.dump(tmp_path / 'flight.bin'))
+    assert role == 'router'
+    assert records == events
+
+def test_wrapped_buffer_keeps_latest_in_order(tmp_path):
+    recorder = FlightRecorder('sender', capacity=4)
+    for seq in range(10):
+        recorder.record(EVENT_SEND, 1, seq, 100, seq)
+
+    _, records = read_dump(recorder.dump(tmp_path / 'flight.bin'))
+    assert [r[2] for r in records] == [6, 7, 8, 9]
+
+def test_read_dump_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        read_dump(path)
+
+def test_decode_pairs_start_and_end_events(tmp_path):
+    recorder = FlightRecorder('sender', capacity=16)
+    recorder.record(EVENT_SEND, 1, 0, 1024, 1_000_000_000)
+    recorder.record(EVENT_SEND, 2, 0, 512, 1_001_000_000)
+    recorder.record(EVENT_ACK, 1, 0, 1024, 1_003_000_000)
+    recorder.record(EVENT_ACK, 2, 0, 512, 1_011_000_000)
+    dump_path = recorder.dump(tmp_path / 'flight.bin')
+
+    outputs = decode_to_csv(dump_path, tmp_path / 'out', prefix='fr_')
+    assert [os.path.basename(p) for p in outputs] == [
+        'fr_received_data.log', 'fr_delays_flow_1.csv', 'fr_delays_flow_2.csv']
+
+    received = read_csv(outputs[0])
+    assert [(r['flow_id'], r['sequence_number']) for r in received] == [('1', '0'), ('2', '0')]
+    assert float(received[0]['timestamp']) == 0
+    assert float(received[1]['timestamp']) == pytest.approx(0.008)
+    assert [float(r['delay_ms']) for r in received] == [3.0, 10.0]
+
+    flow_2 = read_csv(outputs[2])
+    assert len(flow_2) == 1
+    assert (flow_2[0]['packet_size'], float(flow_2[0]['delay_ms'])) == ('512', 10.0)
+
+def test_receiver_decode_has_no_delay_files(tmp_path):
+    recorder = FlightRecorder('receiver', capacity=16)
+    recorder.record(EVENT_RECV, 3, 7, 256, 2_000_000_000)
+    outputs = decode_to_csv(recorder.dump(tmp_path / 'flight.bin'), tmp_path / 'out')
+    assert len(outputs) == 1
+    received = read_csv(outputs[0])
+    assert [(r['flow_id'], r['sequence_number'], r['delay_ms']) for r in received] == [
+        ('3', '7', '0.00')]
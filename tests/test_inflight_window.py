@@ -0,0 +1,45 @@
+"""在途数据包滑动窗口"""
+
+from utils import InflightWindow
+
+def test_ack_returns_send_time_once():
+    window = InflightWindow(8)
+    window.sent(3, 1.5)
+    assert window.in_flight() == 1
+    assert window.acked(3) == 1.5
+    assert window.acked(3) is None  # 重复回发
+    assert (window.acked_count, window.unmatched_count, window.in_flight()) == (1, 1, 0)
+
+def test_acked_slots_are_reused_without_loss():
+    window = InflightWindow(4)
+    for seq in range(20):
+        window.sent(seq, seq * 0.1)
+        assert window.acked(seq) == seq * 0.1
+    assert (window.sent_count, window.acked_count, window.lost_count) == (20, 20, 0)
+
+def test_unacked_slot_ages_out_when_window_wraps():
+    window = InflightWindow(4)
+    for seq in range(6):
+        window.sent(seq, float(seq))
+    # 4、5 占用了 0、1 的槽位，0、1 判定丢失
+    assert window.lost_count == 2
+    assert window.in_flight() == 4
+    for seq in (2, 3, 4, 5):
+        assert window.acked(seq) == float(seq)
+    assert window.in_flight() == 0
+
+def test_stale_ack_after_wrap_does_not_match_new_packet():
+    window = InflightWindow(4)
+    window.sent(1, 1.0)
+    window.sent(5, 5.0)  # 同一槽位，序列号1老化
+    assert window.acked(1) is None
+    assert window.unmatched_count == 1
+    assert window.acked(5) == 5.0
+
+def test_sequence_wraparound_at_32_bits():
+    window = InflightWindow(16)
+    seqs = [(0xFFFFFFFF - 2 + i) & 0xFFFFFFFF for i in range(6)]
+    for i, seq in enumerate(seqs):
+        window.sent(seq, float(i))
+    assert window.lost_count == 0
+    assert [window.acked(seq) for seq in seqs] == [float(i) for i in range(6)]
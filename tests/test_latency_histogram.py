@@ -0,0 +1,74 @@
+"""LatencyHistogram的桶划分、百分位误差界和合并/序列化"""
+
+import math
+import random
+
+import pytest
+
+from utils import LatencyHistogram
+
+def exact_percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * p / 100.0)) - 1]
+
+def test_bucket_value_lies_in_its_own_bucket():
+    hist = LatencyHistogram()
+    for raw in list(range(0, 5000)) + [2 ** k + d for k in range(12, 40) for d in (-1, 0, 1)]:
+        index = hist._bucket_index(raw)
+        assert hist._bucket_index(hist._bucket_value(index)) == index
+
+def test_percentile_relative_error_bound():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(1.0, 1.5) for _ in range(20000)]
+    hist = LatencyHistogram()
+    for value in values:
+        hist.record(value)
+    # 相对误差不超过 2^-(sub_bucket_bits-1)，另有记录时截断到1/scale的绝对误差
+    bound = 2.0 ** -(hist.sub_bucket_bits - 1)
+    for p in (1, 10, 50, 90, 99, 99.9, 100):
+        expected = exact_percentile(values, p)
+        assert abs(hist.percentile(p) - expected) <= expected * bound + 1.0 / hist.scale
+
+def test_small_values_are_exact():
+    hist = LatencyHistogram(scale=1)
+    for value in (3, 1, 4, 1, 5, 9, 2, 6):
+        hist.record(value)
+    assert hist.percentiles((50, 100)) == {50: 3.0, 100: 9.0}
+    assert hist.min() == 1 and hist.max() == 9
+    assert hist.mean() == 31 / 8
+
+def test_empty_histogram():
+    hist = LatencyHistogram()
+    assert hist.count == 0
+    assert hist.mean() == 0.0
+    assert hist.percentile(99) == 0.0
+
+def test_merge_equals_single_histogram():
+    rng = random.Random(3)
+    values = [rng.expovariate(0.1) for _ in range(5000)]
+    whole, left, right = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, value in enumerate(values):
+        whole.record(value)
+        (left if i % 2 else right).record(value)
+    merged = left.merge(right)
+    assert merged.counts == whole.counts
+    assert merged.count == whole.count
+    assert (merged.min(), merged.max()) == (whole.min(), whole.max())
+
+def test_merge_rejects_mismatched_layout():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(sub_bucket_bits=6))
+
+def test_dict_round_trip():
+    hist = LatencyHistogram()
+    for value in (0.2, 1.5, 1.5, 30.0, 4000.0):
+        hist.record(value)
+    restored = LatencyHistogram.from_dict(hist.to_dict())
+    assert restored.counts == hist.counts
+    assert restored.percentiles() == hist.percentiles()
+
+def test_cumulative_counts():
+    hist = LatencyHistogram()
+    for value in (0.1, 0.5, 2.0, 2.0, 50.0):
+        hist.record(value)
+    assert hist.cumulative_counts([0.2, 1.0, 10.0, 100.0]) == [1, 2, 4, 5]
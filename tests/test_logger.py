@@ -0,0 +1,33 @@
+"""进程内共享的后台日志线程"""
+
+import logging.handlers
+import threading
+
+from utils import Logger
+
+def test_many_loggers_share_one_listener_thread(tmp_path):
+    before = threading.active_count()
+    loggers = [Logger.setup_logger(f'test_endpoint_{i}', tmp_path / f'endpoint_{i}.log')
+               for i in range(8)]
+    try:
+        assert threading.active_count() <= before + 1
+        for i, logger in enumerate(loggers):
+            logger.info('endpoint %d', i)
+        loggers[0].debug('below level')
+    finally:
+        Logger.shutdown()
+    for i in range(8):
+        lines = (tmp_path / f'endpoint_{i}.log').read_text().splitlines()
+        assert len(lines) == 1 and lines[0].endswith(f'test_endpoint_{i} - INFO - endpoint {i}')
+
+def test_setting_up_a_logger_again_switches_its_file(tmp_path):
+    try:
+        Logger.setup_logger('test_reused', tmp_path / 'first.log').info('one')
+        logger = Logger.setup_logger('test_reused', tmp_path / 'second.log')
+        logger.info('two')
+        assert sum(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers) == 1
+    finally:
+        Logger.shutdown()
+    assert (tmp_path / 'first.log').read_text().count('one') == 1
+    assert 'two' not in (tmp_path / 'first.log').read_text()
+    assert (tmp_path / 'second.log').read_text().count('two') == 1
@@ -0,0 +1,80 @@
+"""日志解析结果缓存的命中与失效"""
+
+import os
+
+import numpy as np
+
+import parse_cache
+
+def counting_parser(calls):
+    def parse(source):
+        calls.append(source)
+        return {'values': np.loadtxt(source, ndmin=1)}
+    return parse
+
+def test_second_call_hits_cache(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('1\n2\n3\n')
+    calls = []
+    parse = counting_parser(calls)
+    first = parse_cache.cached(source, 'k', parse)
+    second = parse_cache.cached(source, 'k', parse)
+    assert len(calls) == 1
+    assert second['values'].tolist() == first['values'].tolist() == [1, 2, 3]
+    assert os.path.exists(parse_cache.cache_path(source, 'k'))
+
+def test_changed_source_invalidates_cache(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('1\n2\n')
+    calls = []
+    parse = counting_parser(calls)
+    parse_cache.cached(source, 'k', parse)
+    source.write_text('1\n2\n3\n')
+    assert parse_cache.cached(source, 'k', parse)['values'].tolist() == [1, 2, 3]
+    assert len(calls) == 2
+
+def test_keys_are_cached_separately(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('1\n')
+    calls = []
+    parse = counting_parser(calls)
+    parse_cache.cached(source, 'a', parse)
+    parse_cache.cached(source, 'b', parse)
+    assert len(calls) == 2
+
+def test_disabled_cache_neither_reads_nor_writes(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('1\n')
+    calls = []
+    parse = counting_parser(calls)
+    parse_cache.cached(source, 'k', parse, enabled=False)
+    parse_cache.cached(source, 'k', parse, enabled=False)
+    assert len(calls) == 2
+    assert not os.path.exists(parse_cache.cache_path(source, 'k'))
+
+def test_source_modified_during_parse_is_not_cached(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('1\n2\n')
+
+    def parse_while_appending(path):
+        arrays = {'values': np.loadtxt(path, ndmin=1)}
+        with open(path, 'a') as f:
+            f.write('3\n')  # 解析完成前源文件又被追加
+        return arrays
+
+    assert parse_cache.cached(source, 'k', parse_while_appending)['values'].tolist() == [1, 2]
+    assert not os.path.exists(parse_cache.cache_path(source, 'k'))
+    calls = []
+    assert parse_cache.cached(source, 'k', counting_parser(calls))['values'].tolist() == [1, 2, 3]
+    assert len(calls) == 1
+
+def test_corrupt_cache_is_reparsed(tmp_path):
+    source = tmp_path / 'log.txt'
+    source.write_text('4\n')
+    calls = []
+    parse = counting_parser(calls)
+    parse_cache.cached(source, 'k', parse)
+    with open(parse_cache.cache_path(source, 'k'), 'wb') as f:
+        f.write(b'not a zip')
+    assert parse_cache.cached(source, 'k', parse)['values'].tolist() == [4]
+    assert len(calls) == 2
@@ -0,0 +1,31 @@
+"""令牌桶速率限制器（虚拟时钟）"""
+
+import pytest
+
+from simulator import VirtualClock
+from utils import RateLimiter
+
+def test_initial_bucket_allows_a_burst():
+    limiter = RateLimiter(1000, clock=VirtualClock())
+    assert all(limiter.consume(500) == 0 for _ in range(4))  # 桶容量为2秒的速率
+    assert limiter.consume(500) == pytest.approx(0.5)
+
+def test_saturated_rate_matches_configured_rate():
+    clock = VirtualClock()
+    limiter = RateLimiter(1000, clock=clock)
+    limiter.consume(limiter.bucket_size)  # 先耗尽初始令牌
+    sent = 0
+    while clock.now < 100:
+        clock.now += limiter.consume(100)  # 等待返回的时间后发送下一个
+        sent += 100
+    assert sent / clock.now == pytest.approx(1000, rel=0.01)
+
+def test_idle_time_refills_up_to_bucket_size():
+    clock = VirtualClock()
+    limiter = RateLimiter(1000, clock=clock)
+    limiter.consume(2000)
+    clock.now = 1.0
+    assert limiter.consume(1000) == 0
+    clock.now = 100.0
+    limiter.consume(0)
+    assert limiter.tokens == limiter.bucket_size
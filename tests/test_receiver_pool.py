@@ -0,0 +1,67 @@
+"""多进程接收器的数据日志合并和工作进程等待"""
+
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+
+from binlog import RECORD_DTYPE, read_binary_log, write_binary_log
+from receiver import DATA_LOG_HEADER, merge_data_logs, wait_worker
+
+def _csv_part(path, rows):
+    with open(path, 'w') as f:
+        f.write(DATA_LOG_HEADER)
+        for row in rows:
+            f.write(','.join(str(v) for v in row) + '\n')
+    return path
+
+def _snapshot(path, start_time, log_format='csv'):
+    return {'data_log_path': str(path), 'start_time': start_time, 'log_format': log_format}
+
+def test_csv_parts_merge_in_time_order_with_one_header(tmp_path):
+    # 各分片的时间相对各自的第一个包；工作进程1比0晚0.5秒收到第一个包
+    first = _csv_part(tmp_path / 'log.worker0', [(0.0, 1, 100, 0, 0.0), (0.3, 1, 100, 1, 0.0),
+                                                  (0.9, 1, 100, 2, 0.0)])
+    second = _csv_part(tmp_path / 'log.worker1', [(0.0, 2, 200, 0, 0.0), (0.2, 2, 200, 1, 0.0)])
+    empty = _csv_part(tmp_path / 'log.worker2', [])
+    merged = tmp_path / 'log'
+    merge_data_logs(merged, [_snapshot(first, 100.0), _snapshot(second, 100.5),
+                             _snapshot(empty, None)])
+    lines = merged.read_text().splitlines()
+    assert lines[0] + '\n' == DATA_LOG_HEADER
+    assert DATA_LOG_HEADER.strip() not in lines[1:]
+    rows = [line.split(',') for line in lines[1:]]
+    assert [float(r[0]) for r in rows] == pytest.approx([0.0, 0.3, 0.5, 0.7, 0.9])
+    assert [(r[1], r[3]) for r in rows] == [('1', '0'), ('1', '1'), ('2', '0'),
+                                            ('2', '1'), ('1', '2')]
+    assert not any(path.exists() for path in (first, second, empty))
+
+def test_binary_parts_merge_in_time_order(tmp_path):
+    parts = []
+    for worker, (start, times) in enumerate([(10.0, [0.0, 0.4]), (10.25, [0.0, 0.05])]):
+        records = np.zeros(len(times), dtype=RECORD_DTYPE)
+        records['timestamp'] = times
+        records['flow_id'] = worker + 1
+        records['sequence_number'] = np.arange(len(times))
+        path = tmp_path / f'log.worker{worker}'
+        write_binary_log(path, records)
+        parts.append(_snapshot(path, start, 'binary'))
+    merged = tmp_path / 'log'
+    merge_data_logs(merged, parts)
+    records = read_binary_log(merged)
+    assert records['timestamp'].tolist() == pytest.approx([0.0, 0.25, 0.30, 0.4])
+    assert records['flow_id'].tolist() == [1, 2, 2, 1]
+
+def _exit_immediately(conn):
+    conn.close()
+
+def test_wait_worker_returns_when_worker_dies(tmp_path):
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_exit_immediately, args=(child_conn,))
+    process.start()
+    child_conn.close()
+    started = time.monotonic()
+    assert wait_worker(conn, process, timeout=10) is None
+    assert time.monotonic() - started < 5
+    process.join()
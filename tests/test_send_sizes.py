@@ -0,0 +1,59 @@
+"""发送快速路径：包大小限制、发送模板和发送失败的处理"""
+
+import struct
+
+from packet_format import SEQ_OFFSET, ProjectPacket, build_template
+from sender import UDPSender
+from traffic_generator import GeneratorFlow
+
+TRACE_SIZES = [10, 100, 5000]
+EXPECTED = [ProjectPacket.HEADER_SIZE, 100, ProjectPacket.MAX_PACKET_SIZE]
+
+def _write_trace(tmp_path):
+    path = tmp_path / 'sizes.csv'
+    path.write_text('timestamp,packet_size\n' +
+                    ''.join(f'{i * 0.001},{size}\n' for i, size in enumerate(TRACE_SIZES)))
+    return path
+
+def test_sender_schedule_clamps_trace_sizes(tmp_path):
+    sender = UDPSender(flow_id=1, weight=1, packet_size=1024, rate_bps=1000,
+                       router_ip='127.0.0.1', router_port=9, flight_records=0,
+                       arrival=f'trace:{_write_trace(tmp_path)}')
+    try:
+        assert [size for _, size in sender.schedule()] == EXPECTED
+    finally:
+        sender.send_socket.close()
+        sender.recv_socket.close()
+
+def test_generator_flow_clamps_trace_sizes(tmp_path):
+    flow = GeneratorFlow(1, 1, 100, 1000, arrival=f'trace:{_write_trace(tmp_path)}')
+    sizes = []
+    while flow.next_departure() is not None:
+        sizes.append(flow.next_size)
+    assert sizes == EXPECTED
+
+def test_template_sequence_offset_matches_header():
+    template = build_template(7, 3, 200, src_port=1234, dst_port=8080)
+    assert len(template) == 200
+    struct.pack_into('!I', template, SEQ_OFFSET, 0xDEADBEEF)
+    packet = ProjectPacket.unpack(bytes(template))
+    assert (packet.flow_id, packet.weight, packet.seq_num) == (7, 3, 0xDEADBEEF)
+    assert (packet.src_port, packet.dst_port) == (1234, 8080)
+
+def test_template_size_is_clamped():
+    assert len(build_template(1, 1, 0)) == ProjectPacket.HEADER_SIZE
+    assert len(build_template(1, 1, 10 ** 6)) == ProjectPacket.MAX_PACKET_SIZE
+
+def test_router_refused_is_warned_once(tmp_path, caplog):
+    sender = UDPSender(flow_id=9, weight=1, packet_size=100, rate_bps=1000,
+                       router_ip='127.0.0.1', router_port=9, flight_records=0,
+                       log_file=tmp_path / 'sender.log')
+    try:
+        with caplog.at_level('WARNING', logger='sender_flow_9'):
+            for _ in range(3):
+                sender.send_failed(ConnectionRefusedError())
+        assert sender.send_errors == 3 and sender.router_refused
+        assert len([r for r in caplog.records if r.levelname == 'WARNING']) == 1
+    finally:
+        sender.send_socket.close()
+        sender.recv_socket.close()
@@ -0,0 +1,107 @@
+"""序列号跟踪（丢包/乱序/重复）和流计数器"""
+
+import pytest
+
+from utils import FlowCounter, SequenceTracker
+
+def feed(tracker, seqs):
+    for seq in seqs:
+        tracker.record(seq)
+    return tracker
+
+def test_in_order_stream_has_no_loss():
+    tracker = feed(SequenceTracker(window=16), range(100))
+    assert tracker.expected() == 100
+    assert tracker.lost_total() == 0
+    assert tracker.reordered == 0 and tracker.duplicates == 0
+
+def test_exact_loss_count_with_reordering_and_duplicates():
+    dropped = {5, 17, 18, 90, 150, 198}
+    received = [seq for seq in range(200) if seq not in dropped]
+    # 每20个包交换一对相邻的包制造乱序
+    swaps = range(10, len(received) - 1, 20)
+    for i in swaps:
+        received[i], received[i + 1] = received[i + 1], received[i]
+    # 在窗口内重复三个已收到的包
+    for position in (120, 60, 30):
+        received.insert(position, received[position - 5])
+    tracker = feed(SequenceTracker(window=32), received)
+    assert tracker.lost_total() == len(dropped)
+    assert tracker.duplicates == 3
+    assert tracker.stale == 0
+    assert tracker.reordered == len(swaps)
+    assert tracker.max_reorder_depth == 1
+    assert tracker.loss_rate() == pytest.approx(len(dropped) / 200)
+
+def test_gap_larger_than_window_counts_every_skipped_packet():
+    tracker = feed(SequenceTracker(window=8), [0, 1, 2, 100, 101])
+    assert tracker.lost_total() == 97
+
+def test_late_packet_within_window_is_not_lost():
+    tracker = feed(SequenceTracker(window=8), [0, 1, 3, 4, 2, 5])
+    assert tracker.lost_total() == 0
+    assert tracker.reordered == 1
+    assert tracker.max_reorder_depth == 2
+
+def test_packet_older_than_window_is_stale():
+    tracker = feed(SequenceTracker(window=8), list(range(1, 20)) + [0])
+    assert tracker.stale == 1
+
+def test_sequence_wraparound():
+    start = SequenceTracker.SEQ_SPACE - 3
+    seqs = [(start + i) % SequenceTracker.SEQ_SPACE for i in range(6)]
+    tracker = feed(SequenceTracker(window=8), seqs)
+    assert tracker.expected() == 6
+    assert tracker.lost_total() == 0
+
+def test_merge_of_split_sequence_ranges():
+    # 同一个流的包被两个接收进程按奇偶分开，再各自丢掉一部分
+    dropped = {7, 40, 41, 99}
+    even = feed(SequenceTracker(window=16), [s for s in range(0, 100, 2) if s not in dropped])
+    odd = feed(SequenceTracker(window=16), [s for s in range(1, 100, 2) if s not in dropped])
+    merged = SequenceTracker(window=16).merge(even).merge(odd)
+    assert merged.expected() == 99  # 最后一个包99丢失，范围止于98
+    assert merged.lost_total() == len(dropped) - 1
+    assert merged.received == 100 - len(dropped)
+
+def test_merge_of_disjoint_halves_without_loss():
+    first = feed(SequenceTracker(window=16), range(0, 50))
+    second = feed(SequenceTracker(window=16), range(50, 100))
+    merged = first.merge(second)
+    assert merged.expected() == 100
+    assert merged.lost_total() == 0
+
+def test_merge_with_empty_tracker_is_identity():
+    tracker = feed(SequenceTracker(window=16), [0, 2, 3])
+    tracker.merge(SequenceTracker(window=16))
+    assert tracker.expected() == 4
+    assert tracker.lost_total() == 1
+
+def test_flow_counter_rate_covers_only_the_window():
+    counter = FlowCounter(window=1.0, buckets=10)
+    for i in range(100):
+        counter.record(100, i * 0.02)   # 0~2秒，每秒50个包
+    packets, rate_bytes = counter.rate(1.98)
+    assert packets == pytest.approx(50, abs=5)
+    assert rate_bytes == pytest.approx(5000, abs=500)
+    assert counter.rate(10.0) == (0.0, 0.0)
+    assert (counter.packets, counter.bytes) == (100, 10000)
+    assert (counter.first_time, counter.last_time) == (0.0, pytest.approx(1.98))
+
+def test_flow_counter_merge_sums_counts_and_rates():
+    a, b = FlowCounter(), FlowCounter()
+    for i in range(10):
+        a.record(100, 5.0 + i * 0.05)
+        b.record(200, 5.01 + i * 0.05)
+    packets, rate_bytes = a.merge(b).rate(5.5)
+    assert (a.packets, a.bytes) == (20, 3000)
+    assert packets == pytest.approx(20)
+    assert rate_bytes == pytest.approx(3000)
+    assert a.first_time == 5.0
+    assert a.last_time == pytest.approx(5.46)
+
+def test_flow_counter_without_window():
+    counter = FlowCounter(window=0)
+    counter.record(100, 1.0)
+    assert counter.rate(1.0) == (0.0, 0.0)
+    assert counter.packets == 1
@@ -0,0 +1,44 @@
+"""离散事件仿真：虚拟时钟上的调度器和出口带宽"""
+
+import pytest
+
+from simulator import SimFlow, Simulation
+
+def bytes_between(sim, start, end):
+    totals = {}
+    for forward_time, flow_id, size, _, _ in sim.packet_log:
+        if start <= forward_time < end:
+            totals[flow_id] = totals.get(flow_id, 0) + size
+    return totals
+
+def backlogged_run(algorithm, duration=30):
+    # 两个流各以两倍出口带宽发送，均持续积压
+    flows = [SimFlow(1, 1, 1000, 200 * 1024), SimFlow(2, 3, 1000, 200 * 1024)]
+    return Simulation(algorithm, 100, flows, duration=duration).run()
+
+def test_wfq_shares_follow_weights_when_backlogged():
+    sim = backlogged_run('wfq')
+    totals = bytes_between(sim, 10, 30)
+    assert totals[2] / totals[1] == pytest.approx(3, rel=0.02)
+    assert sim.dropped[1] > 0 and sim.dropped[2] > 0
+
+def test_fifo_shares_follow_arrivals():
+    totals = bytes_between(backlogged_run('fifo'), 10, 30)
+    assert totals[2] / totals[1] == pytest.approx(1, rel=0.02)
+
+@pytest.mark.parametrize('algorithm', ['fifo', 'wfq'])
+def test_link_runs_at_configured_bandwidth(algorithm):
+    totals = bytes_between(backlogged_run(algorithm), 10, 30)
+    assert sum(totals.values()) / 20 == pytest.approx(100 * 1024, rel=0.01)
+
+def test_underloaded_flows_get_their_offered_rate():
+    flows = [SimFlow(1, 1, 500, 20 * 1024, stop=10), SimFlow(2, 3, 1000, 30 * 1024, stop=10)]
+    sim = Simulation('wfq', 100, flows).run()
+    assert sim.forwarded[1] == sim.arrived[1] and sim.forwarded[2] == sim.arrived[2]
+    assert sim.forwarded_bytes[1] == pytest.approx(20 * 1024 * 10, rel=0.01)
+    assert sim.forwarded_bytes[2] == pytest.approx(30 * 1024 * 10, rel=0.01)
+    assert not sim.dropped
+
+def test_flow_without_stop_requires_duration():
+    with pytest.raises(ValueError):
+        Simulation('wfq', 100, [SimFlow(1, 1, 1000, 1024)]).run()